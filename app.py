@@ -5,13 +5,15 @@ from paginas.gerenciar_cliente import show_gerenciar_cliente
 from paginas.user_edition import show_edicao_usuarios
 from paginas.perfil import show_perfil
 from paginas.coletania_modelos import show_modelos
-from db.functions import listar_clientes, select_user, validate_user
-import base64
+from db.functions import listar_clientes, select_user, principal_autenticado, registrar_tempo_interativo, logo, preparar_banco
 import time
 import os
 
 st.set_page_config(page_title="Neuropsicoclínica", page_icon="🧠", layout="wide")
 
+# migrações pendentes: uma vez por processo, não a cada rerun (o import de db.functions não toca no banco)
+preparar_banco()
+
 from streamlit_cookies_manager import EncryptedCookieManager
 # Gerenciador de cookies criptografado
 cookies = EncryptedCookieManager(password=os.getenv("cookies_password"))
@@ -31,12 +33,28 @@ if "id_usuario" not in st.session_state:
 if "interface_pronta" not in st.session_state:
     st.session_state.interface_pronta = False
 
+# Tempo até a primeira tela interativa: começa na primeira execução do script da sessão
+# (ou no clique em Entrar) e é registrado por marcar_interativo() quando a tela termina de renderizar
+if "_boot" not in st.session_state:
+    st.session_state._boot = {"inicio": time.perf_counter(), "execucoes": 0, "origem": "sessão restaurada"}
+if st.session_state._boot:
+    st.session_state._boot["execucoes"] += 1
+
 image_path = "assets/logo_neuro_sem_bk.png"
 
+def marcar_interativo(etapa=None):
+    boot = st.session_state._boot
+    if not boot:
+        return
+    st.session_state._boot = None
+    segundos = time.perf_counter() - boot["inicio"]
+    etapa = etapa or boot["origem"]
+    st.session_state.tempo_ate_interativo = {"etapa": etapa, "segundos": segundos, "execucoes": boot["execucoes"]}
+    registrar_tempo_interativo(etapa, segundos, boot["execucoes"])
+
 def process_base64_img(image_path):
-    with open(image_path, "rb") as image_file:
-        encoded = base64.b64encode(image_file.read()).decode()
-        return encoded
+    # lido e codificado uma vez por processo (registro de logos em db.functions)
+    return logo(image_path).base64
 
 def login():
     image_base64 = process_base64_img(image_path)
@@ -63,6 +81,8 @@ def login():
             cookies.save()
 
             st.success("✅ Login realizado com sucesso!")
+            # do clique até a interface: esta execução e a do rerun
+            st.session_state._boot = {"inicio": time.perf_counter(), "execucoes": 1, "origem": "login"}
             st.rerun()
         else:
             st.error("❌ Usuário ou senha incorretos. Tente novamente.")
@@ -77,42 +97,42 @@ def login():
 
 def interface(privilegio, usuario):
     if not st.session_state.interface_pronta:
+        # carga inicial na mesma execução que desenha a página (sem st.rerun() só para isso)
         with st.spinner("⏳ Carregando interface, por favor aguarde..."):
-            psicologo_responsavel = usuario["psicologo_responsavel"]
-            clientes = listar_clientes(psicologo_responsavel)
-            st.session_state.psicologo_responsavel = psicologo_responsavel
-            st.session_state._clientes = clientes
+            st.session_state.psicologo_responsavel = usuario["psicologo_responsavel"]
+            st.session_state._clientes = listar_clientes(usuario["psicologo_responsavel"])
             st.session_state.interface_pronta = True
-            st.rerun()
+    psicologo_responsavel = st.session_state.psicologo_responsavel
+    clientes = st.session_state._clientes
+
+    col_logo, col_title = st.columns([1, 10])
+    with col_logo:
+        st.image(logo(image_path).png, width=600)
+    with col_title:
+        st.write("--------------------------------------")
+
+    st.sidebar.title("📂 Navegação")
+    if privilegio:
+        pagina = st.sidebar.selectbox("Escolha uma opção", [
+            "🏠 Página Inicial",
+            "🧑 Gerenciar Clientes",
+            "➕ Novo Cliente",
+            "👤 Perfil",
+            "📚 Coletânia de Modelos",
+            "✅ Edição de Usuários"
+        ])
     else:
-        psicologo_responsavel = st.session_state.psicologo_responsavel
-        clientes = st.session_state._clientes
-
-        col_logo, col_title = st.columns([1, 10])
-        with col_logo:
-            st.image("assets/logo_neuro_sem_bk.png", width=600)
-        with col_title:
-            st.write("--------------------------------------")
-
-        st.sidebar.title("📂 Navegação")
-        if privilegio:
-            pagina = st.sidebar.selectbox("Escolha uma opção", [
-                "🏠 Página Inicial",
-                "🧑 Gerenciar Clientes",
-                "➕ Novo Cliente",
-                "👤 Perfil",
-                "📚 Coletânia de Modelos",
-                "✅ Edição de Usuários"
-            ])
-        else:
-            pagina = st.sidebar.selectbox("Escolha uma opção", [
-                "🏠 Página Inicial",
-                "🧑 Gerenciar Clientes",
-                "➕ Novo Cliente",
-                "👤 Perfil",
-                "📚 Coletânia de Modelos"
-            ])
-
+        pagina = st.sidebar.selectbox("Escolha uma opção", [
+            "🏠 Página Inicial",
+            "🧑 Gerenciar Clientes",
+            "➕ Novo Cliente",
+            "👤 Perfil",
+            "📚 Coletânia de Modelos"
+        ])
+
+    # a amostra é registrada quando a primeira tela termina, mesmo que a página pare antes
+    # (st.stop() em perfil, pendências do dashboard...) ou levante uma exceção
+    try:
         if pagina == "🏠 Página Inicial":
             show_dashboard(psicologo_responsavel)
         elif pagina == "➕ Novo Cliente":
@@ -137,24 +157,28 @@ def interface(privilegio, usuario):
             st.markdown("""<div style='flex:1'></div>""", unsafe_allow_html=True)
 
             logout_clicked = st.button("🚪 Sair", use_container_width=True)
-
-        if logout_clicked:
-            for key in ["user_id", "username", "login_timestamp"]:
-                cookies[key] = ""
-            cookies.save()
-
-            st.session_state.autenticado = False
-            st.session_state.usuario_logado = None
-            st.session_state.id_usuario = None
-            st.session_state.interface_pronta = False
-            st.session_state.logout_triggered = True
-            st.session_state.logout_time = time.time()
-
-        if st.session_state.get("logout_triggered"):
-            st.success("✅ Logout completo. Redirecionando...")
-            time.sleep(2)
-            st.session_state.logout_triggered = False
-            st.rerun()
+    finally:
+        marcar_interativo()
+
+    if logout_clicked:
+        for key in ["user_id", "username", "login_timestamp"]:
+            cookies[key] = ""
+        cookies.save()
+
+        st.session_state.autenticado = False
+        st.session_state.usuario_logado = None
+        st.session_state.id_usuario = None
+        st.session_state.interface_pronta = False
+        st.session_state.logout_triggered = True
+        st.session_state.logout_time = time.time()
+
+    if st.session_state.get("logout_triggered"):
+        st.success("✅ Logout completo. Redirecionando...")
+        time.sleep(2)
+        st.session_state.logout_triggered = False
+        # mede a volta ao formulário de login a partir do rerun (fora a pausa da mensagem)
+        st.session_state._boot = {"inicio": time.perf_counter(), "execucoes": 0, "origem": "logout"}
+        st.rerun()
 
 # ✅ Página de Política de Privacidade (query: ?page=politica_de_privacidade)
 if pagina_atual == "politica_de_privacidade":
@@ -162,32 +186,34 @@ if pagina_atual == "politica_de_privacidade":
     show_politica()
     st.stop()
 
-# 🔐 Autenticação silenciosa com st.spinner
-if not st.session_state.autenticado:
-    if st.session_state.verificando_autenticacao and cookies.ready():
-        with st.spinner("🔄 Verificando sessão ativa..."):
-            user_id = cookies.get("user_id")
-            username = cookies.get("username")
-            ts_login = cookies.get("login_timestamp")
-
-            if user_id and username and ts_login:
-                if time.time() - float(ts_login) < 1800:
-                    st.session_state.autenticado = True
-                    st.session_state.usuario_logado = username
-                    st.session_state.id_usuario = int(user_id)
-
-            st.session_state.verificando_autenticacao = False
-            st.rerun()
-    elif st.session_state.verificando_autenticacao:
-        st.spinner("🔄 Verificando sessão ativa...")
-        st.stop()
-    else:
-        login()
+# 🔐 Autenticação silenciosa: validado o cookie, segue na mesma execução (interface ou login)
+if not st.session_state.autenticado and st.session_state.verificando_autenticacao:
+    if not cookies.ready():
+        # o componente de cookies reexecuta o script quando o navegador responder
+        st.caption("🔄 Verificando sessão ativa...")
         st.stop()
+    user_id = cookies.get("user_id")
+    username = cookies.get("username")
+    ts_login = cookies.get("login_timestamp")
+
+    if user_id and username and ts_login:
+        if time.time() - float(ts_login) < 1800:
+            st.session_state.autenticado = True
+            st.session_state.usuario_logado = username
+            st.session_state.id_usuario = int(user_id)
+
+    st.session_state.verificando_autenticacao = False
+
+if not st.session_state.autenticado:
+    login()
+    marcar_interativo("formulário de login")
+    st.stop()
 
-usuario = validate_user(st.session_state.id_usuario)
+# linha do login guardada na sessão (revalidada em segundo plano), não um SELECT por rerun
+usuario = principal_autenticado(st.session_state.id_usuario)
 if usuario:
     privilegio = bool(usuario["privilegio"])
     interface(privilegio, usuario)
 else:
     st.error("Usuário não encontrado.")
+    marcar_interativo("usuário não encontrado")
@@ -0,0 +1,325 @@
+"""
+Benchmark dos helpers de db/functions.py sobre a base sintética (benchmarks.dados_sinteticos).
+
+Para cada helper mede p50/p95 (ms) e linhas/s; leituras rodam sem o cache de consultas
+(`.sem_cache`) e os agregados rodam nos dois motores (duckdb e sql). Compara com o baseline
+gravado e sai com código 1 se algum p50 ou p95 passou de baseline * (1 + tolerância) + folga
+(cada percentil com a sua tolerância e folga: o p95 oscila mais).
+
+    DB_BACKEND=sqlite python -m benchmarks.bench_funcoes                  # mede e compara
+    DB_BACKEND=sqlite python -m benchmarks.bench_funcoes --gravar-baseline
+    DB_BACKEND=sqlite python -m benchmarks.bench_funcoes --psicologos 5 --clientes 40 --anos 2 --sem-baseline   # rodada rápida
+
+O baseline fica em benchmarks/baselines/funcoes_<backend>.json, junto com os parâmetros da
+base; medir com outros parâmetros contra ele é erro (código 2). A base sintética fica no banco
+para as próximas execuções (`--limpar` a remove no final); o que os casos de escrita gravaram
+é desfeito ao fim de cada execução.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+import db.functions as f
+from benchmarks.dados_sinteticos import (
+    PREFIXO, argumentos_base, garantir_base, limpar, remover_clientes, verificar_backend,
+)
+
+PASTA_BASELINES = os.path.join(os.path.dirname(__file__), "baselines")
+PARAMETROS_BASE = ("backend", "psicologos", "clientes", "anos", "semente", "fim")
+
+
+def _linhas(resultado):
+    """Linhas devolvidas/afetadas por uma chamada (para linhas/s)."""
+    if resultado is None:
+        return 0
+    if isinstance(resultado, tuple):  # pagina_sessoes_cliente, adicionar_sessoes_em_lote
+        return _linhas(resultado[0])
+    if isinstance(resultado, (int, float)) and not isinstance(resultado, bool):
+        return int(resultado)
+    if isinstance(resultado, dict):  # select_user, validate_user, indicadores_cliente
+        return 1
+    try:
+        return len(resultado)
+    except TypeError:
+        return 1
+
+
+def medir(func, repeticoes, aquecimento=1):
+    """Chama func() `aquecimento` + `repeticoes` vezes; devolve (tempos em ms, linhas da última chamada)."""
+    for _ in range(aquecimento):
+        func()
+    tempos, linhas = [], 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = func()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        linhas = _linhas(resultado)
+    return tempos, linhas
+
+
+def _percentil(tempos, p):
+    ordenados = sorted(tempos)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def _com_motor(motor, func):
+    """Executa func com MOTOR_ANALITICO=motor (duckdb = snapshot em memória, sql = agregado no banco)."""
+    def chamada():
+        anterior = os.environ.get("MOTOR_ANALITICO")
+        os.environ["MOTOR_ANALITICO"] = "mysql" if motor == "sql" else "duckdb"
+        try:
+            return func()
+        finally:
+            if anterior is None:
+                os.environ.pop("MOTOR_ANALITICO", None)
+            else:
+                os.environ["MOTOR_ANALITICO"] = anterior
+    return chamada
+
+
+def casos_leitura(base):
+    psi = base.psicologos[0]
+    cliente = base.clientes[psi][0]
+    usuario_id, usuario, senha = base.usuarios[0]
+    hoje = base.fim  # "hoje" da base sintética: os casos do ano/mês corrente caem em dados gerados
+    ano, mes = hoje.year, hoje.month
+    inicio_mes = hoje.replace(day=1)
+    fim_mes = (inicio_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    historico = f.sessoes_por_cliente.sem_cache(cliente)
+    ids_detalhe = tuple(int(i) for i in historico["id"].head(20))
+    _, cursor_meio = f.pagina_sessoes_cliente.sem_cache(cliente, tamanho=max(1, len(historico) // 2))
+
+    casos = [
+        ("listar_psicologos", f.listar_psicologos.sem_cache),
+        ("listar_login_privilegios", f.listar_login_privilegios.sem_cache),
+        ("listar_clientes", lambda: f.listar_clientes.sem_cache(psi)),
+        ("select_user", lambda: f.select_user(usuario, senha)),
+        ("validate_user", lambda: f.validate_user(usuario_id)),
+        ("sessoes_por_cliente", lambda: f.sessoes_por_cliente.sem_cache(cliente)),
+        ("sessoes_por_cliente_periodo", lambda: f.sessoes_por_cliente_periodo.sem_cache(cliente, inicio_mes, fim_mes)),
+        ("pagina_sessoes_cliente[1]", lambda: f.pagina_sessoes_cliente.sem_cache(cliente, tamanho=20)),
+        ("pagina_sessoes_cliente[meio]",
+         lambda: f.pagina_sessoes_cliente.sem_cache(cliente, apos=cursor_meio, tamanho=20)),
+        ("sessoes_pendentes_cliente", lambda: f.sessoes_pendentes_cliente.sem_cache(cliente)),
+        ("anos_com_sessoes", lambda: f.anos_com_sessoes.sem_cache(cliente)),
+        ("detalhes_sessoes[20]", lambda: f.detalhes_sessoes.sem_cache(ids_detalhe)),
+    ]
+    for motor in ("duckdb", "sql"):
+        casos += [
+            (f"resumo_financeiro[global,{motor}]", _com_motor(motor, lambda: f.resumo_financeiro.sem_cache(psi))),
+            (f"resumo_financeiro[ano,{motor}]",
+             _com_motor(motor, lambda: f.resumo_financeiro.sem_cache(psi, ano=ano))),
+            (f"resumo_financeiro[mes,{motor}]",
+             _com_motor(motor, lambda: f.resumo_financeiro.sem_cache(psi, mes=mes, ano=ano))),
+            (f"resumo_financeiro_por_periodo[{motor}]",
+             _com_motor(motor, lambda: f.resumo_financeiro_por_periodo.sem_cache(psi))),
+            (f"resumo_pendencias[ano,{motor}]",
+             _com_motor(motor, lambda: f.resumo_pendencias.sem_cache(psi, date(ano, 1, 1), hoje))),
+            (f"indicadores_cliente[{motor}]",
+             _com_motor(motor, lambda: f.indicadores_cliente.sem_cache(psi, cliente, mes, ano))),
+        ]
+    return casos
+
+
+class _Escritas:
+    """
+    Casos de escrita sobre um cliente próprio do benchmark (datas a partir de 2100, sem colidir
+    com a base sintética). Cada chamada grava algo novo; desfazer() devolve a base ao estado
+    gerado, para que ela possa ser reaproveitada.
+    """
+
+    def __init__(self, base, repeticoes):
+        self.psi = base.psicologos[0]
+        self.login_id = base.usuarios[1][0]  # assistente: privilegio 0 na base gerada
+        self.contador = 0
+        self.excluidas = []
+        self.desfazer()  # sobras de uma execução interrompida
+        f.adicionar_cliente(f"{PREFIXO}escrita", 150.0, self.psi, "Segunda-feira")
+        clientes = f.listar_clientes.sem_cache(self.psi)
+        self.cliente = int(clientes.loc[clientes["nome"] == f"{PREFIXO}escrita", "id"].iloc[0])
+        # sessões que os casos de update/exclusão consomem
+        total = 2 * repeticoes + 60
+        sessoes = f.gerar_sessoes_recorrentes(
+            self.cliente, "Segunda-feira", "08:00", date(2100, 1, 1), date(2100, 1, 1) + timedelta(weeks=total), 150.0
+        )
+        f.adicionar_sessoes_em_lote(sessoes)
+        self.ids = [int(i) for i in f.sessoes_por_cliente.sem_cache(self.cliente)["id"]]
+        self.para_excluir = list(self.ids[:repeticoes + 1])
+        self.lote = self.ids[-50:]
+
+    def _dia(self):
+        self.contador += 1
+        return date(2200, 1, 1) + timedelta(days=self.contador)
+
+    def adicionar_sessao(self):
+        f.adicionar_sessao(self.cliente, self._dia(), "09:00", 150.0, "realizada", False, False, "NF-",
+                           "conteúdo", "objetivo", "", "", 3, 4, "", "")
+        return 1
+
+    def adicionar_sessoes_em_lote(self):
+        self.contador += 1
+        inicio = date(2300 + self.contador, 1, 1)
+        return f.adicionar_sessoes_em_lote(f.gerar_sessoes_recorrentes(
+            self.cliente, "Quarta-feira", "10:00", inicio, inicio.replace(month=12, day=31), 150.0
+        ))
+
+    def update_sessao(self):
+        f.update_sessao(self.lote[0], self.contador % 2 == 0, 150.0, "realizada", False, "NF-1",
+                        "conteúdo", "objetivo", "", "", 3, 4, "", "")
+        self.contador += 1
+        return 1
+
+    def update_sessao_data_hora(self):
+        f.update_sessao_data_hora(self.lote[1], self._dia().isoformat(), "11:00")
+        return 1
+
+    def update_sessoes_em_lote(self):
+        self.contador += 1
+        return f.update_sessoes_em_lote(self.lote, pagamento=self.contador % 2 == 0)
+
+    def excluir_sessao(self):
+        self.excluidas.append(self.para_excluir.pop())
+        f.excluir_sessao(self.excluidas[-1])
+        return 1
+
+    def adicionar_cliente(self):
+        self.contador += 1
+        f.adicionar_cliente(f"{PREFIXO}novo_{self.contador:06d}", 150.0, self.psi, "Terça-feira")
+        return 1
+
+    def atualizar_nome_cliente(self):
+        self.contador += 1
+        f.atualizar_nome_cliente(self.cliente, f"{PREFIXO}escrita_{self.contador:06d}")
+        return 1
+
+    def atualizar_privilegio_usuario(self):
+        self.contador += 1
+        f.atualizar_privilegio_usuario(self.login_id, self.contador % 2)
+        return 1
+
+    def desfazer(self):
+        remover_clientes(f"{PREFIXO}escrita", f"{PREFIXO}novo_", sessoes_excluidas=self.excluidas)
+        f.atualizar_privilegio_usuario(self.login_id, 0)
+
+    def casos(self):
+        return [(nome, getattr(self, nome)) for nome in (
+            "adicionar_sessao", "adicionar_sessoes_em_lote", "update_sessao", "update_sessao_data_hora",
+            "update_sessoes_em_lote", "excluir_sessao", "adicionar_cliente", "atualizar_nome_cliente",
+            "atualizar_privilegio_usuario",
+        )]
+
+
+def _caminho_baseline(args):
+    return args.baseline or os.path.join(PASTA_BASELINES, f"funcoes_{f._backend.nome}.json")
+
+
+def _meta(args, base):
+    return {
+        "backend": f._backend.nome,
+        "psicologos": args.psicologos,
+        "clientes": args.clientes,
+        "anos": args.anos,
+        "semente": args.semente,
+        "fim": args.fim.isoformat(),
+        "sessoes": base.sessoes,
+    }
+
+
+def comparar(resultados, baseline, limites):
+    """
+    (caso, medida, atual, baseline) acima de baseline * (1 + tolerância) + folga;
+    `limites` = {medida: (tolerância, folga)}, ex.: {"p50_ms": (0.3, 1.0), "p95_ms": (0.5, 5.0)}.
+    """
+    regressoes = []
+    for nome, atual in resultados.items():
+        ref = baseline.get(nome)
+        if ref is None:
+            continue
+        for medida, (tolerancia, folga) in limites.items():
+            if medida in ref and atual[medida] > ref[medida] * (1 + tolerancia) + folga:
+                regressoes.append((nome, medida, atual[medida], ref[medida]))
+    return regressoes
+
+
+def main(argv=None):
+    parser = argumentos_base(argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    ))
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--baseline", help="arquivo do baseline (padrão: baselines/funcoes_<backend>.json)")
+    parser.add_argument("--gravar-baseline", action="store_true", help="grava as medições como novo baseline")
+    parser.add_argument("--sem-baseline", action="store_true", help="só mede, não compara")
+    parser.add_argument("--tolerancia", type=float, default=0.30, help="aumento relativo aceito no p50")
+    parser.add_argument("--folga-ms", type=float, default=1.0, help="aumento absoluto aceito no p50 (ruído)")
+    parser.add_argument("--tolerancia-p95", type=float, default=0.50, help="aumento relativo aceito no p95")
+    parser.add_argument("--folga-p95-ms", type=float, default=5.0, help="aumento absoluto aceito no p95 (ruído)")
+    parser.add_argument("--regerar", action="store_true", help="regera a base sintética mesmo se já existir")
+    parser.add_argument("--limpar", action="store_true", help="remove a base sintética no final")
+    args = parser.parse_args(argv)
+    verificar_backend(args.permitir_mysql)
+
+    base = garantir_base(args.psicologos, args.clientes, args.anos, args.semente, args.fim, regerar=args.regerar)
+    print(f"{f._backend.nome}: {len(base.psicologos)} psicólogas, {len(base.todos_clientes)} clientes, "
+          f"{base.sessoes} sessões\n")
+
+    resultados = {}
+    print(f"{'helper':<40} {'p50 (ms)':>9} {'p95 (ms)':>9} {'linhas':>7} {'linhas/s':>11}")
+    escritas = None
+    try:
+        escritas = _Escritas(base, args.repeticoes)
+        for nome, func in casos_leitura(base) + escritas.casos():
+            tempos, linhas = medir(func, args.repeticoes)
+            p50, p95 = statistics.median(tempos), _percentil(tempos, 0.95)
+            por_segundo = linhas / (p50 / 1000) if p50 > 0 else 0.0
+            resultados[nome] = {"p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "linhas": linhas,
+                                "linhas_s": round(por_segundo, 1)}
+            print(f"{nome:<40} {p50:>9.2f} {p95:>9.2f} {linhas:>7} {por_segundo:>11,.0f}")
+    finally:
+        if escritas is not None:
+            escritas.desfazer()
+        if args.limpar:
+            limpar()
+
+    caminho = _caminho_baseline(args)
+    meta = _meta(args, base)
+    if args.gravar_baseline:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "w") as arq:
+            json.dump({"meta": {**meta, "python": platform.python_version()}, "casos": resultados},
+                      arq, indent=2, ensure_ascii=False)
+            arq.write("\n")
+        print(f"\nBaseline gravado em {caminho}")
+        return 0
+    if args.sem_baseline:
+        return 0
+    if not os.path.exists(caminho):
+        print(f"\nSem baseline em {caminho} (use --gravar-baseline).")
+        return 0
+
+    with open(caminho) as arq:
+        baseline = json.load(arq)
+    divergentes = {k: (baseline["meta"].get(k), meta[k]) for k in PARAMETROS_BASE if baseline["meta"].get(k) != meta[k]}
+    if divergentes:
+        print(f"\nBaseline gerado com outros parâmetros: {divergentes} (baseline, atual).")
+        return 2
+    regressoes = comparar(resultados, baseline["casos"], {
+        "p50_ms": (args.tolerancia, args.folga_ms),
+        "p95_ms": (args.tolerancia_p95, args.folga_p95_ms),
+    })
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões) (p50: {args.tolerancia:.0%} + {args.folga_ms} ms, "
+              f"p95: {args.tolerancia_p95:.0%} + {args.folga_p95_ms} ms):")
+        for nome, medida, atual, ref in regressoes:
+            print(f"  {nome:<40} {medida:<7} {ref:>9.2f} -> {atual:>9.2f} ms")
+        return 1
+    print(f"\nSem regressões em relação a {caminho}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""
+Benchmark de renderização das páginas do app (streamlit.testing AppTest) nos backends locais.
+
+Dirige o app.py como um navegador: login, cada página do menu lateral e interações típicas
+(trocar ano/mês, período das pendências, abrir o diário de uma sessão, trocar de cliente,
+recarregar modelos) e, no fim, uma visita nova com o cookie de sessão ainda válido. Cada passo é
+um rerun; para cada um registra tempo de parede, consultas ao banco, chamadas ao GCS e quantos
+st.rerun() extras o script fez. O roteiro roda `--repeticoes` vezes, cada uma numa sessão nova
+(os caches do processo continuam quentes, como no servidor). Os passos "login: formulário",
+"login: entrar" e "boot: sessão restaurada" são o tempo até a primeira tela interativa; no fim
+imprime também o que o próprio app registrou (estatisticas_boot).
+
+    python -m benchmarks.bench_paginas                     # mede e compara com o baseline
+    python -m benchmarks.bench_paginas --gravar-baseline
+    python -m benchmarks.bench_paginas --psicologos 5 --clientes 40 --anos 2 --sem-baseline
+
+Sempre roda com DB_BACKEND=sqlite e GCS_BACKEND=local (dados sintéticos de
+benchmarks.dados_sinteticos, mantidos no banco salvo com `--limpar`, e PDFs de exemplo no bucket local). Regressão = p50 acima de
+baseline * (1 + tolerância) + folga, ou mais consultas/chamadas ao GCS/reruns que no baseline.
+"""
+import os
+
+# backends locais: precisam estar no ambiente antes do import de db.functions
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_CAMINHO", "dados/bench.sqlite3")
+os.environ.setdefault("GCS_BACKEND", "local")
+os.environ.setdefault("GCS_LOCAL_PASTA", "dados/bench_gcs")
+os.environ.setdefault("GCS_BUCKET_NAME", "bench")
+os.environ.setdefault("cookies_password", "bench")
+
+import argparse
+import io
+import json
+import logging
+import platform
+import statistics
+import sys
+import threading
+import time
+import types
+from collections import Counter
+from datetime import date, timedelta
+from functools import wraps
+
+import streamlit
+from streamlit.logger import get_logger
+from streamlit.testing.v1 import AppTest
+
+import db.functions as f
+from benchmarks.bench_funcoes import PARAMETROS_BASE, PASTA_BASELINES, comparar
+from benchmarks.dados_sinteticos import argumentos_base, garantir_base, limpar
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIPOS_PRONTUARIO = ["Questionários", "Testes Corrigidos", "Laudos", "Contrato"]
+CATEGORIAS_MODELOS = ["Testes", "Laudos", "Contratos"]
+PDF_EXEMPLO = b"%PDF-1.4\n% benchmark\n" + b"0" * 20_000 + b"\n%%EOF\n"
+
+
+# --------------------------------
+# Stand-ins e instrumentação
+# --------------------------------
+class _CookiesLocais(dict):
+    """
+    EncryptedCookieManager sem navegador (o componente real depende do frontend).
+    save() grava em `navegador`, que as próximas sessões do app leem, como os cookies de verdade.
+    """
+
+    navegador = {}
+
+    def __init__(self, password=None, prefix="", path=None):
+        super().__init__(_CookiesLocais.navegador)
+
+    def ready(self):
+        return True
+
+    def save(self):
+        _CookiesLocais.navegador = dict(self)
+
+
+def _instalar_cookies_locais():
+    modulo = types.ModuleType("streamlit_cookies_manager")
+    modulo.EncryptedCookieManager = _CookiesLocais
+    sys.modules["streamlit_cookies_manager"] = modulo
+
+
+class Contadores:
+    """Contagens do passo atual; as leituras em paralelo incrementam de outras threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.valores = Counter()
+
+    def somar(self, nome):
+        with self._lock:
+            self.valores[nome] += 1
+
+    def zerar(self):
+        with self._lock:
+            self.valores = Counter()
+
+
+def _contar(classe, metodo, contadores, nome):
+    original = getattr(classe, metodo)
+
+    @wraps(original)
+    def contado(*args, **kwargs):
+        contadores.somar(nome)
+        return original(*args, **kwargs)
+
+    setattr(classe, metodo, contado)
+
+
+def instrumentar(contadores):
+    """Conta execute/executemany do SQLite, operações do GCS local e chamadas a st.rerun()."""
+    for metodo in ("execute", "executemany"):
+        _contar(f._CursorSQLite, metodo, contadores, "consultas")
+    _contar(f._BucketLocal, "list_blobs", contadores, "gcs")
+    _contar(f._BlobLocal, "upload_from_file", contadores, "gcs")
+    _contar(f._BlobLocal, "download_as_bytes", contadores, "gcs")
+    _contar(streamlit, "rerun", contadores, "reruns")  # app.py resolve st.rerun a cada chamada
+
+
+def semear_gcs(nome_cliente):
+    """PDFs de exemplo nos prontuários do cliente e na coletânea de modelos."""
+    bucket = os.environ["GCS_BUCKET_NAME"]
+    caminhos = [f"{nome_cliente}/{tipo}/{tipo}_exemplo_{i}.pdf" for tipo in TIPOS_PRONTUARIO for i in range(2)]
+    caminhos += [f"modelos/{tipo}/{tipo}_modelo_{i}.pdf" for tipo in CATEGORIAS_MODELOS for i in range(3)]
+    for caminho in caminhos:
+        f.upload_para_gcs(bucket, caminho, io.BytesIO(PDF_EXEMPLO))
+
+
+# --------------------------------
+# Roteiro
+# --------------------------------
+def _selecionar_pagina(pagina):
+    return lambda at, ctx: _widget(at.sidebar.selectbox, "Escolha uma opção").select(pagina).run()
+
+
+def _widget(elementos, rotulo):
+    for elemento in elementos:
+        if elemento.label == rotulo:
+            return elemento
+    raise LookupError(f"widget {rotulo!r} não encontrado")
+
+
+def _entrar(at, ctx):
+    _widget(at.text_input, "Usuário").input(ctx["usuario"])
+    _widget(at.text_input, "Senha").input(ctx["senha"])
+    return _widget(at.button, "Entrar").click().run()
+
+
+def _nova_sessao(ctx):
+    """Outra aba do navegador: sessão nova do app, com os cookies gravados até aqui."""
+    return AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=ctx["tempo_max"])
+
+
+def _mes_anterior(hoje):
+    return 12 if hoje.month == 1 else hoje.month - 1
+
+
+def roteiro(ctx):
+    """(passo, ação) na ordem em que um usuário navegaria; a ação devolve o AppTest dos passos seguintes."""
+    hoje = date.today()
+    chave = f"dash_{ctx['psicologo']}_"
+    return [
+        ("login: formulário", lambda at, c: at.run()),
+        ("login: entrar", _entrar),
+        ("dashboard", lambda at, c: at.run()),
+        ("dashboard: ano anterior", lambda at, c: at.selectbox(key=chave + "anual_ano_select").select(hoje.year - 1).run()),
+        ("dashboard: mês anterior",
+         lambda at, c: at.selectbox(key=chave + "mensal_mes_select").select(_mes_anterior(hoje)).run()),
+        ("dashboard: período pendências",
+         lambda at, c: at.date_input(key=chave + "pend_dt_inicio").set_value(hoje - timedelta(days=180)).run()),
+        ("gerenciar_cliente", _selecionar_pagina("🧑 Gerenciar Clientes")),
+        ("gerenciar_cliente: abrir diário", lambda at, c: at.toggle[0].set_value(True).run()),
+        ("gerenciar_cliente: sessões por página",
+         lambda at, c: at.selectbox(key="tamanho_pagina_sessoes").select(50).run()),
+        ("gerenciar_cliente: mês anterior",
+         lambda at, c: _widget(at.selectbox, "📅 Mês").select(_mes_anterior(hoje)).run()),
+        ("gerenciar_cliente: outro cliente",
+         lambda at, c: _widget(at.sidebar.selectbox, "Cliente").select(c["outro_cliente"]).run()),
+        ("modelos", _selecionar_pagina("📚 Coletânia de Modelos")),
+        ("modelos: recarregar", lambda at, c: at.button(key="reload_Testes").click().run()),
+        ("perfil", _selecionar_pagina("👤 Perfil")),
+        ("edicao_usuarios", _selecionar_pagina("✅ Edição de Usuários")),
+        ("dashboard: volta", _selecionar_pagina("🏠 Página Inicial")),
+        ("boot: sessão restaurada", lambda at, c: _nova_sessao(c).run()),
+    ]
+
+
+def executar_roteiro(ctx, contadores):
+    """Uma sessão nova do app percorrendo o roteiro; {passo: {ms, consultas, gcs, reruns}}."""
+    _CookiesLocais.navegador = {}
+    at = _nova_sessao(ctx)
+    medidas = {}
+    for passo, acao in roteiro(ctx):
+        contadores.zerar()
+        inicio = time.perf_counter()
+        at = acao(at, ctx)
+        ms = (time.perf_counter() - inicio) * 1000
+        if at.exception:
+            raise RuntimeError(f"{passo}: {at.exception[0].message}")
+        medidas[passo] = {"ms": ms, **{k: contadores.valores[k] for k in ("consultas", "gcs", "reruns")}}
+    return medidas
+
+
+def _resumir(execucoes):
+    resultados = {}
+    for passo in execucoes[0]:
+        tempos = sorted(e[passo]["ms"] for e in execucoes)
+        resultados[passo] = {
+            "p50_ms": round(statistics.median(tempos), 3),
+            "p95_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3),
+            # primeira sessão pega os caches do processo frios; as contagens usam a mediana
+            "frio_ms": round(execucoes[0][passo]["ms"], 3),
+            **{k: int(statistics.median(e[passo][k] for e in execucoes)) for k in ("consultas", "gcs", "reruns")},
+        }
+    return resultados
+
+
+def comparar_contagens(resultados, baseline):
+    """Passos que passaram a fazer mais consultas/chamadas ao GCS/reruns que no baseline."""
+    regressoes = []
+    for passo, atual in resultados.items():
+        ref = baseline.get(passo)
+        if ref is None:
+            continue
+        for medida in ("consultas", "gcs", "reruns"):
+            if atual[medida] > ref.get(medida, 0):
+                regressoes.append((passo, medida, atual[medida], ref.get(medida, 0)))
+    return regressoes
+
+
+def main(argv=None):
+    parser = argumentos_base(argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    ))
+    parser.add_argument("--repeticoes", type=int, default=5, help="sessões completas do roteiro")
+    parser.add_argument("--tempo-max", type=float, default=120, help="segundos por rerun no AppTest")
+    parser.add_argument("--baseline", help="arquivo do baseline (padrão: baselines/paginas_sqlite.json)")
+    parser.add_argument("--gravar-baseline", action="store_true")
+    parser.add_argument("--sem-baseline", action="store_true")
+    parser.add_argument("--tolerancia", type=float, default=0.30, help="aumento relativo aceito no p50")
+    parser.add_argument("--folga-ms", type=float, default=20.0, help="aumento absoluto aceito no p50 (ruído)")
+    parser.add_argument("--regerar", action="store_true", help="regera a base sintética mesmo se já existir")
+    parser.add_argument("--limpar", action="store_true", help="remove a base sintética no final")
+    args = parser.parse_args(argv)
+    if f._backend.nome != "sqlite" or os.environ["GCS_BACKEND"] != "local":
+        raise SystemExit("bench_paginas só roda nos backends locais (DB_BACKEND=sqlite, GCS_BACKEND=local).")
+
+    os.chdir(RAIZ)  # o app abre assets/ por caminho relativo
+    # avisos de depreciação a cada rerun; filtro porque o AppTest restaura o nível do logger
+    get_logger("streamlit.deprecation_util").addFilter(lambda registro: registro.levelno >= logging.ERROR)
+    _instalar_cookies_locais()
+
+    base = garantir_base(args.psicologos, args.clientes, args.anos, args.semente, args.fim, regerar=args.regerar)
+    psicologo = base.psicologos[0]
+    _, usuario, senha = base.usuarios[0]  # login de psicóloga: vê também a Edição de Usuários
+    # a página abre no primeiro cliente por nome; o roteiro depois troca para o segundo
+    clientes = f.listar_clientes(psicologo).sort_values("nome")
+    semear_gcs(clientes["nome"].iloc[0])
+    ctx = {"psicologo": psicologo, "usuario": usuario, "senha": senha, "outro_cliente": int(clientes["id"].iloc[1]),
+           "tempo_max": args.tempo_max}
+    print(f"sqlite: {len(base.todos_clientes)} clientes, {base.sessoes} sessões; "
+          f"{args.repeticoes} sessões do roteiro\n")
+
+    contadores = Contadores()
+    instrumentar(contadores)
+    try:
+        execucoes = [executar_roteiro(ctx, contadores) for _ in range(args.repeticoes)]
+    finally:
+        if args.limpar:
+            limpar()
+    resultados = _resumir(execucoes)
+
+    print(f"{'passo':<36} {'p50 (ms)':>9} {'p95 (ms)':>9} {'frio (ms)':>10} {'consultas':>10} {'gcs':>5} {'reruns':>7}")
+    for passo, r in resultados.items():
+        print(f"{passo:<36} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['frio_ms']:>10.1f} "
+              f"{r['consultas']:>10} {r['gcs']:>5} {r['reruns']:>7}")
+    print(f"\n{'primeira tela interativa (app)':<36} {'p50 (ms)':>9} {'p95 (ms)':>9} {'execuções':>10}")
+    for etapa, r in f.estatisticas_boot().items():
+        print(f"{etapa:<36} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['execucoes_max']:>10}")
+
+    caminho = args.baseline or os.path.join(PASTA_BASELINES, "paginas_sqlite.json")
+    meta = {"backend": "sqlite", "psicologos": args.psicologos, "clientes": args.clientes,
+            "anos": args.anos, "semente": args.semente, "fim": args.fim.isoformat()}
+    if args.gravar_baseline:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "w") as arq:
+            json.dump({"meta": {**meta, "python": platform.python_version(), "streamlit": streamlit.__version__},
+                       "passos": resultados}, arq, indent=2, ensure_ascii=False)
+            arq.write("\n")
+        print(f"\nBaseline gravado em {caminho}")
+        return 0
+    if args.sem_baseline:
+        return 0
+    if not os.path.exists(caminho):
+        print(f"\nSem baseline em {caminho} (use --gravar-baseline).")
+        return 0
+
+    with open(caminho) as arq:
+        baseline = json.load(arq)
+    divergentes = {k: (baseline["meta"].get(k), meta[k]) for k in PARAMETROS_BASE if baseline["meta"].get(k) != meta[k]}
+    if divergentes:
+        print(f"\nBaseline gerado com outros parâmetros: {divergentes} (baseline, atual).")
+        return 2
+    # só o p50: com poucas sessões do roteiro o p95 é a mais lenta, quase sempre a fria
+    lentos = comparar(resultados, baseline["passos"], {"p50_ms": (args.tolerancia, args.folga_ms)})
+    contagens = comparar_contagens(resultados, baseline["passos"])
+    if lentos or contagens:
+        print()
+        for passo, medida, atual, ref in lentos:
+            print(f"  {passo:<36} {medida} {ref:>9.1f} -> {atual:>9.1f} ms")
+        for passo, medida, atual, ref in contagens:
+            print(f"  {passo:<36} {medida} {ref} -> {atual}")
+        return 1
+    print(f"\nSem regressões em relação a {caminho}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
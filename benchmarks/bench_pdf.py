@@ -0,0 +1,148 @@
+"""
+Benchmark dos relatórios em PDF (gerar_pdf_texto e gerar_pdf_pendencias).
+
+Gera os dois relatórios para clientes sintéticos com 10, 100 e 1.000 sessões; o mensal nas
+duas finalidades (Cliente: só a listagem; Psicólogo: com o diário, como em com_detalhes) e o
+de pendências uma vez por tamanho (não tem finalidade). Para cada caso registra tempo
+(p50/p95), pico de memória alocada (tracemalloc) e tamanho do PDF, e compara com o baseline:
+sai com código 1 se qualquer medida passou da tolerância.
+
+    python -m benchmarks.bench_pdf                     # mede e compara
+    python -m benchmarks.bench_pdf --gravar-baseline
+    python -m benchmarks.bench_pdf --tamanhos 10 100 1000 5000 --sem-baseline
+
+Os dados vêm de benchmarks.dados_sinteticos.sessoes_sinteticas (em memória, sem banco).
+"""
+import os
+
+# nenhum caso consulta o banco; o SQLite local só evita abrir conexão com o MySQL no import
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_CAMINHO", "dados/bench.sqlite3")
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import fpdf
+
+from benchmarks.bench_funcoes import PASTA_BASELINES
+from benchmarks.dados_sinteticos import sessoes_sinteticas
+from db.functions import gerar_pdf_pendencias, gerar_pdf_texto
+
+CLIENTE = "Cliente Sintético"
+MES, ANO = 12, 2025
+
+
+def casos(tamanhos, semente):
+    """(nome, função sem argumentos que devolve os bytes do PDF)."""
+    lista = []
+    for n in tamanhos:
+        listagem = sessoes_sinteticas(n, semente, detalhes=False)
+        completo = sessoes_sinteticas(n, semente)
+        # gerar_pdf_texto normaliza tipos no próprio DataFrame: cada chamada recebe uma cópia
+        lista += [
+            (f"mensal[Cliente,{n}]", lambda d=listagem: gerar_pdf_texto(d.copy(), CLIENTE, MES, ANO, "Cliente")),
+            (f"mensal[Psicólogo,{n}]", lambda d=completo: gerar_pdf_texto(d.copy(), CLIENTE, MES, ANO, "Psicólogo")),
+            (f"pendencias[{n}]", lambda d=listagem: gerar_pdf_pendencias(d, CLIENTE)),
+        ]
+    return lista
+
+
+def medir_caso(func, repeticoes):
+    func()  # aquecimento
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        conteudo = func()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    # memória numa chamada à parte: o tracemalloc deixa a execução bem mais lenta
+    tracemalloc.start()
+    func()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tempos.sort()
+    return {
+        "p50_ms": round(statistics.median(tempos), 3),
+        "p95_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3),
+        "pico_kb": round(pico / 1024, 1),
+        "bytes": len(conteudo),
+    }
+
+
+def comparar(resultados, baseline, limites):
+    """(caso, medida, atual, baseline) acima de baseline * (1 + tolerância) + folga."""
+    regressoes = []
+    for nome, atual in resultados.items():
+        ref = baseline.get(nome)
+        if ref is None:
+            continue
+        for medida, (tolerancia, folga) in limites.items():
+            if atual[medida] > ref[medida] * (1 + tolerancia) + folga:
+                regressoes.append((nome, medida, atual[medida], ref[medida]))
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10, 100, 1000], help="sessões por cliente")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--repeticoes", type=int, default=7)
+    parser.add_argument("--baseline", help="arquivo do baseline (padrão: baselines/pdf.json)")
+    parser.add_argument("--gravar-baseline", action="store_true")
+    parser.add_argument("--sem-baseline", action="store_true")
+    parser.add_argument("--tolerancia", type=float, default=0.30, help="aumento relativo aceito no p50")
+    parser.add_argument("--folga-ms", type=float, default=25.0, help="aumento absoluto aceito no p50 (ruído)")
+    parser.add_argument("--tolerancia-memoria", type=float, default=0.25, help="aumento relativo aceito no pico")
+    parser.add_argument("--folga-kb", type=float, default=256.0)
+    parser.add_argument("--tolerancia-tamanho", type=float, default=0.02, help="aumento relativo aceito no PDF")
+    parser.add_argument("--folga-bytes", type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    resultados = {}
+    print(f"{'caso':<24} {'p50 (ms)':>9} {'p95 (ms)':>9} {'pico (KB)':>10} {'PDF (KB)':>9}")
+    for nome, func in casos(args.tamanhos, args.semente):
+        r = medir_caso(func, args.repeticoes)
+        resultados[nome] = r
+        print(f"{nome:<24} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['pico_kb']:>10,.0f} {r['bytes'] / 1024:>9,.0f}")
+
+    caminho = args.baseline or os.path.join(PASTA_BASELINES, "pdf.json")
+    meta = {"tamanhos": args.tamanhos, "semente": args.semente}
+    if args.gravar_baseline:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "w") as arq:
+            json.dump({"meta": {**meta, "python": platform.python_version(), "fpdf": fpdf.__version__},
+                       "casos": resultados}, arq, indent=2, ensure_ascii=False)
+            arq.write("\n")
+        print(f"\nBaseline gravado em {caminho}")
+        return 0
+    if args.sem_baseline:
+        return 0
+    if not os.path.exists(caminho):
+        print(f"\nSem baseline em {caminho} (use --gravar-baseline).")
+        return 0
+
+    with open(caminho) as arq:
+        baseline = json.load(arq)
+    if baseline["meta"].get("semente") != args.semente:
+        print(f"\nBaseline gerado com outra semente ({baseline['meta'].get('semente')}).")
+        return 2
+    regressoes = comparar(resultados, baseline["casos"], {
+        "p50_ms": (args.tolerancia, args.folga_ms),
+        "pico_kb": (args.tolerancia_memoria, args.folga_kb),
+        "bytes": (args.tolerancia_tamanho, args.folga_bytes),
+    })
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões):")
+        for nome, medida, atual, ref in regressoes:
+            print(f"  {nome:<24} {medida:<8} {ref:>12,.1f} -> {atual:>12,.1f}")
+        return 1
+    print(f"\nSem regressões em relação a {caminho}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Benchmark das abas Anual e Mensal do dashboard conforme o histórico cresce.
+
+Cria um psicólogo temporário com N clientes e sessões semanais cobrindo 1, 2, 5, 10... anos,
+mede resumo_financeiro (lê de resumo_mensal) contra a forma antiga (YEAR()/MONTH() sobre
+s.data) e remove tudo no final.
+
+    python -m benchmarks.bench_resumo_financeiro --clientes 40 --anos 1 2 5 10 --repeticoes 20
+
+Roda no SQLite local por padrão (DB_BACKEND=sqlite). Contra um MySQL (variáveis do app: host,
+port, username, password, database...) só com --permitir-mysql, e nunca na base de produção:
+o benchmark insere e apaga dados.
+"""
+import os
+
+# precisa estar no ambiente antes do import de db.functions
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_CAMINHO", "dados/bench.sqlite3")
+os.environ["MOTOR_ANALITICO"] = "mysql"  # mede o rollup (resumo_mensal), não o snapshot DuckDB
+
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from benchmarks.dados_sinteticos import verificar_backend
+from db.functions import _alocador_ids, _reconstruir_resumo_mensal, get_mysql_conn, preparar_banco, resumo_financeiro
+
+NOME_PSICOLOGO = "__benchmark_resumo_financeiro__"
+
+SQL_ANTIGO = """
+    SELECT
+        c.nome,
+        COUNT(CASE WHEN s.status = 'realizada' THEN 1 END) AS sessoes_feitas,
+        COUNT(CASE WHEN s.status = 'falta' THEN 1 END) AS sessoes_faltas,
+        COALESCE(SUM(CASE WHEN s.status = 'realizada' AND s.pagamento THEN s.valor ELSE 0 END), 0) AS total_recebido,
+        COALESCE(SUM(CASE
+            WHEN (s.status = 'falta' AND s.cobrar = 1) OR
+                 (s.status = 'realizada' AND (s.pagamento = 0 OR s.pagamento IS NULL))
+            THEN s.valor ELSE 0 END), 0) AS total_a_receber
+    FROM clientes c
+    LEFT JOIN sessoes s ON c.id = s.cliente_id
+    WHERE {filtros}
+    GROUP BY c.nome
+    ORDER BY c.nome
+"""
+
+
+def resumo_antigo(psicologo_id, mes=None, ano=None):
+    filtros = ["c.psicologo_responsavel = %s"]
+    params = [psicologo_id]
+    if ano is not None:
+        filtros.append("YEAR(s.data) = %s")
+        params.append(ano)
+    if mes is not None:
+        filtros.append("MONTH(s.data) = %s")
+        params.append(mes)
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(SQL_ANTIGO.format(filtros=" AND ".join(filtros)), params)
+            return pd.DataFrame(cursor.fetchall())  # mesmo custo de montagem do helper
+
+
+def criar_base(qtd_clientes):
+    psicologo_id = _alocador_ids.proximo("psicologos")
+    clientes_ids = _alocador_ids.reservar("clientes", qtd_clientes)
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("INSERT INTO psicologos (id, nome) VALUES (%s, %s)", (psicologo_id, NOME_PSICOLOGO))
+            cursor.executemany(
+                "INSERT INTO clientes (id, nome, valor_sessao, psicologo_responsavel, dia_agendamento)"
+                " VALUES (%s, %s, %s, %s, %s)",
+                [(cid, f"{NOME_PSICOLOGO}{cid}", 150.0, psicologo_id, "Segunda-feira") for cid in clientes_ids],
+            )
+        conn.commit()
+    return psicologo_id, clientes_ids
+
+
+def inserir_ano(clientes_ids, ano):
+    """Uma sessão por semana por cliente no ano; ~10% faltas e ~20% não pagas."""
+    dia = date(ano, 1, 1)
+    datas = []
+    while dia.year == ano:
+        datas.append(dia)
+        dia += timedelta(days=7)
+    linhas = []
+    for i, cid in enumerate(clientes_ids):
+        for j, d in enumerate(datas):
+            falta = (i + j) % 10 == 0
+            pago = (i + j) % 5 != 0
+            linhas.append((cid, d, f"{8 + i % 12:02d}:00:00", 150.0, "falta" if falta else "realizada",
+                           int(falta), int(pago)))
+    ids = _alocador_ids.reservar("sessoes", len(linhas))
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO sessoes (id, cliente_id, data, hora, valor, status, cobrar, pagamento)"
+                " VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                [(sid,) + linha for sid, linha in zip(ids, linhas)],
+            )
+            # carga em massa: recalcula o rollup desses clientes de uma vez, não balde a balde
+            _reconstruir_resumo_mensal(cursor, clientes_ids)
+        conn.commit()
+    return len(linhas)
+
+
+def remover_base(psicologo_id, clientes_ids):
+    marcadores = ", ".join(["%s"] * len(clientes_ids))
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM resumo_mensal WHERE cliente_id IN ({marcadores})", clientes_ids)
+            cursor.execute(f"DELETE FROM sessoes WHERE cliente_id IN ({marcadores})", clientes_ids)
+            cursor.execute(f"DELETE FROM clientes WHERE id IN ({marcadores})", clientes_ids)
+            cursor.execute("DELETE FROM psicologos WHERE id = %s", (psicologo_id,))
+        conn.commit()
+
+
+def medir(func, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return statistics.median(tempos), tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=40)
+    parser.add_argument("--anos", type=int, nargs="+", default=[1, 2, 5, 10],
+                        help="tamanhos de histórico (em anos) a medir")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--permitir-mysql", action="store_true")
+    args = parser.parse_args(argv)
+    verificar_backend(args.permitir_mysql)
+    preparar_banco()
+
+    ano_atual = date.today().year
+    mes_atual = date.today().month
+    # resumo_financeiro tem cache; o benchmark mede a consulta
+    resumo_novo = resumo_financeiro.sem_cache
+
+    psicologo_id, clientes_ids = criar_base(args.clientes)
+    total_sessoes = 0
+    anos_inseridos = 0
+    try:
+        print(f"{'anos':>5} {'sessoes':>8} | {'aba':<7} {'antigo p50/p95 (ms)':>22} {'rollup p50/p95 (ms)':>24}")
+        for anos in sorted(args.anos):
+            while anos_inseridos < anos:
+                total_sessoes += inserir_ano(clientes_ids, ano_atual - anos_inseridos)
+                anos_inseridos += 1
+            casos = [
+                ("Anual", lambda: resumo_antigo(psicologo_id, ano=ano_atual),
+                          lambda: resumo_novo(psicologo_id, ano=ano_atual)),
+                ("Mensal", lambda: resumo_antigo(psicologo_id, mes=mes_atual, ano=ano_atual),
+                           lambda: resumo_novo(psicologo_id, mes=mes_atual, ano=ano_atual)),
+            ]
+            for aba, antigo, novo in casos:
+                a50, a95 = medir(antigo, args.repeticoes)
+                n50, n95 = medir(novo, args.repeticoes)
+                print(f"{anos:>5} {total_sessoes:>8} | {aba:<7} {a50:>10.2f} / {a95:<9.2f} {n50:>12.2f} / {n95:<9.2f}")
+    finally:
+        remover_base(psicologo_id, clientes_ids)
+
+
+if __name__ == "__main__":
+    main()
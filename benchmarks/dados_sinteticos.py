@@ -0,0 +1,331 @@
+"""
+Gerador determinístico de dados sintéticos (psicologos, login, clientes, sessoes).
+
+Mesma semente + mesmos tamanhos + mesmo fim = mesma base, para comparar medições entre execuções
+(as sessões terminam em FIM, uma data fixa, e não no dia em que o script roda).
+Tudo que é criado leva o prefixo PREFIXO no nome e só sai com `--limpar` (aqui ou nos
+benchmarks): sem ele a base fica no banco e a próxima execução com os mesmos parâmetros a
+reaproveita. Os tamanhos padrão
+(PSICOLOGOS x CLIENTES x ANOS: 24 psicólogas, 3.000 clientes, ~470 mil sessões semanais) são
+a escala real em que os baselines são gravados; os caminhos que dependem do volume (rollup,
+páginas por cursor, snapshot) só aparecem no gate nesse tamanho.
+
+    DB_BACKEND=sqlite python -m benchmarks.dados_sinteticos
+    DB_BACKEND=sqlite python -m benchmarks.dados_sinteticos --psicologos 5 --clientes 40 --anos 2
+    DB_BACKEND=sqlite python -m benchmarks.dados_sinteticos --limpar
+
+Num MySQL só roda com --permitir-mysql (nunca aponte para a base de produção).
+"""
+import argparse
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta, time as dtime
+
+import pandas as pd
+
+from db.functions import (
+    COLUNAS_SESSAO_LISTA,
+    DIAS_SEMANA,
+    ESQUEMA_SESSOES,
+    _alocador_ids,
+    _backend,
+    _coluna_tipada,
+    _reconstruir_resumo_mensal,
+    get_mysql_conn,
+    invalidar_cache,
+    preparar_banco,
+)
+
+PREFIXO = "__bench__"
+SENHA = "bench"
+LOTE_INSERT = 5000
+# escala real (padrão dos benchmarks e dos baselines gravados)
+PSICOLOGOS, CLIENTES, ANOS = 24, 125, 3
+FIM = date(2025, 12, 31)  # última data com sessões
+
+TEXTOS = [
+    "Relato de semana estável, sono regular.",
+    "Ansiedade antes de provas; trabalhamos respiração.",
+    "Conflito familiar retomado, cliente mais reflexivo.",
+    "Revisão das metas do mês e combinados.",
+    "Aplicação de questionário e devolutiva parcial.",
+]
+
+
+@dataclass
+class BaseSintetica:
+    psicologos: list = field(default_factory=list)   # ids
+    usuarios: list = field(default_factory=list)     # (id, usuario, senha)
+    clientes: dict = field(default_factory=dict)     # psicologo_id -> [cliente_id]
+    sessoes: int = 0
+    segundos: float = 0.0
+    fim: date = FIM
+
+    @property
+    def todos_clientes(self):
+        return [c for ids in self.clientes.values() for c in ids]
+
+
+def _como_like(prefixo):
+    """Padrão LIKE de "começa com `prefixo`" ('_' é curinga no LIKE: escapado com '!')."""
+    return prefixo.replace("!", "!!").replace("_", "!_").replace("%", "!%") + "%"
+
+
+def _prefixo_psicologo(anos, semente, fim):
+    # semente, anos e fim no nome: uma base gerada com outros parâmetros não é reaproveitada
+    return f"{PREFIXO}s{semente}_{anos}a_{fim:%Y%m%d}_psi_"
+
+
+def _anos_antes(dia, anos):
+    """Mesmo dia `anos` anos antes (29/02 vira 28/02 em ano não bissexto)."""
+    try:
+        return dia.replace(year=dia.year - anos)
+    except ValueError:
+        return dia.replace(year=dia.year - anos, day=28)
+
+
+def _semanas(dia_semana, inicio, fim):
+    dia = inicio + timedelta(days=(dia_semana - inicio.weekday()) % 7)
+    while dia <= fim:
+        yield dia
+        dia += timedelta(days=7)
+
+
+def _linha_sessao(rnd, cliente_id, dia, hora, valor):
+    falta = rnd.random() < 0.10
+    pago = rnd.random() < 0.80
+    return (
+        cliente_id, dia, hora, valor,
+        "falta" if falta else "realizada",
+        int(falta and rnd.random() < 0.5),
+        int(pago),
+        f"NF-{rnd.randint(1000, 9999)}" if pago else "NF-",
+        rnd.choice(TEXTOS), rnd.choice(TEXTOS), "", rnd.choice(TEXTOS),
+        rnd.randint(1, 5), rnd.randint(1, 5), "", "",
+    )
+
+
+def _inserir_lotes(cursor, sql, linhas):
+    for i in range(0, len(linhas), LOTE_INSERT):
+        cursor.executemany(sql, linhas[i:i + LOTE_INSERT])
+
+
+def sessoes_sinteticas(quantidade, semente=42, detalhes=True, fim=FIM):
+    """
+    DataFrame com `quantidade` sessões semanais de um cliente até `fim` (mais recentes primeiro),
+    tipado como as listagens de db.functions e sem passar pelo banco. Com `detalhes`, traz também
+    os campos do diário (o que com_detalhes acrescenta). `fim` fixo: mesma entrada a cada execução.
+    """
+    rnd = random.Random(semente)
+    linhas = [
+        (i + 1,) + _linha_sessao(rnd, 1, fim - timedelta(weeks=i), dtime(14, 0), 150.0)
+        for i in range(quantidade)
+    ]
+    colunas = list(ESQUEMA_SESSOES)  # mesma ordem de _linha_sessao, com o id na frente
+    valores = list(zip(*linhas)) if linhas else [()] * len(colunas)
+    df = pd.DataFrame({c: _coluna_tipada(list(v), ESQUEMA_SESSOES[c]) for c, v in zip(colunas, valores)})
+    return df if detalhes else df[COLUNAS_SESSAO_LISTA].copy()
+
+
+def carregar_base():
+    """BaseSintetica a partir do que já está no banco (sem regerar)."""
+    base = BaseSintetica()
+    padrao = _como_like(PREFIXO)
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM psicologos WHERE nome LIKE %s ESCAPE '!' ORDER BY id", (padrao,))
+            base.psicologos = [r["id"] for r in cursor.fetchall()]
+            cursor.execute("SELECT id, usuario, senha FROM login WHERE usuario LIKE %s ESCAPE '!' ORDER BY id", (padrao,))
+            base.usuarios = [(r["id"], r["usuario"], r["senha"]) for r in cursor.fetchall()]
+            cursor.execute(
+                "SELECT id, psicologo_responsavel FROM clientes WHERE nome LIKE %s ESCAPE '!' ORDER BY id", (padrao,)
+            )
+            for r in cursor.fetchall():
+                base.clientes.setdefault(r["psicologo_responsavel"], []).append(r["id"])
+            if base.clientes:
+                marcadores = ", ".join(["%s"] * len(base.todos_clientes))
+                cursor.execute(
+                    f"SELECT COUNT(*) AS n FROM sessoes WHERE cliente_id IN ({marcadores})", base.todos_clientes
+                )
+                base.sessoes = cursor.fetchone()["n"]
+    return base
+
+
+def gerar(psicologos=PSICOLOGOS, clientes=CLIENTES, anos=ANOS, semente=42, fim=FIM):
+    """
+    Cria `psicologos` psicólogas (cada uma com login próprio e um login de assistente),
+    `clientes` clientes por psicóloga e uma sessão semanal por cliente nos `anos` anos até `fim`
+    (~10% faltas, ~80% pagas, diário preenchido). Retorna a BaseSintetica criada.
+    """
+    inicio_relogio = time.perf_counter()
+    rnd = random.Random(semente)
+    inicio = _anos_antes(fim, anos)
+    dias = list(DIAS_SEMANA.items())
+    base = BaseSintetica(fim=fim)
+
+    base.psicologos = _alocador_ids.reservar("psicologos", psicologos)
+    ids_login = _alocador_ids.reservar("login", 2 * psicologos)
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO psicologos (id, nome) VALUES (%s, %s)",
+                [(pid, f"{_prefixo_psicologo(anos, semente, fim)}{i:03d}") for i, pid in enumerate(base.psicologos)],
+            )
+            logins = []
+            for i, pid in enumerate(base.psicologos):
+                logins.append((ids_login[2 * i], f"{PREFIXO}psi_{i:03d}", SENHA, "Psicóloga", pid, 1))
+                logins.append((ids_login[2 * i + 1], f"{PREFIXO}assist_{i:03d}", SENHA, "Assistente", pid, 0))
+            cursor.executemany(
+                "INSERT INTO login (id, usuario, senha, funcao, psicologo_responsavel, privilegio)"
+                " VALUES (%s, %s, %s, %s, %s, %s)",
+                logins,
+            )
+            base.usuarios = [(lid, usuario, senha) for lid, usuario, senha, *_ in logins]
+
+            linhas_clientes, linhas_sessoes = [], []
+            for i, pid in enumerate(base.psicologos):
+                ids_clientes = _alocador_ids.reservar("clientes", clientes)
+                base.clientes[pid] = ids_clientes
+                for j, cid in enumerate(ids_clientes):
+                    nome_dia, dia_semana = dias[rnd.randrange(len(dias))]
+                    valor = float(rnd.choice([100, 120, 150, 180, 200]))
+                    hora = f"{rnd.randint(8, 20):02d}:{rnd.choice([0, 30]):02d}:00"
+                    linhas_clientes.append((cid, f"{PREFIXO}cli_{i:03d}_{j:04d}", valor, pid, nome_dia))
+                    for dia in _semanas(dia_semana, inicio, fim):
+                        linhas_sessoes.append(_linha_sessao(rnd, cid, dia, hora, valor))
+
+            cursor.executemany(
+                "INSERT INTO clientes (id, nome, valor_sessao, psicologo_responsavel, dia_agendamento)"
+                " VALUES (%s, %s, %s, %s, %s)",
+                linhas_clientes,
+            )
+            ids_sessoes = _alocador_ids.reservar("sessoes", len(linhas_sessoes))
+            _inserir_lotes(
+                cursor,
+                "INSERT INTO sessoes (id, cliente_id, data, hora, valor, status, cobrar, pagamento, nota_fiscal,"
+                " conteudo, objetivo, material, atividade_casa, emocao_entrada, emocao_saida, proxima_sessao,"
+                " observacao) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                [(sid,) + linha for sid, linha in zip(ids_sessoes, linhas_sessoes)],
+            )
+            # carga em massa: rollup recalculado de uma vez para os clientes gerados
+            _reconstruir_resumo_mensal(cursor, base.todos_clientes)
+        conn.commit()
+    invalidar_cache("psicologos", "login", "clientes", "sessoes")
+    base.sessoes = len(linhas_sessoes)
+    base.segundos = time.perf_counter() - inicio_relogio
+    return base
+
+
+def remover_clientes(*prefixos, sessoes_excluidas=()):
+    """
+    Remove os clientes cujo nome começa com um dos `prefixos` (com sessões e rollup) e as linhas
+    de `exclusoes` das sessões `sessoes_excluidas`. Devolve quantos clientes saíram.
+    """
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            clientes = []
+            for prefixo in prefixos:
+                cursor.execute("SELECT id FROM clientes WHERE nome LIKE %s ESCAPE '!'", (_como_like(prefixo),))
+                clientes += [r["id"] for r in cursor.fetchall()]
+            for i in range(0, len(clientes), 1000):
+                parte = clientes[i:i + 1000]
+                marcadores = ", ".join(["%s"] * len(parte))
+                cursor.execute(f"DELETE FROM resumo_mensal WHERE cliente_id IN ({marcadores})", parte)
+                cursor.execute(f"DELETE FROM sessoes WHERE cliente_id IN ({marcadores})", parte)
+                cursor.execute(f"DELETE FROM clientes WHERE id IN ({marcadores})", parte)
+            sessoes_excluidas = list(sessoes_excluidas)
+            for i in range(0, len(sessoes_excluidas), 1000):
+                parte = sessoes_excluidas[i:i + 1000]
+                marcadores = ", ".join(["%s"] * len(parte))
+                cursor.execute(
+                    f"DELETE FROM exclusoes WHERE tabela = 'sessoes' AND registro_id IN ({marcadores})", parte
+                )
+        conn.commit()
+    invalidar_cache("clientes", "sessoes")
+    return len(clientes)
+
+
+def limpar():
+    """Remove tudo que tem o prefixo PREFIXO (e o que depende disso, inclusive as linhas de `exclusoes`)."""
+    removidos = remover_clientes(PREFIXO)
+    padrao = _como_like(PREFIXO)
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            # excluir_sessao/excluir_cliente dos benchmarks registram aqui, com a psicóloga sintética
+            cursor.execute(
+                "DELETE FROM exclusoes WHERE psicologo_responsavel IN"
+                " (SELECT id FROM psicologos WHERE nome LIKE %s ESCAPE '!')",
+                (padrao,),
+            )
+            cursor.execute("DELETE FROM login WHERE usuario LIKE %s ESCAPE '!'", (padrao,))
+            cursor.execute("DELETE FROM psicologos WHERE nome LIKE %s ESCAPE '!'", (padrao,))
+        conn.commit()
+    invalidar_cache("psicologos", "login", "clientes", "sessoes")
+    return removidos
+
+
+def garantir_base(psicologos=PSICOLOGOS, clientes=CLIENTES, anos=ANOS, semente=42, fim=FIM, regerar=False):
+    """Reaproveita a base sintética já gravada com esses parâmetros; senão gera do zero."""
+    preparar_banco()
+    if not regerar:
+        with get_mysql_conn() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT COUNT(*) AS n FROM psicologos WHERE nome LIKE %s ESCAPE '!'",
+                    (_como_like(_prefixo_psicologo(anos, semente, fim)),),
+                )
+                mesma_geracao = cursor.fetchone()["n"] == psicologos
+        if mesma_geracao:
+            base = carregar_base()
+            if len(base.psicologos) == psicologos and len(base.todos_clientes) == psicologos * clientes:
+                base.fim = fim
+                return base
+    limpar()
+    return gerar(psicologos, clientes, anos, semente, fim)
+
+
+def verificar_backend(permitir_mysql):
+    if _backend.nome == "mysql" and not permitir_mysql:
+        raise SystemExit(
+            "DB_BACKEND=mysql: use DB_BACKEND=sqlite ou passe --permitir-mysql (nunca na base de produção)."
+        )
+
+
+def argumentos_base(parser):
+    """Argumentos de tamanho/semente compartilhados pelos benchmarks que usam a base sintética."""
+    parser.add_argument("--psicologos", type=int, default=PSICOLOGOS)
+    parser.add_argument("--clientes", type=int, default=CLIENTES, help="clientes por psicóloga")
+    parser.add_argument("--anos", type=int, default=ANOS, help="anos de sessões semanais")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--fim", type=date.fromisoformat, default=FIM,
+                        help=f"última data com sessões (AAAA-MM-DD, padrão {FIM.isoformat()})")
+    parser.add_argument("--permitir-mysql", action="store_true")
+    return parser
+
+
+def main(argv=None):
+    parser = argumentos_base(argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    ))
+    parser.add_argument("--limpar", action="store_true", help="só remove a base sintética")
+    args = parser.parse_args(argv)
+    verificar_backend(args.permitir_mysql)
+    preparar_banco()
+
+    removidos = limpar()
+    if args.limpar:
+        print(f"{removidos} clientes sintéticos removidos ({_backend.nome}).")
+        return
+    base = gerar(args.psicologos, args.clientes, args.anos, args.semente, args.fim)
+    print(
+        f"{len(base.psicologos)} psicólogas, {len(base.usuarios)} logins, {len(base.todos_clientes)} clientes, "
+        f"{base.sessoes} sessões em {base.segundos:.1f}s "
+        f"({base.sessoes / max(base.segundos, 1e-9):,.0f} sessões/s) — {_backend.nome}"
+        + (f" {os.getenv('SQLITE_CAMINHO', '')}" if _backend.nome == "sqlite" else "")
+    )
+
+
+if __name__ == "__main__":
+    main()
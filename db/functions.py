@@ -1,32 +1,100 @@
 import pymysql
 import pandas as pd
+import numpy as np
 import os
 import duckdb
 import streamlit as st
 import ssl
 import base64
 import tempfile
-from functools import lru_cache
+import threading
+import time
+import inspect
+import re
+import sqlite3
+import contextvars
+import concurrent.futures
+import io
+import atexit
+import json
+import shutil
+import glob
+import argparse
+import sys
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import lru_cache, partial, wraps
 from google.cloud import storage
 from typing import Optional
 from fpdf import FPDF
-from datetime import datetime
+from PIL import Image
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from datetime import date, datetime, timedelta, timezone, time as dtime
+
+# --------------------------------
+# Logos (lidos, decodificados e codificados uma vez por processo)
+# --------------------------------
+# O login embute o PNG em base64, a interface passa os bytes ao st.image e os PDFs usam
+# versões já reduzidas, gravadas uma vez por processo em arquivos temporários e entregues
+# ao FPDF pelo self.image() (sem reabrir e reduzir o PNG original a cada documento).
+# Os PNGs dos PDFs saem sem canal alfa, já compostos sobre a cor de fundo das páginas:
+# o FPDF copia um PNG RGB direto para o PDF, mas separa o alfa pixel a pixel em Python.
+LOGO_CAMINHO = "assets/logo_neuro_sem_bk.png"
+LOGO_PDF_CAPA_MM = 150    # largura do logo na capa
+LOGO_PDF_PAGINA_MM = 35   # largura no cabeçalho das páginas internas
+LOGO_PDF_DPI = int(os.getenv("LOGO_PDF_DPI", "150"))
+PDF_COR_FUNDO = (14, 43, 58)
+
+def _png_reduzido(imagem, largura_mm):
+    """
+    Caminho de um PNG temporário com `imagem` (PIL) reduzida para `largura_mm` a LOGO_PDF_DPI
+    (nunca ampliada) e composta sobre PDF_COR_FUNDO. O arquivo é removido quando o processo termina.
+    """
+    largura = min(imagem.width, round(largura_mm / 25.4 * LOGO_PDF_DPI))
+    if largura < imagem.width:
+        imagem = imagem.resize((largura, max(1, round(imagem.height * largura / imagem.width))), Image.LANCZOS)
+    fundo = Image.new("RGBA", imagem.size, PDF_COR_FUNDO + (255,))
+    imagem = Image.alpha_composite(fundo, imagem.convert("RGBA")).convert("RGB")
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as arq:
+        imagem.save(arq, format="PNG", optimize=True)
+    atexit.register(os.remove, arq.name)
+    return arq.name
+
+class _Logo:
+    def __init__(self, caminho):
+        with open(caminho, "rb") as arq:
+            self.png = arq.read()
+        self.base64 = base64.b64encode(self.png).decode()
+        imagem = Image.open(io.BytesIO(self.png))
+        imagem.load()
+        self.pdf_capa = _png_reduzido(imagem, LOGO_PDF_CAPA_MM)
+        self.pdf_pagina = _png_reduzido(imagem, LOGO_PDF_PAGINA_MM)
+
+@lru_cache(maxsize=None)
+def logo(caminho=LOGO_CAMINHO):
+    """
+    Logo carregado uma vez por processo: .png (bytes, para st.image), .base64 (HTML do login),
+    .pdf_capa / .pdf_pagina (caminhos dos PNGs reduzidos usados por PDF.header).
+    """
+    return _Logo(caminho)
+
 
 class PDF(FPDF):
     def header(self):
-        self.set_fill_color(14, 43, 58)
+        self.set_fill_color(*PDF_COR_FUNDO)
         self.rect(0, 0, self.w, self.h, 'F')
 
         if self.page_no() == 1:
-            logo_width = 150
+            logo_width = LOGO_PDF_CAPA_MM
             x_center = (self.w - logo_width) / 2
             y_center = (self.h - logo_width) / 2 - 30
-            self.image("assets/logo_neuro_sem_bk.png", x=x_center, y=y_center, w=logo_width)
+            self.image(logo().pdf_capa, x=x_center, y=y_center, w=logo_width)
             self.logo_bottom_y = y_center + logo_width + 10
         else:
-            logo_width = 35
+            logo_width = LOGO_PDF_PAGINA_MM
             x_centered = (self.w - logo_width) / 2
-            self.image("assets/logo_neuro_sem_bk.png", x=x_centered, y=10, w=logo_width)
+            self.image(logo().pdf_pagina, x=x_centered, y=10, w=logo_width)
             self.ln(logo_width + 0)
 
     def footer(self):
@@ -48,12 +116,73 @@ def manual_load_dotenv(path="db/env.env"):
                 key, value = line.strip().split("=", 1)
                 os.environ[key] = value
                
-# rodar no Localhost
-#manual_load_dotenv()
-#print("Host do banco:", os.getenv("GCS_KEY_BASE64"))
+# rodar no Localhost: DB_ENV_ARQUIVO=db/env.env carrega as variáveis do arquivo
+if os.getenv("DB_ENV_ARQUIVO"):
+    manual_load_dotenv(os.environ["DB_ENV_ARQUIVO"])
+
+# GCS_BACKEND=local: objetos em GCS_LOCAL_PASTA/<bucket>/<caminho>, com a parte da interface
+# do google.cloud.storage que o app usa. Como o DB_BACKEND=sqlite, serve para rodar o app e os
+# benchmarks sem credencial e sem rede.
+class _BlobLocal:
+    def __init__(self, raiz, name):
+        self.name = name
+        self._caminho = os.path.join(raiz, *name.split("/"))
+
+    @property
+    def size(self):
+        return os.path.getsize(self._caminho) if os.path.exists(self._caminho) else None
+
+    @property
+    def updated(self):
+        if not os.path.exists(self._caminho):
+            return None
+        return datetime.fromtimestamp(os.path.getmtime(self._caminho), tz=timezone.utc)
+
+    def upload_from_file(self, arquivo, rewind=False):
+        if rewind:
+            arquivo.seek(0)
+        os.makedirs(os.path.dirname(self._caminho), exist_ok=True)
+        temporario = f"{self._caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, "wb") as destino:
+            destino.write(arquivo.read())
+        os.replace(temporario, self._caminho)
+
+    def download_as_bytes(self):
+        with open(self._caminho, "rb") as origem:
+            return origem.read()
+
+class _BucketLocal:
+    def __init__(self, raiz, name):
+        self.name = name
+        self._raiz = raiz
+
+    def blob(self, blob_name):
+        return _BlobLocal(self._raiz, blob_name)
+
+    def list_blobs(self, prefix=""):
+        nomes = []
+        # só desce a partir da "pasta" do prefixo
+        inicio = os.path.join(self._raiz, *(prefix or "").split("/")[:-1])
+        for pasta, _, arquivos in os.walk(inicio):
+            for arquivo in arquivos:
+                if arquivo.endswith(".tmp"):
+                    continue
+                nome = os.path.relpath(os.path.join(pasta, arquivo), self._raiz).replace(os.sep, "/")
+                if nome.startswith(prefix or ""):
+                    nomes.append(nome)
+        return iter([_BlobLocal(self._raiz, nome) for nome in sorted(nomes)])
+
+class _ClienteGCSLocal:
+    def __init__(self, pasta):
+        self.pasta = pasta
+
+    def bucket(self, bucket_name):
+        return _BucketLocal(os.path.join(self.pasta, bucket_name), bucket_name)
 
 @lru_cache(maxsize=1)
 def get_gcs_client():
+    if os.getenv("GCS_BACKEND", "gcs").lower() == "local":
+        return _ClienteGCSLocal(os.getenv("GCS_LOCAL_PASTA", "dados/gcs"))
     key_base64 = os.getenv("GCS_KEY_BASE64")
     #print(key_base64)
     key_bytes = base64.b64decode(key_base64)
@@ -76,6 +205,16 @@ def listar_arquivos_do_cliente(bucket_name, prefixo):
     bucket = client.bucket(bucket_name)
     return list(bucket.list_blobs(prefix=prefixo))
 
+def listar_arquivos_por_prefixo(bucket_name, prefixos):
+    """{prefixo: [blobs]} de vários prefixos, listados em paralelo."""
+    return executar_em_paralelo(
+        {p: partial(listar_arquivos_do_cliente, bucket_name, p) for p in prefixos}, executor=_get_executor_gcs()
+    )
+
+def baixar_arquivos(blobs):
+    """{blob.name: bytes} dos blobs informados, com os downloads em paralelo."""
+    return executar_em_paralelo({blob.name: blob.download_as_bytes for blob in blobs}, executor=_get_executor_gcs())
+
 # 🔐 Cria um contexto SSL a partir do certificado codificado em base64
 @lru_cache(maxsize=1)
 def get_ssl_context_from_secrets():
@@ -87,29 +226,1017 @@ def get_ssl_context_from_secrets():
         ca_file.write(ca_bytes)
         ca_path = ca_file.name
 
-    # Configura contexto SSL
-    ssl_context = ssl.create_default_context(cafile=ca_path)
+    # Configura contexto SSL (mesmas regras do create_default_context, mas com reuso de sessão TLS)
+    ssl_context = _ContextoSSLReutilizavel(ssl.PROTOCOL_TLS_CLIENT)
+    ssl_context.load_verify_locations(cafile=ca_path)
     ssl_context.check_hostname = False
     ssl_context.verify_mode = ssl.CERT_REQUIRED
     return ssl_context
 
+class _ContextoSSLReutilizavel(ssl.SSLContext):
+    """
+    SSLContext que retoma a última sessão TLS conhecida ao abrir um novo socket.
+    Conexões novas do pool fazem um handshake abreviado em vez do handshake completo.
+    """
+    sessao_tls = None
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        if self.sessao_tls is not None and "session" not in kwargs:
+            kwargs["session"] = self.sessao_tls
+        try:
+            return super().wrap_socket(sock, *args, **kwargs)
+        except ValueError:
+            # sessão expirada/incompatível: descarta e faz o handshake completo
+            self.sessao_tls = None
+            kwargs.pop("session", None)
+            return super().wrap_socket(sock, *args, **kwargs)
+
 
 # 🔁 Cria instância DuckDB in-memory
 def get_duckdb():
     return duckdb.connect(database=':memory:')
 # 🔁 Conexão com MySQL (persistência)
-def get_mysql_conn():
+def _abrir_conexao_mysql(host_env="host", port_env="port"):
+    """Abre uma conexão física nova (TCP + TLS + auth). Use get_mysql_conn() nas consultas."""
     ssl_ctx = get_ssl_context_from_secrets()
     return pymysql.connect(
-        host=os.getenv("host"),
+        host=os.getenv(host_env),
         user=os.getenv("username"),
         password=os.getenv("password"),
-        port=int(os.getenv("port")),
+        port=int(os.getenv(port_env) or os.getenv("port")),
         database=os.getenv("database"),
         cursorclass=pymysql.cursors.DictCursor,
-        ssl={'ssl': ssl_ctx}
+        ssl=ssl_ctx
     )
 
+# --------------------------------
+# Backend de armazenamento (DB_BACKEND=mysql | sqlite)
+# --------------------------------
+# O resto do módulo fala o dialeto do MySQL pela interface do pymysql (placeholders %s,
+# DictCursor, pymysql.err.*). O backend SQLite guarda tudo num arquivo local e atende a mesma
+# interface, traduzindo as poucas construções próprias do MySQL: o app, os benchmarks e os
+# testes de carga rodam sem MySQL, sem certificado e sem rede.
+#   DB_BACKEND=sqlite SQLITE_CAMINHO=dados/streamline.sqlite3 streamlit run app.py
+class _BackendMySQL:
+    nome = "mysql"
+    suporta_replica = True
+    sequencias_no_banco = True  # _AlocadorIds reserva os blocos na tabela `sequencias`
+
+    def abrir_conexao(self, replica=False):
+        if replica:
+            return _abrir_conexao_mysql("read_host", "read_port")
+        return _abrir_conexao_mysql()
+
+    def indice_existe(self, cursor, tabela, nome):
+        cursor.execute("""
+            SELECT COUNT(*) AS count
+              FROM information_schema.statistics
+             WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (tabela, nome))
+        return bool(cursor.fetchone()["count"])
+
+    def coluna_existe(self, cursor, tabela, coluna):
+        cursor.execute("""
+            SELECT COUNT(*) AS count
+              FROM information_schema.columns
+             WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (tabela, coluna))
+        return bool(cursor.fetchone()["count"])
+
+    def adicionar_atualizado_em(self, cursor, tabela):
+        cursor.execute(f"""
+            ALTER TABLE {tabela} ADD COLUMN atualizado_em TIMESTAMP(6) NOT NULL
+                DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+        """)
+
+    @contextmanager
+    def trava_migracao(self, cursor):
+        cursor.execute("SELECT GET_LOCK('schema_migracoes', 60) AS ok")
+        if not cursor.fetchone()["ok"]:
+            raise RuntimeError("Não foi possível obter a trava de migração.")
+        try:
+            yield
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('schema_migracoes')")
+
+    def explicar(self, cursor, sql, params):
+        """Plano da consulta no formato do EXPLAIN do MySQL (table, type, key, Extra)."""
+        cursor.execute("EXPLAIN " + sql, params)
+        return cursor.fetchall()
+
+    def reservar_bloco_ids(self, tabela, tamanho):
+        return _reservar_bloco_ids(tabela, tamanho)
+
+
+_AGORA_SQLITE = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# (padrão, substituição) aplicados em ordem a cada SQL antes de ir para o sqlite3
+_TRADUCOES_SQLITE = [
+    (re.compile(r"BIGINT AUTO_INCREMENT PRIMARY KEY"), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"DEFAULT CURRENT_TIMESTAMP\(6\)"), f"DEFAULT ({_AGORA_SQLITE})"),
+    (re.compile(r"CURRENT_TIMESTAMP\(6\)"), _AGORA_SQLITE),
+    (re.compile(r"\bYEAR\(([^()]+)\)"), r"CAST(strftime('%Y', \1) AS INTEGER)"),
+    (re.compile(r"\bMONTH\(([^()]+)\)"), r"CAST(strftime('%m', \1) AS INTEGER)"),
+    (re.compile(r"%s"), "?"),
+]
+
+@lru_cache(maxsize=512)
+def _traduzir_sqlite(sql):
+    for padrao, substituicao in _TRADUCOES_SQLITE:
+        sql = padrao.sub(substituicao, sql)
+    return sql
+
+def _time_sqlite(valor):
+    """'HH:MM[:SS[.ffffff]]' -> timedelta, como o pymysql entrega uma coluna TIME."""
+    partes = valor.decode().split(":")
+    horas, minutos = int(partes[0]), int(partes[1])
+    segundos = float(partes[2]) if len(partes) > 2 else 0.0
+    return timedelta(hours=horas, minutes=minutos, seconds=segundos)
+
+# Mesmos formatos de texto que o MySQL usa para DATE / TIME / TIMESTAMP
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda v: v.isoformat(" "))
+sqlite3.register_adapter(pd.Timestamp, lambda v: v.isoformat(" "))
+sqlite3.register_adapter(dtime, dtime.isoformat)
+sqlite3.register_adapter(timedelta, lambda v: (datetime.min + v).strftime("%H:%M:%S"))
+sqlite3.register_adapter(Decimal, float)
+for _tipo in (np.int8, np.int16, np.int32, np.int64, np.bool_):
+    sqlite3.register_adapter(_tipo, int)
+sqlite3.register_adapter(np.float64, float)
+sqlite3.register_converter("DATE", lambda v: date.fromisoformat(v.decode()))
+sqlite3.register_converter("TIME", _time_sqlite)
+sqlite3.register_converter("TIMESTAMP", lambda v: datetime.fromisoformat(v.decode()))
+
+@contextmanager
+def _erros_pymysql():
+    """Relança erros do sqlite3 com as classes do pymysql que o módulo já trata."""
+    try:
+        yield
+    except sqlite3.IntegrityError as e:
+        raise pymysql.err.IntegrityError(*e.args) from e
+    except sqlite3.ProgrammingError as e:
+        raise pymysql.err.ProgrammingError(*e.args) from e
+    except sqlite3.OperationalError as e:
+        raise pymysql.err.OperationalError(*e.args) from e
+    except sqlite3.DatabaseError as e:
+        raise pymysql.err.DatabaseError(*e.args) from e
+
+
+class _CursorSQLite:
+    """Cursor sqlite3 com a interface do cursor pymysql (DictCursor ou de tuplas)."""
+
+    def __init__(self, cursor, como_dict):
+        self._cursor = cursor
+        self._como_dict = como_dict
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, sql, params=()):
+        with _erros_pymysql():
+            self._cursor.execute(_traduzir_sqlite(sql), tuple(params or ()))
+        return self._cursor.rowcount
+
+    def executemany(self, sql, seq_params):
+        with _erros_pymysql():
+            self._cursor.executemany(_traduzir_sqlite(sql), [tuple(p) for p in seq_params])
+        return self._cursor.rowcount
+
+    def _linhas(self, linhas):
+        if not self._como_dict:
+            return linhas
+        colunas = [d[0] for d in self._cursor.description or ()]
+        return [dict(zip(colunas, linha)) for linha in linhas]
+
+    def fetchone(self):
+        linha = self._cursor.fetchone()
+        return None if linha is None else self._linhas([linha])[0]
+
+    def fetchmany(self, tamanho=1):
+        return self._linhas(self._cursor.fetchmany(tamanho))
+
+    def fetchall(self):
+        return self._linhas(self._cursor.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class _ConexaoSQLite:
+    """Conexão sqlite3 com a parte da interface do pymysql usada pelo pool e pelos helpers."""
+
+    def __init__(self, caminho):
+        self._con = sqlite3.connect(
+            caminho, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+        )
+        self._con.execute("PRAGMA foreign_keys = ON")  # o MySQL valida as FKs
+        self._con.execute("PRAGMA journal_mode = WAL")  # leitores não bloqueiam quem escreve
+        self.open = True
+
+    def cursor(self, classe=None):
+        como_dict = classe is None or issubclass(classe, pymysql.cursors.DictCursorMixin)
+        return _CursorSQLite(self._con.cursor(), como_dict)
+
+    def commit(self):
+        with _erros_pymysql():
+            self._con.commit()
+
+    def rollback(self):
+        with _erros_pymysql():
+            self._con.rollback()
+
+    def ping(self, reconnect=False):
+        if not self.open:
+            raise pymysql.err.InterfaceError("Conexão SQLite fechada.")
+
+    def close(self):
+        if self.open:
+            self.open = False
+            self._con.close()
+
+
+class _BackendSQLite:
+    nome = "sqlite"
+    suporta_replica = False
+    sequencias_no_banco = False  # ficam no arquivo "<caminho>-sequencias" (ver reservar_bloco_ids)
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock_sequencias = threading.Lock()
+
+    def abrir_conexao(self, replica=False):
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with self._lock_sequencias:
+            self._descartar_sequencias_orfas()
+            return _ConexaoSQLite(self.caminho)
+
+    def _descartar_sequencias_orfas(self):
+        # banco novo (ou apagado à mão): as sequências de um banco anterior não valem mais e
+        # fariam os ids começarem de onde o outro parou. Chamado com _lock_sequencias.
+        if os.path.exists(self.caminho):
+            return
+        for sufixo in ("-sequencias", "-sequencias-wal", "-sequencias-shm", "-sequencias-journal"):
+            if os.path.exists(self.caminho + sufixo):
+                os.remove(self.caminho + sufixo)
+
+    def indice_existe(self, cursor, tabela, nome):
+        cursor.execute(
+            "SELECT COUNT(*) AS count FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s",
+            (tabela, nome),
+        )
+        return bool(cursor.fetchone()["count"])
+
+    def coluna_existe(self, cursor, tabela, coluna):
+        cursor.execute("SELECT COUNT(*) AS count FROM pragma_table_info(%s) WHERE name = %s", (tabela, coluna))
+        return bool(cursor.fetchone()["count"])
+
+    def adicionar_atualizado_em(self, cursor, tabela):
+        # ADD COLUMN só aceita DEFAULT constante e não existe ON UPDATE: gatilhos fazem o papel
+        cursor.execute(
+            f"ALTER TABLE {tabela} ADD COLUMN atualizado_em TIMESTAMP(6) NOT NULL DEFAULT '1970-01-01 00:00:00'"
+        )
+        cursor.execute(f"UPDATE {tabela} SET atualizado_em = {_AGORA_SQLITE}")
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{tabela}_atualizado_em_ins AFTER INSERT ON {tabela}
+            BEGIN
+                UPDATE {tabela} SET atualizado_em = {_AGORA_SQLITE} WHERE id = NEW.id;
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{tabela}_atualizado_em_upd AFTER UPDATE ON {tabela}
+            WHEN NEW.atualizado_em = OLD.atualizado_em
+            BEGIN
+                UPDATE {tabela} SET atualizado_em = {_AGORA_SQLITE} WHERE id = NEW.id;
+            END
+        """)
+
+    @contextmanager
+    def trava_migracao(self, cursor):
+        # o SQLite já serializa as escritas no arquivo e cada passo de migração é idempotente
+        yield
+
+    def explicar(self, cursor, sql, params):
+        """EXPLAIN QUERY PLAN convertido para o formato do EXPLAIN do MySQL (table, type, key, Extra)."""
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        planos = []
+        for passo in cursor.fetchall():
+            detalhe = passo["detail"]
+            m = re.match(r"(SCAN|SEARCH) (\S+)(?: USING (?:COVERING )?INDEX (\S+)| USING (INTEGER PRIMARY KEY))?", detalhe)
+            if not m or m.group(2) == "CONSTANT":
+                continue
+            chave = m.group(3) or ("PRIMARY" if m.group(4) else None)
+            # SCAN com índice percorre o índice inteiro (type=index no MySQL); sem índice, type=ALL
+            tipo = "ref" if m.group(1) == "SEARCH" else ("index" if chave else "ALL")
+            planos.append({"table": m.group(2), "type": tipo, "key": chave, "Extra": detalhe})
+        return planos
+
+    def reservar_bloco_ids(self, tabela, tamanho):
+        """
+        Mesmo contrato de _reservar_bloco_ids. O SQLite tem um único escritor por arquivo e quem
+        pede o id muitas vezes já está escrevendo no principal: as sequências ficam num arquivo
+        à parte ("<caminho>-sequencias") para a reserva não esperar por essa transação. Sem o
+        arquivo principal, o de sequências é descartado (ver _descartar_sequencias_orfas).
+        """
+        with self._lock_sequencias:
+            self._descartar_sequencias_orfas()
+            con = sqlite3.connect(self.caminho + "-sequencias", timeout=30, isolation_level=None)
+            try:
+                con.execute("CREATE TABLE IF NOT EXISTS sequencias (tabela TEXT PRIMARY KEY, proximo INTEGER NOT NULL)")
+                con.execute("BEGIN IMMEDIATE")  # serializa com outros processos
+                linha = con.execute("SELECT proximo FROM sequencias WHERE tabela = ?", (tabela,)).fetchone()
+                if linha is None:
+                    # primeira reserva: semeia a partir dos ids já existentes (leitura não bloqueia no WAL)
+                    principal = sqlite3.connect(self.caminho, timeout=30)
+                    try:
+                        inicio = principal.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {tabela}").fetchone()[0]
+                    finally:
+                        principal.close()
+                else:
+                    inicio = linha[0]
+                con.execute(
+                    "INSERT INTO sequencias (tabela, proximo) VALUES (?, ?)"
+                    " ON CONFLICT(tabela) DO UPDATE SET proximo = excluded.proximo",
+                    (tabela, inicio + tamanho),
+                )
+                con.execute("COMMIT")
+                return inicio
+            finally:
+                con.close()
+
+
+def _criar_backend():
+    nome = os.getenv("DB_BACKEND", "mysql").lower()
+    if nome == "mysql":
+        return _BackendMySQL()
+    if nome == "sqlite":
+        return _BackendSQLite(os.getenv("SQLITE_CAMINHO", "dados/streamline.sqlite3"))
+    raise ValueError(f"DB_BACKEND desconhecido: {nome} (use mysql ou sqlite)")
+
+_backend = _criar_backend()
+
+# --------------------------------
+# Pool de conexões MySQL
+# --------------------------------
+class _PoolMySQL:
+    """
+    Pool limitado e thread-safe (as threads de script do Streamlit compartilham o processo).
+
+    - obter(): devolve uma conexão livre (LIFO, a mais "quente" primeiro), abre uma nova se
+      ainda houver vaga, ou espera até `espera_max` segundos por uma devolução.
+    - No checkout a conexão é reciclada se passou de `vida_max` (idade) ou `ocioso_max`
+      (tempo parada) e recebe um ping se ficou ociosa por mais de `ping_apos` segundos.
+    - devolver(): faz rollback (nenhuma transação/snapshot vaza para o próximo uso),
+      guarda a sessão TLS para retomada e devolve a conexão à fila.
+    """
+
+    def __init__(self, fabrica, tamanho_max=10, espera_max=10.0, ocioso_max=300.0,
+                 vida_max=3600.0, ping_apos=2.0):
+        self.pid = os.getpid()
+        self._fabrica = fabrica
+        self.tamanho_max = tamanho_max
+        self.espera_max = espera_max
+        self.ocioso_max = ocioso_max
+        self.vida_max = vida_max
+        self.ping_apos = ping_apos
+
+        self._cond = threading.Condition()
+        self._livres = deque()  # (conexao, criada_em, devolvida_em)
+        self._criada_em = {}    # id(conexao) -> criada_em
+        self._abertas = 0
+        self._stats = {
+            "checkouts": 0,
+            "esperas": 0,
+            "tempo_espera_s": 0.0,
+            "timeouts": 0,
+            "criadas": 0,
+            "recicladas": 0,
+            "descartadas": 0,
+            "falhas_ping": 0,
+            "sessoes_tls_retomadas": 0,
+        }
+
+    def _nova_conexao(self):
+        conexao = self._fabrica()
+        agora = time.monotonic()
+        sock = getattr(conexao, "_sock", None)
+        with self._cond:
+            self._stats["criadas"] += 1
+            if getattr(sock, "session_reused", False):
+                self._stats["sessoes_tls_retomadas"] += 1
+            self._criada_em[id(conexao)] = agora
+        return conexao
+
+    def _fechar(self, conexao):
+        try:
+            conexao.close()
+        except Exception:
+            pass
+
+    def obter(self):
+        inicio = time.monotonic()
+        item = None
+        with self._cond:
+            self._stats["checkouts"] += 1
+            esperou = False
+            while True:
+                if self._livres:
+                    item = self._livres.pop()
+                    break
+                if self._abertas < self.tamanho_max:
+                    self._abertas += 1
+                    break
+                restante = self.espera_max - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self._stats["timeouts"] += 1
+                    raise TimeoutError(
+                        f"Pool MySQL esgotado: {self.tamanho_max} conexões em uso há mais de {self.espera_max:.0f}s."
+                    )
+                if not esperou:
+                    self._stats["esperas"] += 1
+                    esperou = True
+                self._cond.wait(restante)
+            if esperou:
+                self._stats["tempo_espera_s"] += time.monotonic() - inicio
+
+        try:
+            if item is not None:
+                conexao, criada_em, devolvida_em = item
+                agora = time.monotonic()
+                if agora - criada_em > self.vida_max or agora - devolvida_em > self.ocioso_max:
+                    self._fechar(conexao)
+                    with self._cond:
+                        self._criada_em.pop(id(conexao), None)
+                        self._stats["recicladas"] += 1
+                    return self._nova_conexao()
+                if agora - devolvida_em > self.ping_apos:
+                    try:
+                        conexao.ping(reconnect=False)
+                    except Exception:
+                        self._fechar(conexao)
+                        with self._cond:
+                            self._criada_em.pop(id(conexao), None)
+                            self._stats["falhas_ping"] += 1
+                        return self._nova_conexao()
+                return conexao
+            return self._nova_conexao()
+        except BaseException:
+            # não conseguiu entregar uma conexão: libera a vaga
+            with self._cond:
+                self._abertas -= 1
+                self._cond.notify()
+            raise
+
+    def devolver(self, conexao, descartar=False):
+        if not descartar:
+            try:
+                conexao.rollback()
+            except Exception:
+                descartar = True
+
+        if descartar or not getattr(conexao, "open", False):
+            self._fechar(conexao)
+            with self._cond:
+                self._criada_em.pop(id(conexao), None)
+                self._abertas -= 1
+                self._stats["descartadas"] += 1
+                self._cond.notify()
+            return
+
+        sessao = getattr(getattr(conexao, "_sock", None), "session", None)
+        ctx = getattr(conexao, "ctx", None)
+        if sessao is not None and isinstance(ctx, _ContextoSSLReutilizavel):
+            ctx.sessao_tls = sessao
+
+        with self._cond:
+            criada_em = self._criada_em.get(id(conexao), time.monotonic())
+            self._livres.append((conexao, criada_em, time.monotonic()))
+            self._cond.notify()
+
+    def fechar_tudo(self):
+        with self._cond:
+            livres = list(self._livres)
+            self._livres.clear()
+            self._abertas -= len(livres)
+            for conexao, _, _ in livres:
+                self._criada_em.pop(id(conexao), None)
+        for conexao, _, _ in livres:
+            self._fechar(conexao)
+
+    def estatisticas(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "tamanho_max": self.tamanho_max,
+                "abertas": self._abertas,
+                "livres": len(self._livres),
+                "em_uso": self._abertas - len(self._livres),
+            })
+        return stats
+
+
+class _ConexaoDoPool:
+    """
+    Conexão emprestada do pool. Repassa tudo para a conexão pymysql, mas
+    `close()` e o fim do bloco `with` devolvem a conexão ao pool em vez de fechá-la.
+    """
+
+    def __init__(self, pool, conexao):
+        self._pool = pool
+        self._conexao = conexao
+
+    def __getattr__(self, nome):
+        conexao = self.__dict__.get("_conexao")
+        if conexao is None:
+            raise pymysql.err.InterfaceError("Conexão já devolvida ao pool.")
+        return getattr(conexao, nome)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # erro de rede/protocolo: a conexão não volta para o pool
+        descartar = isinstance(exc, (pymysql.err.OperationalError, pymysql.err.InterfaceError))
+        self._devolver(descartar)
+
+    def close(self):
+        self._devolver(False)
+
+    def _devolver(self, descartar):
+        conexao, self._conexao = self._conexao, None
+        if conexao is not None:
+            self._pool.devolver(conexao, descartar=descartar)
+
+
+_pool_mysql = None
+_pool_mysql_lock = threading.Lock()
+
+def _get_pool():
+    """Pool único por processo (recriado se o processo for 'forkado')."""
+    global _pool_mysql
+    pool = _pool_mysql
+    if pool is None or pool.pid != os.getpid():
+        with _pool_mysql_lock:
+            if _pool_mysql is None or _pool_mysql.pid != os.getpid():
+                _pool_mysql = _PoolMySQL(
+                    _backend.abrir_conexao,
+                    tamanho_max=int(os.getenv("MYSQL_POOL_SIZE", "10")),
+                    espera_max=float(os.getenv("MYSQL_POOL_TIMEOUT", "10")),
+                    ocioso_max=float(os.getenv("MYSQL_POOL_MAX_IDLE", "300")),
+                    vida_max=float(os.getenv("MYSQL_POOL_MAX_LIFETIME", "3600")),
+                    ping_apos=float(os.getenv("MYSQL_POOL_PING_AFTER", "2")),
+                )
+            pool = _pool_mysql
+    return pool
+
+def get_mysql_conn():
+    """
+    Empresta uma conexão do pool; use sempre com `with get_mysql_conn() as conn:`.
+    Dentro de `unidade_de_trabalho()` devolve a conexão (e a transação) da unidade.
+    """
+    unidade = getattr(_unidade_local, "unidade", None)
+    if unidade is not None:
+        return _ConexaoCompartilhada(unidade)
+    pool = _get_pool()
+    return _ConexaoDoPool(pool, pool.obter())
+
+def estatisticas_pool():
+    """Contadores do pool (checkouts, esperas, conexões criadas/recicladas...) para dimensionamento."""
+    return _get_pool().estatisticas()
+
+# --------------------------------
+# Réplica de leitura (opcional: read_host / read_port)
+# --------------------------------
+# Helpers só-leitura pedem a conexão com get_mysql_conn_leitura(*tabelas). Vão para o primário:
+# - dentro de uma unidade de trabalho (a leitura precisa ver a transação aberta);
+# - se a sessão do Streamlit escreveu há menos de REPLICA_JANELA_S segundos (ler o que acabou de gravar);
+# - se alguma das `tabelas` foi escrita neste processo nessa mesma janela (o cache de leituras
+#   e o snapshot analítico são compartilhados: não podem guardar um resultado atrasado);
+# - se a réplica está fora do ar, atrasada mais que REPLICA_ATRASO_MAX segundos ou com atraso
+#   desconhecido (a conta de read_host precisa de REPLICATION CLIENT / REPLICA MONITOR para ler
+#   SHOW REPLICA STATUS; sem isso, ou sem replicação configurada, tudo vai para o primário).
+_sessao_herdada = contextvars.ContextVar("sessao_herdada", default=None)
+
+def _id_sessao():
+    """Sessão do Streamlit do rerun atual (ou a herdada por uma thread de executar_em_paralelo)."""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else _sessao_herdada.get()
+
+class _RegistroEscritas:
+    """Momento da última escrita por tabela e por sessão do Streamlit (None = fora do Streamlit)."""
+
+    def __init__(self, janela=10.0):
+        self.janela = janela
+        self._lock = threading.Lock()
+        self._por_tabela = {}
+        self._por_sessao = {}
+
+    def marcar(self, *tabelas):
+        agora = time.monotonic()
+        sessao = _id_sessao()
+        with self._lock:
+            for tabela in tabelas:
+                self._por_tabela[tabela] = agora
+            self._por_sessao[sessao] = agora
+            if len(self._por_sessao) > 1000:
+                limite = agora - self.janela
+                self._por_sessao = {k: t for k, t in self._por_sessao.items() if t >= limite}
+
+    def recente(self, tabelas):
+        limite = time.monotonic() - self.janela
+        with self._lock:
+            if self._por_sessao.get(_id_sessao(), float("-inf")) >= limite:
+                return True
+            return any(self._por_tabela.get(t, float("-inf")) >= limite for t in tabelas)
+
+_escritas_recentes = _RegistroEscritas(janela=float(os.getenv("REPLICA_JANELA_S", "10")))
+
+class _EstadoReplica:
+    """
+    Saúde da réplica, reavaliada no máximo a cada `intervalo` segundos:
+    atraso por SHOW REPLICA STATUS (SHOW SLAVE STATUS em versões antigas). Atraso desconhecido
+    (sem permissão para ler o status, ou o servidor não replica nada) tira a réplica de uso:
+    uma réplica parada serviria login/privilégios velhos indefinidamente.
+    Falha ao conectar tira a réplica de uso por `quarentena` segundos.
+    """
+
+    def __init__(self, atraso_max=2.0, intervalo=5.0, quarentena=30.0):
+        self.atraso_max = atraso_max
+        self.intervalo = intervalo
+        self.quarentena = quarentena
+        self._lock = threading.Lock()
+        self._verificado_em = None
+        self._fora_ate = 0.0
+        self.atraso_s = None
+        self._stats = {"leituras_replica": 0, "leituras_primario": 0, "falhas": 0, "atrasada": 0,
+                       "atraso_desconhecido": 0}
+
+    def contar(self, chave):
+        with self._lock:
+            self._stats[chave] += 1
+
+    def marcar_falha(self):
+        with self._lock:
+            self._stats["falhas"] += 1
+            self._fora_ate = time.monotonic() + self.quarentena
+
+    def disponivel(self, pool):
+        agora = time.monotonic()
+        with self._lock:
+            if agora < self._fora_ate:
+                return False
+            verificar = self._verificado_em is None or agora - self._verificado_em > self.intervalo
+            if verificar:
+                self._verificado_em = agora
+        if verificar:
+            self._medir_atraso(pool)
+        with self._lock:
+            return self.atraso_s is not None and self.atraso_s <= self.atraso_max
+
+    def _medir_atraso(self, pool):
+        try:
+            conexao = pool.obter()
+        except Exception:
+            self.marcar_falha()
+            return
+        descartar = False
+        atraso = None
+        try:
+            with conexao.cursor() as cursor:
+                for sql in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+                    try:
+                        cursor.execute(sql)
+                    except pymysql.err.ProgrammingError:
+                        continue  # sintaxe não suportada nesta versão
+                    linha = cursor.fetchone()
+                    if linha:
+                        # MariaDB mantém o nome antigo da coluna; NULL = replicação parada
+                        atraso = linha.get("Seconds_Behind_Source", linha.get("Seconds_Behind_Master"))
+                        atraso = float("inf") if atraso is None else float(atraso)
+                    break
+        except pymysql.err.OperationalError as e:
+            descartar = not e.args or e.args[0] != 1227  # 1227: sem privilégio para ler o status
+        finally:
+            pool.devolver(conexao, descartar=descartar)
+        with self._lock:
+            self.atraso_s = atraso
+            if atraso is None:
+                self._stats["atraso_desconhecido"] += 1
+            elif atraso > self.atraso_max:
+                self._stats["atrasada"] += 1
+
+    def estatisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"atraso_s": self.atraso_s, "atraso_max_s": self.atraso_max})
+        return stats
+
+_estado_replica = _EstadoReplica(
+    atraso_max=float(os.getenv("REPLICA_ATRASO_MAX", "2")),
+    intervalo=float(os.getenv("REPLICA_VERIFICAR_S", "5")),
+    quarentena=float(os.getenv("REPLICA_QUARENTENA_S", "30")),
+)
+_pool_replica = None
+
+def _get_pool_replica():
+    """Pool da réplica (None se read_host não estiver configurado)."""
+    global _pool_replica
+    if not _backend.suporta_replica or not os.getenv("read_host"):
+        return None
+    pool = _pool_replica
+    if pool is None or pool.pid != os.getpid():
+        with _pool_mysql_lock:
+            if _pool_replica is None or _pool_replica.pid != os.getpid():
+                _pool_replica = _PoolMySQL(
+                    partial(_backend.abrir_conexao, replica=True),
+                    tamanho_max=int(os.getenv("MYSQL_POOL_SIZE", "10")),
+                    espera_max=float(os.getenv("MYSQL_POOL_TIMEOUT", "10")),
+                    ocioso_max=float(os.getenv("MYSQL_POOL_MAX_IDLE", "300")),
+                    vida_max=float(os.getenv("MYSQL_POOL_MAX_LIFETIME", "3600")),
+                    ping_apos=float(os.getenv("MYSQL_POOL_PING_AFTER", "2")),
+                )
+            pool = _pool_replica
+    return pool
+
+def get_mysql_conn_leitura(*tabelas):
+    """
+    Conexão para uma leitura que depende de `tabelas`: réplica quando for seguro, senão primário
+    (mesmo uso de get_mysql_conn: `with get_mysql_conn_leitura("sessoes") as conn:`).
+    """
+    pool = _get_pool_replica()
+    if (pool is None or getattr(_unidade_local, "unidade", None) is not None
+            or _escritas_recentes.recente(tabelas) or not _estado_replica.disponivel(pool)):
+        _estado_replica.contar("leituras_primario")
+        return get_mysql_conn()
+    try:
+        conexao = pool.obter()
+    except Exception:
+        _estado_replica.marcar_falha()
+        _estado_replica.contar("leituras_primario")
+        return get_mysql_conn()
+    _estado_replica.contar("leituras_replica")
+    return _ConexaoDoPool(pool, conexao)
+
+def estatisticas_replica():
+    """Leituras na réplica x primário, falhas, atraso medido; None sem réplica configurada."""
+    pool = _get_pool_replica()
+    if pool is None:
+        return None
+    return {**_estado_replica.estatisticas(), "pool": pool.estatisticas()}
+
+# --------------------------------
+# Unidade de trabalho (uma conexão/transação por rerun)
+# --------------------------------
+_unidade_local = threading.local()
+
+class _UnidadeDeTrabalho:
+    """
+    Prende uma conexão do pool à thread atual (no Streamlit, ao rerun em execução).
+    Todos os helpers chamados dentro do bloco usam essa conexão; os `conn.commit()`
+    deles são adiados e a unidade faz um único COMMIT ao sair.
+
+    - Se qualquer helper falhar dentro da unidade (mesmo que a página trate o erro),
+      a unidade inteira sofre ROLLBACK: nada fica aplicado pela metade.
+    - Exceções de controle do Streamlit (st.rerun / st.stop) não são erro: a unidade
+      confirma antes do rerun.
+    - Unidades aninhadas reaproveitam a unidade externa.
+    """
+
+    def __init__(self):
+        self.conexao = None
+        self.escreveu = False
+        self.falhou = False
+        self.tabelas_sujas = set()
+        self.principais_sujos = set()
+        self.analitico_sujo = []
+        self._pool = None
+        self._externa = False
+
+    def __enter__(self):
+        if getattr(_unidade_local, "unidade", None) is not None:
+            self._externa = True
+            return _unidade_local.unidade
+        self._pool = _get_pool()
+        self.conexao = self._pool.obter()
+        _unidade_local.unidade = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._externa:
+            if isinstance(exc, Exception):
+                _unidade_local.unidade.falhou = True
+            return
+        _unidade_local.unidade = None
+        if isinstance(exc, Exception):
+            self.falhou = True
+
+        conexao, self.conexao = self.conexao, None
+        descartar = False
+        try:
+            if self.escreveu and not self.falhou:
+                conexao.commit()
+                _escritas_recentes.marcar(*self.tabelas_sujas)
+        except Exception:
+            descartar = True
+            raise
+        finally:
+            # devolver() faz o rollback do que não foi confirmado
+            self._pool.devolver(conexao, descartar=descartar)
+            if self.tabelas_sujas:
+                # leituras feitas por outras threads durante a transação podem ter sido cacheadas
+                _cache_consultas.invalidar(*self.tabelas_sujas)
+            for id_login in self.principais_sujos:
+                invalidar_principal(id_login)
+            for clientes, psicologo in self.analitico_sujo:
+                _motor_analitico.invalidar(clientes, psicologo)
+
+
+class _ConexaoCompartilhada:
+    """Handle da conexão da unidade: `commit()` e `close()` ficam para o fim da unidade."""
+
+    def __init__(self, unidade):
+        self._unidade = unidade
+
+    def __getattr__(self, nome):
+        return getattr(self._unidade.conexao, nome)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if isinstance(exc, Exception):
+            self._unidade.falhou = True
+
+    def commit(self):
+        self._unidade.escreveu = True
+
+    def close(self):
+        pass
+
+def unidade_de_trabalho():
+    """
+    Abre uma unidade de trabalho para o rerun atual:
+
+        with unidade_de_trabalho():
+            update_sessao_data_hora(...)
+            update_sessao(...)
+
+    Uma única conexão e, para escritas, uma única transação para todos os helpers do bloco.
+    """
+    return _UnidadeDeTrabalho()
+
+# --------------------------------
+# Cache de leituras (TTL + LRU, invalidado pelas escritas)
+# --------------------------------
+class _CacheConsultas:
+    """
+    Cache em memória do processo para os helpers de leitura.
+
+    - Chave: nome da função + argumentos normalizados.
+    - Cada entrada expira após `ttl` segundos; acima de `tamanho_max` entradas sai a menos usada (LRU).
+    - Cada entrada é marcada com as tabelas que leu; uma escrita numa tabela derruba as entradas dela.
+    - Uma versão por tabela impede que uma leitura iniciada antes de uma escrita grave resultado velho.
+    """
+
+    def __init__(self, tamanho_max=256, ttl=60.0):
+        self.tamanho_max = tamanho_max
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._dados = OrderedDict()  # chave -> (expira_em, tabelas, valor)
+        self._versoes = {}           # tabela -> contador de escritas
+        self._stats = {"hits": 0, "misses": 0, "expiradas": 0, "removidas_lru": 0, "invalidadas": 0}
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                self._stats["misses"] += 1
+                return False, None
+            if item[0] < time.monotonic():
+                del self._dados[chave]
+                self._stats["expiradas"] += 1
+                self._stats["misses"] += 1
+                return False, None
+            self._dados.move_to_end(chave)
+            self._stats["hits"] += 1
+            return True, item[2]
+
+    def versoes(self, tabelas):
+        with self._lock:
+            return tuple(self._versoes.get(t, 0) for t in tabelas)
+
+    def gravar(self, chave, tabelas, valor, versoes_lidas):
+        with self._lock:
+            if tuple(self._versoes.get(t, 0) for t in tabelas) != versoes_lidas:
+                return  # houve escrita durante a leitura
+            self._dados[chave] = (time.monotonic() + self.ttl, frozenset(tabelas), valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho_max:
+                self._dados.popitem(last=False)
+                self._stats["removidas_lru"] += 1
+
+    def invalidar(self, *tabelas):
+        alvo = set(tabelas)
+        with self._lock:
+            for t in alvo:
+                self._versoes[t] = self._versoes.get(t, 0) + 1
+            chaves = [k for k, (_, deps, _) in self._dados.items() if deps & alvo]
+            for k in chaves:
+                del self._dados[k]
+            self._stats["invalidadas"] += len(chaves)
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"entradas": len(self._dados), "tamanho_max": self.tamanho_max, "ttl_s": self.ttl})
+        return stats
+
+
+_cache_consultas = _CacheConsultas(
+    tamanho_max=int(os.getenv("CACHE_CONSULTAS_MAX", "256")),
+    ttl=float(os.getenv("CACHE_CONSULTAS_TTL", "60")),
+)
+
+def _copiar(valor):
+    # os chamadores alteram o que recebem (astype, colunas novas, append...): nunca entregar
+    # o objeto do cache. Copia DataFrames e listas/dicts, também dentro de tuplas e listas
+    # (ex.: o (df, cursor) de pagina_sessoes_cliente).
+    if isinstance(valor, pd.DataFrame):
+        return valor.copy()
+    if isinstance(valor, tuple):
+        return tuple(_copiar(v) for v in valor)
+    if isinstance(valor, list):
+        return [_copiar(v) for v in valor]
+    if isinstance(valor, dict):
+        return {chave: _copiar(v) for chave, v in valor.items()}
+    return valor
+
+def _leitura_em_cache(*tabelas, exceto_se=None):
+    """
+    Decorador: guarda o resultado do helper de leitura, dependente de `tabelas`.
+    `exceto_se` (função sem argumentos) desliga o cache enquanto devolver True.
+    """
+    def decorador(func):
+        assinatura = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            unidade = getattr(_unidade_local, "unidade", None)
+            if unidade is not None and unidade.tabelas_sujas.intersection(tabelas):
+                # a unidade atual escreveu nessas tabelas e ainda não confirmou: lê da própria transação
+                return func(*args, **kwargs)
+            if exceto_se is not None and exceto_se():
+                return func(*args, **kwargs)
+            argumentos = assinatura.bind(*args, **kwargs)
+            argumentos.apply_defaults()
+            chave = (func.__name__, tuple(argumentos.arguments.items()))
+            try:
+                achou, valor = _cache_consultas.obter(chave)
+            except TypeError:  # argumento não-hasheável: sem cache
+                return func(*args, **kwargs)
+            if achou:
+                return _copiar(valor)
+            versoes = _cache_consultas.versoes(tabelas)
+            valor = func(*args, **kwargs)
+            _cache_consultas.gravar(chave, tabelas, valor, versoes)
+            return _copiar(valor)
+
+        wrapper.sem_cache = func
+        return wrapper
+    return decorador
+
+def invalidar_cache(*tabelas):
+    """Derruba as leituras em cache que dependem de `tabelas` (chamar após escrever nelas)."""
+    unidade = getattr(_unidade_local, "unidade", None)
+    if unidade is not None:
+        unidade.tabelas_sujas.update(tabelas)
+    _escritas_recentes.marcar(*tabelas)
+    _cache_consultas.invalidar(*tabelas)
+
+def estatisticas_cache():
+    """Contadores do cache de leituras (hits, misses, expiradas, removidas por LRU, invalidadas)."""
+    return _cache_consultas.estatisticas()
+
 
 def criar_tabelas():
     with get_mysql_conn() as conn:
@@ -167,23 +1294,892 @@ def criar_tabelas():
                 );
             """)
 
+            # Próximo id livre de cada tabela (ver _AlocadorIds); o SQLite guarda em arquivo à parte
+            if _backend.sequencias_no_banco:
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS sequencias (
+                        tabela VARCHAR(64) PRIMARY KEY,
+                        proximo BIGINT NOT NULL
+                    );
+                """)
+
+        conn.commit()
+
+# --------------------------------
+# Leituras em paralelo (consultas independentes de uma página)
+# --------------------------------
+# Cada tarefa pega a própria conexão do pool. O executor é um só por processo e é
+# compartilhado por todas as sessões do Streamlit: com várias páginas abrindo ao mesmo
+# tempo, as tarefas excedentes esperam na fila (em ordem de chegada) por uma thread livre.
+# - LEITURAS_PARALELAS fixa o número de threads; sem ela, metade de MYSQL_POOL_SIZE, para
+#   que as threads de leitura nunca ocupem o pool inteiro e sobrem conexões para as
+#   escritas e leituras feitas direto nas threads das sessões. Nunca passa de MYSQL_POOL_SIZE - 1.
+# - A revalidação de principal_autenticado roda em um executor próprio de uma thread, para
+#   não disputar a fila com as leituras das páginas (nem ser atrasada por elas).
+# - Listagens e downloads do GCS (listar_arquivos_por_prefixo, baixar_arquivos) usam o executor
+#   "gcs", de GCS_PARALELOS threads (padrão 8): um prontuário baixando todos os arquivos não
+#   ocupa as threads das consultas ao banco das outras sessões.
+_executores = {}
+_executores_lock = threading.Lock()
+
+def _tamanho_executor_leituras():
+    tamanho_pool = int(os.getenv("MYSQL_POOL_SIZE", "10"))
+    pedido = int(os.getenv("LEITURAS_PARALELAS") or 0) or tamanho_pool // 2
+    return max(1, min(pedido, tamanho_pool - 1))
+
+def _get_executor(nome, max_workers):
+    """ThreadPoolExecutor `nome` único por processo (recriado se o processo for 'forkado')."""
+    with _executores_lock:
+        entrada = _executores.get(nome)
+        if entrada is None or entrada[0] != os.getpid():
+            entrada = _executores[nome] = (
+                os.getpid(),
+                concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=nome),
+            )
+        return entrada[1]
+
+def _get_executor_leituras():
+    return _get_executor("leituras", _tamanho_executor_leituras())
+
+def _get_executor_revalidacao():
+    return _get_executor("revalidacao", 1)
+
+def _get_executor_gcs():
+    return _get_executor("gcs", max(1, int(os.getenv("GCS_PARALELOS") or 8)))
+
+def executar_em_paralelo(tarefas, tempo_max=None, executor=None):
+    """
+    Executa leituras independentes ao mesmo tempo e devolve os resultados com as mesmas chaves:
+
+        r = executar_em_paralelo({
+            "psicologos": listar_psicologos,
+            "pendencias": partial(resumo_pendencias, psicologo, dt_inicio, dt_fim),
+        })
+        r["psicologos"], r["pendencias"]
+
+    A latência fica próxima da tarefa mais lenta, não da soma de todas.
+    - Erro em qualquer tarefa é relançado aqui (a primeira na ordem de `tarefas`).
+    - Dentro de `unidade_de_trabalho()` roda em sequência na thread atual: as leituras
+      precisam enxergar a transação aberta, que pertence a esta thread.
+    - `tempo_max` (s) limita a espera total; estourou, levanta TimeoutError.
+    - O executor é compartilhado entre as sessões (ver _tamanho_executor_leituras): com ele
+      cheio, as tarefas esperam na fila e a página pode levar mais que a tarefa mais lenta.
+    - `executor`: outro executor para tarefas que não são consultas ao banco (ex.: o do GCS).
+    """
+    tarefas = dict(tarefas)
+    if len(tarefas) <= 1 or getattr(_unidade_local, "unidade", None) is not None:
+        return {nome: func() for nome, func in tarefas.items()}
+
+    executor = executor or _get_executor_leituras()
+    sessao = _id_sessao()
+
+    def rodar(func):
+        # a thread do pool não tem o contexto do Streamlit: herda a sessão de quem pediu
+        _sessao_herdada.set(sessao)
+        return func()
+
+    futuros = {
+        nome: executor.submit(contextvars.copy_context().run, rodar, func) for nome, func in tarefas.items()
+    }
+    try:
+        concurrent.futures.wait(futuros.values(), timeout=tempo_max)
+        return {nome: futuro.result(timeout=0) for nome, futuro in futuros.items()}
+    except concurrent.futures.TimeoutError:
+        for futuro in futuros.values():
+            futuro.cancel()
+        raise TimeoutError(f"Leituras em paralelo não terminaram em {tempo_max}s.")
+
+# --------------------------------
+# Geração de IDs (tabela de sequências + blocos em memória)
+# --------------------------------
+TABELAS_COM_SEQUENCIA = {"psicologos", "login", "clientes", "sessoes"}
+
+class _AlocadorIds:
+    """
+    Substitui o padrão SELECT MAX(id)+1: cada processo reserva blocos de `tamanho_bloco`
+    ids na tabela `sequencias` (um UPDATE atômico) e os entrega da memória.
+
+    - Dois processos nunca recebem o mesmo id (a reserva do bloco é serializada pelo banco).
+    - A maioria dos INSERTs não faz nenhuma ida extra ao banco para descobrir o id.
+    - Ids reservados e não usados (reinício do processo, rollback) viram lacunas — sem problema para PK.
+    """
+
+    def __init__(self, tamanho_bloco=20):
+        self.tamanho_bloco = tamanho_bloco
+        self._lock = threading.Lock()
+        self._blocos = {}  # tabela -> (proximo, limite) — intervalo [proximo, limite)
+
+    def proximo(self, tabela):
+        return self.reservar(tabela, 1)[0]
+
+    def reservar(self, tabela, quantidade):
+        """Devolve `quantidade` ids novos para `tabela` (não necessariamente contíguos)."""
+        if tabela not in TABELAS_COM_SEQUENCIA:
+            raise ValueError(f"Tabela sem sequência: {tabela}")
+        ids = []
+        with self._lock:
+            while len(ids) < quantidade:
+                proximo, limite = self._blocos.get(tabela, (0, 0))
+                if proximo >= limite:
+                    tamanho = max(self.tamanho_bloco, quantidade - len(ids))
+                    proximo = _backend.reservar_bloco_ids(tabela, tamanho)
+                    limite = proximo + tamanho
+                usar = min(limite - proximo, quantidade - len(ids))
+                ids.extend(range(proximo, proximo + usar))
+                self._blocos[tabela] = (proximo + usar, limite)
+        return ids
+
+def _reservar_bloco_ids(tabela, tamanho):
+    """
+    Reserva [inicio, inicio + tamanho) na tabela `sequencias` e devolve `inicio`.
+    Usa uma conexão própria do pool: a trava da linha da sequência dura só esta transação,
+    nunca a unidade de trabalho de quem pediu o id.
+    """
+    pool = _get_pool()
+    conexao = pool.obter()
+    descartar = False
+    try:
+        with conexao.cursor() as cursor:
+            cursor.execute(
+                "UPDATE sequencias SET proximo = proximo + %s WHERE tabela = %s",
+                (tamanho, tabela),
+            )
+            if cursor.rowcount:
+                cursor.execute("SELECT proximo FROM sequencias WHERE tabela = %s", (tabela,))
+                inicio = cursor.fetchone()["proximo"] - tamanho
+            else:
+                # primeira reserva: semeia a sequência a partir dos ids já existentes
+                cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 AS inicio FROM {tabela}")
+                inicio = cursor.fetchone()["inicio"]
+                try:
+                    cursor.execute(
+                        "INSERT INTO sequencias (tabela, proximo) VALUES (%s, %s)",
+                        (tabela, inicio + tamanho),
+                    )
+                except pymysql.err.IntegrityError:
+                    # outro processo semeou ao mesmo tempo: reserva pelo caminho normal
+                    conexao.rollback()
+                    pool.devolver(conexao)
+                    conexao = None
+                    return _reservar_bloco_ids(tabela, tamanho)
+        conexao.commit()
+        return inicio
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+        descartar = True
+        raise
+    finally:
+        if conexao is not None:
+            pool.devolver(conexao, descartar=descartar)
+
+_alocador_ids = _AlocadorIds(tamanho_bloco=int(os.getenv("ID_BLOCO", "20")))
+
+# --------------------------------
+# Migrações de schema (versionadas)
+# --------------------------------
+def _indice_existe(cursor, tabela, nome):
+    return _backend.indice_existe(cursor, tabela, nome)
+
+def _coluna_existe(cursor, tabela, coluna):
+    return _backend.coluna_existe(cursor, tabela, coluna)
+
+def _criar_indice(cursor, tabela, nome, colunas):
+    """CREATE INDEX idempotente (o MySQL não aceita CREATE INDEX IF NOT EXISTS)."""
+    if not _indice_existe(cursor, tabela, nome):
+        cursor.execute(f"CREATE INDEX {nome} ON {tabela} ({colunas})")
+
+def _m001_indice_sessoes_cliente_data_hora(cursor):
+    # sessoes_por_cliente (filtro + ORDER BY data, hora) e checagem de conflito (cliente, data, hora)
+    _criar_indice(cursor, "sessoes", "idx_sessoes_cliente_data_hora", "cliente_id, data, hora")
+
+def _m002_indice_clientes_psicologo(cursor):
+    # listar_clientes e os resumos filtram por psicologo_responsavel
+    _criar_indice(cursor, "clientes", "idx_clientes_psicologo_nome", "psicologo_responsavel, nome")
+
+def _m003_indices_nome(cursor):
+    # checagem de nome duplicado no INSERT de clientes/psicólogos
+    _criar_indice(cursor, "clientes", "idx_clientes_nome", "nome")
+    _criar_indice(cursor, "psicologos", "idx_psicologos_nome", "nome")
+
+def _m004_resumo_mensal(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS resumo_mensal (
+            psicologo_responsavel BIGINT NOT NULL,
+            cliente_id BIGINT NOT NULL,
+            ano INT NOT NULL,
+            mes INT NOT NULL,
+            sessoes_feitas INT NOT NULL,
+            sessoes_faltas INT NOT NULL,
+            total_recebido DOUBLE NOT NULL,
+            total_a_receber DOUBLE NOT NULL,
+            realizadas_pendentes INT NOT NULL,
+            faltas_cobraveis_pendentes INT NOT NULL,
+            valor_pendente DOUBLE NOT NULL,
+            PRIMARY KEY (psicologo_responsavel, cliente_id, ano, mes)
+        );
+    """)
+    _criar_indice(cursor, "resumo_mensal", "idx_resumo_mensal_cliente", "cliente_id, ano, mes")
+    _reconstruir_resumo_mensal(cursor)
+
+def _m005_atualizado_em_e_exclusoes(cursor):
+    # marca d'água da exportação incremental (ver exportar_parquet)
+    for tabela in ("clientes", "sessoes"):
+        if not _coluna_existe(cursor, tabela, "atualizado_em"):
+            _backend.adicionar_atualizado_em(cursor, tabela)
+        _criar_indice(cursor, tabela, f"idx_{tabela}_atualizado_em", "atualizado_em")
+    # DELETE não deixa linha para a marca d'água: registra a exclusão aqui
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS exclusoes (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            tabela VARCHAR(64) NOT NULL,
+            registro_id BIGINT NOT NULL,
+            psicologo_responsavel BIGINT,
+            excluido_em TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+        );
+    """)
+    _criar_indice(cursor, "exclusoes", "idx_exclusoes_excluido_em", "excluido_em")
+
+# (versão, descrição, passo). Cada passo precisa ser idempotente: DDL no MySQL faz commit
+# implícito, então uma migração interrompida é simplesmente executada de novo.
+MIGRACOES = [
+    (1, "índice sessoes(cliente_id, data, hora)", _m001_indice_sessoes_cliente_data_hora),
+    (2, "índice clientes(psicologo_responsavel, nome)", _m002_indice_clientes_psicologo),
+    (3, "índices de nome em clientes e psicologos", _m003_indices_nome),
+    (4, "tabela resumo_mensal (rollup financeiro por cliente/mês)", _m004_resumo_mensal),
+    (5, "atualizado_em em clientes/sessoes e tabela exclusoes", _m005_atualizado_em_e_exclusoes),
+]
+
+def aplicar_migracoes():
+    """
+    Garante as tabelas base (criar_tabelas) e aplica, em ordem, as migrações ainda não
+    registradas em `schema_migracoes`. Uma trava (GET_LOCK no MySQL) impede que dois processos
+    migrem juntos.
+    Retorna a lista de versões aplicadas nesta chamada.
+    """
+    criar_tabelas()
+    versao_atual = MIGRACOES[-1][0]
+    aplicadas_agora = []
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migracoes (
+                    versao INT PRIMARY KEY,
+                    descricao VARCHAR(255) NOT NULL,
+                    aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            cursor.execute("SELECT COALESCE(MAX(versao), 0) AS versao FROM schema_migracoes")
+            if cursor.fetchone()["versao"] >= versao_atual:
+                return aplicadas_agora  # caminho comum: nada a fazer
+
+            with _backend.trava_migracao(cursor):
+                cursor.execute("SELECT versao FROM schema_migracoes")
+                ja_aplicadas = {row["versao"] for row in cursor.fetchall()}
+                for versao, descricao, passo in MIGRACOES:
+                    if versao in ja_aplicadas:
+                        continue
+                    passo(cursor)
+                    cursor.execute(
+                        "INSERT INTO schema_migracoes (versao, descricao) VALUES (%s, %s)",
+                        (versao, descricao),
+                    )
+                    conn.commit()
+                    aplicadas_agora.append(versao)
+    return aplicadas_agora
+
+@lru_cache(maxsize=1)
+def preparar_banco():
+    """
+    Gancho de inicialização: aplica as migrações pendentes uma vez por processo.
+    O import deste módulo não toca no banco; quem sobe o app (app.py) ou gera dados
+    (benchmarks) chama isto. Com `python -m db.functions migrar` no deploy, aqui sobra só a
+    checagem de versão.
+    """
+    return aplicar_migracoes()
+
+# Consultas do caminho quente e parâmetros de exemplo para o EXPLAIN
+CONSULTAS_QUENTES = [
+    ("sessoes_por_cliente",
+     "SELECT id, data, hora FROM sessoes WHERE cliente_id = %s ORDER BY data DESC, hora DESC",
+     (1,)),
+    ("sessoes_por_cliente_periodo",
+     "SELECT id, data, hora FROM sessoes WHERE cliente_id = %s AND data >= %s AND data < %s"
+     " ORDER BY data DESC, hora DESC",
+     (1, "2024-01-01", "2024-02-01")),
+    ("pagina_sessoes_cliente",
+     "SELECT id, data, hora FROM sessoes WHERE cliente_id = %s"
+     " AND (data < %s OR (data = %s AND (hora < %s OR (hora = %s AND id < %s))))"
+     " ORDER BY data DESC, hora DESC, id DESC LIMIT 21",
+     (1, "2024-01-01", "2024-01-01", "08:00:00", "08:00:00", 1)),
+    ("anos_com_sessoes",
+     "SELECT MIN(data), MAX(data) FROM sessoes WHERE cliente_id = %s",
+     (1,)),
+    ("conflito_sessao",
+     "SELECT 1 FROM sessoes WHERE cliente_id = %s AND data = %s AND hora = %s",
+     (1, "2024-01-01", "08:00:00")),
+    ("listar_clientes",
+     "SELECT * FROM clientes WHERE psicologo_responsavel = %s",
+     (1,)),
+    ("cliente_duplicado",
+     "SELECT 1 FROM clientes WHERE nome = %s",
+     ("x",)),
+    ("select_user",
+     "SELECT * FROM login WHERE usuario = %s AND senha = %s",
+     ("x", "x")),
+    ("validate_user",
+     "SELECT * FROM login WHERE id = %s",
+     (1,)),
+    ("resumo_financeiro_mensal",
+     "SELECT c.nome, SUM(r.total_recebido) FROM clientes c LEFT JOIN resumo_mensal r ON r.cliente_id = c.id"
+     " WHERE c.psicologo_responsavel = %s AND r.ano = %s AND r.mes = %s GROUP BY c.nome",
+     (1, 2024, 1)),
+    ("resumo_pendencias_bordas",
+     "SELECT c.id, SUM(s.valor) FROM clientes c JOIN sessoes s ON c.id = s.cliente_id"
+     " WHERE c.psicologo_responsavel = %s AND s.data >= %s AND s.data < %s GROUP BY c.id",
+     (1, "2024-01-01", "2024-02-01")),
+    ("resumo_mensal_balde",
+     "SELECT COUNT(*) FROM sessoes WHERE cliente_id = %s AND data >= %s AND data < %s",
+     (1, "2024-01-01", "2024-02-01")),
+]
+
+def verificar_indices(consultas=None):
+    """
+    Roda EXPLAIN em cada consulta quente e confere se toda tabela é acessada por índice.
+    Retorna um DataFrame (consulta, tabela, tipo, indice, ok). Rode contra uma base com volume
+    real: em tabelas quase vazias o otimizador pode preferir varredura completa.
+    """
+    linhas = []
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            for nome, sql, params in consultas or CONSULTAS_QUENTES:
+                for plano in _backend.explicar(cursor, sql, params):
+                    extra = plano.get("Extra") or ""
+                    sem_leitura = any(
+                        motivo in extra
+                        for motivo in ("no matching row in const table", "Impossible WHERE",
+                                       "Select tables optimized away")  # MIN/MAX resolvido pelo índice
+                    )
+                    linhas.append({
+                        "consulta": nome,
+                        "tabela": plano.get("table"),
+                        "tipo": plano.get("type"),
+                        "indice": plano.get("key"),
+                        # type=index tem key, mas varre o índice inteiro: tão ruim quanto ALL
+                        "ok": sem_leitura or (
+                            bool(plano.get("key")) and plano.get("type") not in ("ALL", "index")
+                        ),
+                    })
+    return pd.DataFrame(linhas, columns=["consulta", "tabela", "tipo", "indice", "ok"])
+
+# --------------------------------
+# Resumo mensal (rollup financeiro mantido a cada escrita)
+# --------------------------------
+# Mesmas regras de resumo_financeiro / resumo_pendencias, por cliente e mês
+_MEDIDAS_MENSAIS = [
+    ("sessoes_feitas", "COUNT(CASE WHEN s.status = 'realizada' THEN 1 END)"),
+    ("sessoes_faltas", "COUNT(CASE WHEN s.status = 'falta' THEN 1 END)"),
+    ("total_recebido",
+     "COALESCE(SUM(CASE WHEN s.status = 'realizada' AND s.pagamento THEN s.valor ELSE 0 END), 0)"),
+    ("total_a_receber", """COALESCE(SUM(CASE
+        WHEN (s.status = 'falta' AND s.cobrar = 1) OR
+             (s.status = 'realizada' AND (s.pagamento = 0 OR s.pagamento IS NULL))
+        THEN s.valor ELSE 0 END), 0)"""),
+    ("realizadas_pendentes",
+     "COUNT(CASE WHEN s.status = 'realizada' AND (s.pagamento = 0 OR s.pagamento IS NULL) THEN 1 END)"),
+    ("faltas_cobraveis_pendentes",
+     "COUNT(CASE WHEN s.status = 'falta' AND (s.pagamento = 0 OR s.pagamento IS NULL) AND s.cobrar = 1 THEN 1 END)"),
+    ("valor_pendente", """COALESCE(SUM(CASE
+        WHEN s.status = 'realizada' AND (s.pagamento = 0 OR s.pagamento IS NULL) THEN s.valor
+        WHEN s.status = 'falta' AND (s.pagamento = 0 OR s.pagamento IS NULL) AND s.cobrar = 1 THEN s.valor
+        ELSE 0 END), 0)"""),
+]
+_SQL_MEDIDAS_MENSAIS = ",\n    ".join(f"{expr} AS {col}" for col, expr in _MEDIDAS_MENSAIS)
+_COLUNAS_RESUMO_MENSAL = ["psicologo_responsavel", "cliente_id", "ano", "mes"] + [c for c, _ in _MEDIDAS_MENSAIS]
+_SQL_INSERT_RESUMO_MENSAL = f"INSERT INTO resumo_mensal ({', '.join(_COLUNAS_RESUMO_MENSAL)})"
+
+def _balde(cliente_id, data):
+    """Chave (cliente_id, ano, mes) do resumo_mensal afetado por uma sessão."""
+    d = _como_data(data)
+    return (int(cliente_id), d.year, d.month)
+
+def _atualizar_resumo_mensal(cursor, baldes):
+    """
+    Recalcula, no cursor (e transação) de quem escreveu, os meses afetados de resumo_mensal.
+    Cada balde relê só as sessões daquele cliente/mês pelo índice (cliente_id, data, hora),
+    então o custo não depende do tamanho do histórico. Devolve os clientes afetados
+    (para invalidar_motor_analitico depois do COMMIT).
+    """
+    baldes = sorted(set(baldes))
+    for cliente_id, ano, mes in baldes:
+        inicio, fim = _intervalo_mes_ano(mes, ano)
+        cursor.execute(
+            "DELETE FROM resumo_mensal WHERE cliente_id = %s AND ano = %s AND mes = %s",
+            (cliente_id, ano, mes),
+        )
+        cursor.execute(f"""
+            {_SQL_INSERT_RESUMO_MENSAL}
+            SELECT c.psicologo_responsavel, c.id, %s, %s, {_SQL_MEDIDAS_MENSAIS}
+              FROM clientes c
+              JOIN sessoes s ON s.cliente_id = c.id
+             WHERE c.id = %s AND c.psicologo_responsavel IS NOT NULL
+               AND s.data >= %s AND s.data < %s
+             GROUP BY c.psicologo_responsavel, c.id
+        """, (ano, mes, cliente_id, inicio, fim))
+    return {cliente_id for cliente_id, _, _ in baldes}
+
+def _reconstruir_resumo_mensal(cursor, clientes_ids=None):
+    """Recalcula resumo_mensal inteiro (ou só dos clientes informados) a partir de sessoes."""
+    filtro, params = "", ()
+    if clientes_ids is None:
+        cursor.execute("DELETE FROM resumo_mensal")
+    else:
+        clientes_ids = [int(cid) for cid in clientes_ids]
+        if not clientes_ids:
+            return
+        marcadores = ", ".join(["%s"] * len(clientes_ids))
+        filtro, params = f" AND c.id IN ({marcadores})", tuple(clientes_ids)
+        cursor.execute(f"DELETE FROM resumo_mensal WHERE cliente_id IN ({marcadores})", params)
+    cursor.execute(f"""
+        {_SQL_INSERT_RESUMO_MENSAL}
+        SELECT c.psicologo_responsavel, c.id, YEAR(s.data), MONTH(s.data), {_SQL_MEDIDAS_MENSAIS}
+          FROM clientes c
+          JOIN sessoes s ON s.cliente_id = c.id
+         WHERE c.psicologo_responsavel IS NOT NULL{filtro}
+         GROUP BY c.psicologo_responsavel, c.id, YEAR(s.data), MONTH(s.data)
+    """, params)
+
+def reconstruir_resumo_mensal(clientes_ids=None):
+    """Reconstrói resumo_mensal a partir das sessões (todos os clientes ou só `clientes_ids`)."""
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            _reconstruir_resumo_mensal(cursor, clientes_ids)
         conn.commit()
+    invalidar_cache("sessoes")
+    if clientes_ids is None:
+        _motor_analitico.descartar()
+    else:
+        invalidar_motor_analitico(clientes_ids)
+
+def verificar_resumo_mensal(tolerancia=0.005) -> pd.DataFrame:
+    """
+    Compara resumo_mensal com o recálculo a partir de sessoes.
+    Retorna as linhas divergentes (vazio = rollup consistente).
+    """
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(_COLUNAS_RESUMO_MENSAL)} FROM resumo_mensal")
+            gravado = pd.DataFrame(cursor.fetchall(), columns=_COLUNAS_RESUMO_MENSAL)
+            cursor.execute(f"""
+                SELECT c.psicologo_responsavel, c.id AS cliente_id,
+                       YEAR(s.data) AS ano, MONTH(s.data) AS mes, {_SQL_MEDIDAS_MENSAIS}
+                  FROM clientes c
+                  JOIN sessoes s ON s.cliente_id = c.id
+                 WHERE c.psicologo_responsavel IS NOT NULL
+                 GROUP BY c.psicologo_responsavel, c.id, YEAR(s.data), MONTH(s.data)
+            """)
+            esperado = pd.DataFrame(cursor.fetchall(), columns=_COLUNAS_RESUMO_MENSAL)
+
+    chaves = _COLUNAS_RESUMO_MENSAL[:4]
+    medidas = _COLUNAS_RESUMO_MENSAL[4:]
+    for df in (gravado, esperado):
+        df[chaves] = df[chaves].astype("int64")
+        df[medidas] = df[medidas].astype(float)
+    comparado = esperado.merge(gravado, on=chaves, how="outer", suffixes=("_esperado", "_gravado"), indicator=True)
+    divergente = comparado["_merge"] != "both"
+    for m in medidas:
+        divergente |= (comparado[f"{m}_esperado"] - comparado[f"{m}_gravado"]).abs() > tolerancia
+    return comparado[divergente].drop(columns="_merge").reset_index(drop=True)
+
+# --------------------------------
+# Motor analítico (DuckDB): snapshot colunar por psicólogo
+# --------------------------------
+# Opcional (MOTOR_ANALITICO=duckdb): os agregados do dashboard e dos indicadores rodam em SQL
+# vetorizado sobre uma cópia em memória (DuckDB) das sessões do psicólogo. O padrão
+# (MOTOR_ANALITICO=mysql) lê de resumo_mensal, cujo custo não depende do histórico.
+# Com o snapshot ligado, esses agregados não passam pelo cache de leituras (o snapshot já é a
+# cópia em memória). Cada snapshot tem a sua versão: uma escrita só recarrega o do psicólogo
+# dono do cliente alterado. No máximo MOTOR_ANALITICO_MAX_SNAPSHOTS ficam em memória (LRU).
+_SQL_MEDIDAS_DUCKDB = {
+    "sessoes_feitas": "COUNT(*) FILTER (WHERE s.status = 'realizada')",
+    "sessoes_faltas": "COUNT(*) FILTER (WHERE s.status = 'falta')",
+    "total_recebido": "COALESCE(SUM(s.valor) FILTER (WHERE s.status = 'realizada' AND s.pago), 0)",
+    "total_a_receber": """COALESCE(SUM(s.valor) FILTER (WHERE (s.status = 'falta' AND s.cobrar)
+                                                  OR (s.status = 'realizada' AND NOT s.pago)), 0)""",
+    "realizadas_pendentes": "COUNT(*) FILTER (WHERE s.status = 'realizada' AND NOT s.pago)",
+    "faltas_cobraveis_pendentes": "COUNT(*) FILTER (WHERE s.status = 'falta' AND NOT s.pago AND s.cobrar)",
+    "valor_pendente": """COALESCE(SUM(s.valor) FILTER (WHERE NOT s.pago AND (s.status = 'realizada'
+                                                  OR (s.status = 'falta' AND s.cobrar))), 0)""",
+}
+
+def _medidas_duckdb(colunas):
+    return ",\n".join(f"{_SQL_MEDIDAS_DUCKDB[c]} AS {c}" for c in colunas)
+
+class _SnapshotAnalitico:
+    """Tabelas `clientes` e `sessoes` de um psicólogo num DuckDB em memória."""
+    TABELAS = ("clientes", "sessoes")
+
+    def __init__(self, psicologo_responsavel):
+        self.psicologo_responsavel = psicologo_responsavel
+        self.con = get_duckdb()
+        self.carregado_em = None
+        self.versao = None
+        self.clientes = frozenset()
+
+    def carregar(self, versao):
+        clientes = _consultar_df(
+            "SELECT id, nome FROM clientes WHERE psicologo_responsavel = %s",
+            (self.psicologo_responsavel,), {"id": "int64", "nome": "string"}, leitura_de=self.TABELAS,
+        )
+        sessoes = _consultar_df("""
+            SELECT s.id, s.cliente_id, s.data, s.valor, s.status, s.cobrar, s.pagamento
+              FROM sessoes s
+              JOIN clientes c ON c.id = s.cliente_id
+             WHERE c.psicologo_responsavel = %s
+        """, (self.psicologo_responsavel,), {
+            "id": "int64", "cliente_id": "int64", "data": "datetime64[ns]", "valor": "float64",
+            "status": "string", "cobrar": "object", "pagamento": "object",
+        }, sem_buffer=True, leitura_de=self.TABELAS)
+
+        sessoes = pd.DataFrame({
+            "id": sessoes["id"],
+            "cliente_id": sessoes["cliente_id"],
+            "data": sessoes["data"].dt.date,
+            "valor": sessoes["valor"],
+            "status": sessoes["status"],
+            # mesmas regras do MySQL: NULL conta como não pago / não cobrar
+            "cobrar": sessoes["cobrar"].fillna(0).astype(int) == 1,
+            "pago": sessoes["pagamento"].fillna(0).astype(int) != 0,
+        })
+        for tabela, df in (("clientes", clientes), ("sessoes", sessoes)):
+            self.con.register(f"_carga_{tabela}", df)
+            self.con.execute(f"CREATE OR REPLACE TABLE {tabela} AS SELECT * FROM _carga_{tabela}")
+            self.con.unregister(f"_carga_{tabela}")
+        self.carregado_em = time.monotonic()
+        self.versao = versao
+        self.clientes = frozenset(int(c) for c in clientes["id"])
+
+    def consultar(self, sql, params=()):
+        return self.con.execute(sql, list(params)).fetchdf()
+
+
+class _MotorAnalitico:
+    """
+    Mantém um _SnapshotAnalitico por psicólogo (no máximo `max_snapshots`, LRU).
+    - Recarrega o snapshot de um psicólogo quando a versão dele muda (invalidar_motor_analitico).
+    - Recarrega a cada `ttl` segundos para enxergar escritas de outros processos.
+    """
+    TABELAS = ("clientes", "sessoes")
+
+    def __init__(self, ttl=300.0, max_snapshots=8):
+        self.ttl = ttl
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        self._snapshots = OrderedDict()  # psicólogo -> _SnapshotAnalitico
+        self._versoes = {}               # psicólogo -> contador de escritas
+        self._donos = {}                 # cliente_id -> psicólogo (dos snapshots em memória)
+        self._carregando = set()
+        self._travas = {}
+        self._stats = {"consultas": 0, "recargas": 0, "removidos_lru": 0}
+
+    def _trava(self, psicologo_responsavel):
+        with self._lock:
+            return self._travas.setdefault(psicologo_responsavel, threading.Lock())
+
+    def invalidar(self, clientes=(), psicologo=None):
+        with self._lock:
+            alvos = set() if psicologo is None else {int(psicologo)}
+            for cliente_id in clientes:
+                dono = self._donos.get(int(cliente_id))
+                # cliente fora dos snapshots em memória: só um que esteja carregando agora pode tê-lo
+                alvos.update(self._carregando if dono is None else {dono})
+            for alvo in alvos:
+                self._versoes[alvo] = self._versoes.get(alvo, 0) + 1
+
+    def consultar(self, psicologo_responsavel, sql, params=()):
+        psicologo_responsavel = int(psicologo_responsavel)
+        # uma conexão DuckDB não aceita uso concorrente: serializa por psicólogo
+        with self._trava(psicologo_responsavel):
+            with self._lock:
+                snap = self._snapshots.get(psicologo_responsavel)
+                versao = self._versoes.get(psicologo_responsavel, 0)
+            if (snap is None or snap.versao != versao
+                    or time.monotonic() - snap.carregado_em > self.ttl):
+                snap = snap or _SnapshotAnalitico(psicologo_responsavel)
+                with self._lock:
+                    self._carregando.add(psicologo_responsavel)
+                try:
+                    snap.carregar(versao)
+                finally:
+                    with self._lock:
+                        self._carregando.discard(psicologo_responsavel)
+                self._guardar(snap)
+            with self._lock:
+                if psicologo_responsavel in self._snapshots:
+                    self._snapshots.move_to_end(psicologo_responsavel)
+                self._stats["consultas"] += 1
+            return snap.consultar(sql, params)
+
+    def _guardar(self, snap):
+        with self._lock:
+            anterior = self._snapshots.pop(snap.psicologo_responsavel, None)
+            if anterior is not None:
+                self._esquecer_clientes(anterior)
+            self._snapshots[snap.psicologo_responsavel] = snap
+            self._donos.update(dict.fromkeys(snap.clientes, snap.psicologo_responsavel))
+            self._stats["recargas"] += 1
+            while len(self._snapshots) > self.max_snapshots:
+                _, removido = self._snapshots.popitem(last=False)
+                # sem close(): outra thread pode estar no meio de uma consulta nele; o GC fecha
+                self._esquecer_clientes(removido)
+                self._stats["removidos_lru"] += 1
+
+    def _esquecer_clientes(self, snap):
+        for cliente_id in snap.clientes:
+            if self._donos.get(cliente_id) == snap.psicologo_responsavel:
+                del self._donos[cliente_id]
+
+    def descartar(self, psicologo_responsavel=None):
+        with self._lock:
+            alvos = list(self._snapshots) if psicologo_responsavel is None else [int(psicologo_responsavel)]
+            for alvo in alvos:
+                snap = self._snapshots.pop(alvo, None)
+                if snap is not None:
+                    self._esquecer_clientes(snap)
+
+    def estatisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"snapshots": len(self._snapshots), "max_snapshots": self.max_snapshots, "ttl_s": self.ttl})
+        return stats
+
+
+_motor_analitico = _MotorAnalitico(
+    ttl=float(os.getenv("MOTOR_ANALITICO_TTL", "300")),
+    max_snapshots=int(os.getenv("MOTOR_ANALITICO_MAX_SNAPSHOTS", "8")),
+)
+
+def _usar_motor_analitico():
+    if os.getenv("MOTOR_ANALITICO", "mysql").lower() != "duckdb":
+        return False
+    unidade = getattr(_unidade_local, "unidade", None)
+    # escrita ainda não confirmada na unidade atual: só o MySQL (mesma transação) a enxerga
+    return unidade is None or not unidade.tabelas_sujas.intersection(_MotorAnalitico.TABELAS)
+
+def invalidar_motor_analitico(clientes=(), psicologo=None):
+    """
+    Recarrega, na próxima consulta, só os snapshots afetados: o do dono de cada cliente em
+    `clientes` e o de `psicologo`. Chamar depois do COMMIT, junto com invalidar_cache.
+    """
+    unidade = getattr(_unidade_local, "unidade", None)
+    if unidade is not None:
+        # de novo ao fim da unidade: um snapshot pode ser recarregado antes do COMMIT
+        unidade.analitico_sujo.append((tuple(clientes), psicologo))
+    _motor_analitico.invalidar(clientes, psicologo)
+
+def estatisticas_motor_analitico():
+    """Contadores do motor analítico (consultas, recargas, snapshots em memória)."""
+    return _motor_analitico.estatisticas()
+
+# --------------------------------
+# Exportação Parquet incremental (snapshot local por psicólogo/ano)
+# --------------------------------
+# destino/
+#   sessoes/psicologo=<id>/ano=<aaaa>/*.parquet
+#   clientes/psicologo=<id>/dados.parquet
+#   _marca_dagua.json
+# Tipos fixos: sem eles o DuckDB infere pelo conteúdo do lote (coluna toda NULL vira INTEGER)
+# e os arquivos de uma mesma pasta divergiriam.
+TIPOS_SESSOES_PARQUET = {
+    "id": "BIGINT", "cliente_id": "BIGINT", "data": "DATE", "hora": "TIME", "valor": "DOUBLE",
+    "status": "VARCHAR", "cobrar": "BOOLEAN", "pagamento": "BOOLEAN", "nota_fiscal": "VARCHAR",
+    "conteudo": "VARCHAR", "objetivo": "VARCHAR", "material": "VARCHAR", "atividade_casa": "VARCHAR",
+    "emocao_entrada": "BIGINT", "emocao_saida": "BIGINT", "proxima_sessao": "VARCHAR",
+    "observacao": "VARCHAR", "atualizado_em": "TIMESTAMP",
+}
+TIPOS_CLIENTES_PARQUET = {
+    "id": "BIGINT", "nome": "VARCHAR", "valor_sessao": "DOUBLE",
+    "dia_agendamento": "VARCHAR", "atualizado_em": "TIMESTAMP",
+}
+COLUNAS_SESSOES_PARQUET = list(TIPOS_SESSOES_PARQUET)
+COLUNAS_CLIENTES_PARQUET = list(TIPOS_CLIENTES_PARQUET)
+
+def _destino_parquet(destino=None):
+    return destino or os.getenv("PARQUET_DESTINO", "dados/parquet")
+
+def _ler_marca_dagua(destino):
+    caminho = os.path.join(destino, "_marca_dagua.json")
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho) as f:
+        return datetime.fromisoformat(json.load(f)["marca_dagua"])
+
+def _gravar_marca_dagua(destino, marca):
+    caminho = os.path.join(destino, "_marca_dagua.json")
+    with open(caminho + ".tmp", "w") as f:
+        json.dump({"marca_dagua": marca.isoformat()}, f)
+    os.replace(caminho + ".tmp", caminho)
+
+def _tipar_sessoes_parquet(df):
+    df = df.copy()
+    df["data"] = pd.to_datetime(df["data"]).dt.date
+    if pd.api.types.is_timedelta64_dtype(df["hora"]):
+        df["hora"] = (pd.Timestamp(0) + df["hora"]).dt.time  # TIME do pymysql chega como timedelta
+    df["ano"] = pd.to_datetime(df["data"]).dt.year.astype("int64")
+    return df
+
+def _regravar_pasta(con, pasta, sql, params, particionar_por_ano):
+    """Grava o resultado de `sql` numa pasta temporária e troca pela pasta antiga."""
+    temporaria, antiga = pasta + ".tmp", pasta + ".old"
+    for p in (temporaria, antiga):
+        shutil.rmtree(p, ignore_errors=True)
+    os.makedirs(temporaria)
+    if particionar_por_ano:
+        con.execute(f"COPY ({sql}) TO '{temporaria}' (FORMAT PARQUET, PARTITION_BY (ano), OVERWRITE_OR_IGNORE)", params)
+    else:
+        con.execute(f"COPY ({sql}) TO '{os.path.join(temporaria, 'dados.parquet')}' (FORMAT PARQUET)", params)
+    if os.path.exists(pasta):
+        os.rename(pasta, antiga)
+    os.rename(temporaria, pasta)
+    shutil.rmtree(antiga, ignore_errors=True)
+
+def _mesclar_pasta(con, pasta, delta, tipos, ids_removidos, clientes_removidos=(), particionar_por_ano=False):
+    """
+    pasta = parquet existente − linhas reenviadas (mesmo id) − excluídas + delta.
+    Uma sessão pode ter mudado de ano, então a pasta do psicólogo é reescrita inteira
+    (o volume de um psicólogo é pequeno; o ganho está em não reler o MySQL).
+    """
+    colunas = list(tipos)
+    extra = ", CAST(ano AS BIGINT) AS ano" if particionar_por_ano else ""
+    lista = ", ".join(f"CAST({c} AS {t}) AS {c}" for c, t in tipos.items())
+    con.register("_delta", delta[colunas + (["ano"] if particionar_por_ano else [])])
+    sql = f"SELECT {lista}{extra} FROM _delta"
+    params = []
+    if glob.glob(os.path.join(pasta, "**", "*.parquet"), recursive=True):
+        filtro_clientes = "AND NOT list_contains(?, cliente_id)" if "cliente_id" in colunas else ""
+        sql = f"""
+            SELECT {lista}{extra}
+              FROM read_parquet('{pasta}/**/*.parquet', hive_partitioning = {str(particionar_por_ano).lower()})
+             WHERE id NOT IN (SELECT id FROM _delta)
+               AND NOT list_contains(?, id) {filtro_clientes}
+            UNION ALL {sql}
+        """
+        params = [list(ids_removidos)] + ([list(clientes_removidos)] if filtro_clientes else [])
+    _regravar_pasta(con, pasta, sql, params, particionar_por_ano)
+    con.unregister("_delta")
+
+def exportar_parquet(destino=None, completo=False):
+    """
+    Exporta clientes e sessões para Parquet local, particionado por psicólogo (e ano, nas sessões).
+    A primeira execução (ou completo=True) faz o dump inteiro; as seguintes trazem só as linhas com
+    atualizado_em desde a última marca d'água (menos uma sobreposição para transações que
+    confirmaram atrasadas — reprocessar uma linha é inofensivo, o id é único) e aplicam `exclusoes`.
+    Retorna um resumo do que foi sincronizado.
+    """
+    destino = _destino_parquet(destino)
+    os.makedirs(destino, exist_ok=True)
+    marca = None if completo else _ler_marca_dagua(destino)
+    if marca is None:
+        for sub in ("sessoes", "clientes"):
+            shutil.rmtree(os.path.join(destino, sub), ignore_errors=True)
+    desde = None if marca is None else marca - timedelta(seconds=float(os.getenv("PARQUET_SOBREPOSICAO_S", "300")))
+
+    filtro_s, filtro_c, filtro_e, params = "", "", "", ()
+    if desde is not None:
+        filtro_s, filtro_c, filtro_e, params = (
+            " AND s.atualizado_em >= %s", " AND atualizado_em >= %s", " WHERE excluido_em >= %s", (desde,)
+        )
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT CURRENT_TIMESTAMP(6) AS agora")
+            agora = pd.Timestamp(cursor.fetchone()["agora"]).to_pydatetime()  # SQLite devolve texto
+            cursor.execute(f"""
+                SELECT {", ".join("s." + c for c in COLUNAS_SESSOES_PARQUET)}, c.psicologo_responsavel
+                  FROM sessoes s
+                  JOIN clientes c ON c.id = s.cliente_id
+                 WHERE c.psicologo_responsavel IS NOT NULL{filtro_s}
+            """, params)
+            sessoes = pd.DataFrame(cursor.fetchall(), columns=COLUNAS_SESSOES_PARQUET + ["psicologo_responsavel"])
+            cursor.execute(f"""
+                SELECT {", ".join(COLUNAS_CLIENTES_PARQUET)}, psicologo_responsavel
+                  FROM clientes
+                 WHERE psicologo_responsavel IS NOT NULL{filtro_c}
+            """, params)
+            clientes = pd.DataFrame(cursor.fetchall(), columns=COLUNAS_CLIENTES_PARQUET + ["psicologo_responsavel"])
+            if desde is None:
+                exclusoes = pd.DataFrame(columns=["tabela", "registro_id", "psicologo_responsavel"])
+            else:
+                cursor.execute(f"SELECT tabela, registro_id, psicologo_responsavel FROM exclusoes{filtro_e}", params)
+                exclusoes = pd.DataFrame(cursor.fetchall(), columns=["tabela", "registro_id", "psicologo_responsavel"])
+
+    sessoes = _tipar_sessoes_parquet(sessoes)
+    psicologos = (set(sessoes["psicologo_responsavel"]) | set(clientes["psicologo_responsavel"])
+                  | set(exclusoes["psicologo_responsavel"].dropna()))
+    con = get_duckdb()
+    try:
+        for psicologo in sorted(int(p) for p in psicologos):
+            excl = exclusoes[exclusoes["psicologo_responsavel"] == psicologo]
+            sessoes_excluidas = excl.loc[excl["tabela"] == "sessoes", "registro_id"].astype(int).tolist()
+            clientes_excluidos = excl.loc[excl["tabela"] == "clientes", "registro_id"].astype(int).tolist()
+            _mesclar_pasta(
+                con, os.path.join(destino, "sessoes", f"psicologo={psicologo}"),
+                sessoes[sessoes["psicologo_responsavel"] == psicologo], TIPOS_SESSOES_PARQUET,
+                sessoes_excluidas, clientes_excluidos, particionar_por_ano=True,
+            )
+            _mesclar_pasta(
+                con, os.path.join(destino, "clientes", f"psicologo={psicologo}"),
+                clientes[clientes["psicologo_responsavel"] == psicologo], TIPOS_CLIENTES_PARQUET,
+                clientes_excluidos,
+            )
+    finally:
+        con.close()
+    _gravar_marca_dagua(destino, agora)
+    return {
+        "completo": marca is None,
+        "sessoes": len(sessoes),
+        "clientes": len(clientes),
+        "exclusoes": len(exclusoes),
+        "psicologos": len(psicologos),
+        "marca_dagua": agora.isoformat(),
+    }
+
+def ler_sessoes_parquet(destino=None, psicologo_responsavel=None, ano=None) -> pd.DataFrame:
+    """Lê o snapshot Parquet das sessões; psicólogo/ano filtram pelas partições (sem ler o resto)."""
+    filtros, params = [], []
+    if psicologo_responsavel is not None:
+        filtros.append("psicologo = ?")
+        params.append(int(psicologo_responsavel))
+    if ano is not None:
+        filtros.append("ano = ?")
+        params.append(int(ano))
+    where_sql = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    con = get_duckdb()
+    try:
+        return con.execute(f"""
+            SELECT * FROM read_parquet('{_destino_parquet(destino)}/sessoes/*/*/*.parquet', hive_partitioning = true)
+            {where_sql}
+            ORDER BY data, hora
+        """, params).fetchdf()
+    finally:
+        con.close()
 
 # --------------------------------
 # INSERT / UPDATE / DELETE: MySQL
 # --------------------------------
 
 def adicionar_psicologo(nome):
+    novo_id = _alocador_ids.proximo("psicologos")
     with get_mysql_conn() as conn:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) AS count FROM psicologos WHERE nome = %s", (nome,))
-            if cursor.fetchone()['count']:
+            # INSERT único: só insere se não houver psicólogo com o mesmo nome
+            cursor.execute("""
+                INSERT INTO psicologos (id, nome)
+                SELECT %s, %s FROM (SELECT 1) AS novo
+                WHERE NOT EXISTS (SELECT 1 FROM psicologos WHERE nome = %s)
+            """, (novo_id, nome, nome))
+            if cursor.rowcount == 0:
                 # mantém o comportamento anterior (lança erro ao tentar criar duplicado)
                 raise ValueError("Psicólogo já cadastrado.")
-            cursor.execute("SELECT MAX(id) AS max_id FROM psicologos")
-            novo_id = (cursor.fetchone()['max_id'] or 0) + 1
-            cursor.execute("INSERT INTO psicologos (id, nome) VALUES (%s, %s)", (novo_id, nome))
         conn.commit()
+    invalidar_cache("psicologos")
 
 def adicionar_usuario(usuario, senha, funcao, psicologo_responsavel, privilegio):
     """
@@ -204,9 +2200,8 @@ def adicionar_usuario(usuario, senha, funcao, psicologo_responsavel, privilegio)
                 row = cursor.fetchone()
                 if row:
                     return row["id"]
-                # cria novo id pelo seu padrão MAX+1
-                cursor.execute("SELECT MAX(id) AS max_id FROM psicologos")
-                novo_pid = (cursor.fetchone()["max_id"] or 0) + 1
+                # cria novo id pela sequência de psicólogos
+                novo_pid = _alocador_ids.proximo("psicologos")
                 cursor.execute("INSERT INTO psicologos (id, nome) VALUES (%s, %s)", (novo_pid, nome))
                 return novo_pid
 
@@ -225,6 +2220,8 @@ def adicionar_usuario(usuario, senha, funcao, psicologo_responsavel, privilegio)
                          WHERE id = %s
                     """, (psicologo_id, existente['id']))
                     conn.commit()
+                    invalidar_cache("login", "psicologos")
+                    invalidar_principal(existente['id'])
                     return
                 else:
                     # Mantém regra atual para duplicidade de assistente (ou outra função)
@@ -241,111 +2238,265 @@ def adicionar_usuario(usuario, senha, funcao, psicologo_responsavel, privilegio)
                     raise ValueError("Selecione o Psicólogo responsável.")
                 psicologo_responsavel_final = psicologo_responsavel
 
-            # Gera novo id para login (mantendo seu padrão MAX+1)
-            cursor.execute("SELECT MAX(id) AS max_id FROM login")
-            novo_id = (cursor.fetchone()['max_id'] or 0) + 1
-
             # Criação exige senha; se vier vazia/None, rejeita
             if senha is None or str(senha).strip() == "":
                 raise ValueError("Senha obrigatória para criação de novo usuário.")
 
+            # Gera novo id para login pela sequência
+            novo_id = _alocador_ids.proximo("login")
+
             cursor.execute("""
                 INSERT INTO login (id, usuario, senha, funcao, psicologo_responsavel, privilegio)
                 VALUES (%s, %s, %s, %s, %s, %s)
             """, (novo_id, usuario, senha, funcao, psicologo_responsavel_final, privilegio))
 
         conn.commit()
+    invalidar_cache("login", "psicologos")
 
 def adicionar_cliente(nome, valor_sessao, psicologo_responsavel, dia_agendamento):
+    novo_id = _alocador_ids.proximo("clientes")
     with get_mysql_conn() as conn:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) AS count FROM clientes WHERE nome = %s", (nome,))
-            if cursor.fetchone()['count']:
-                raise ValueError("Cliente já cadastrado.")
-            cursor.execute("SELECT MAX(id) AS max_id FROM clientes")
-            novo_id = (cursor.fetchone()['max_id'] or 0) + 1
+            # INSERT único: a checagem de nome duplicado vai no próprio INSERT
             cursor.execute("""
                 INSERT INTO clientes (id, nome, valor_sessao, psicologo_responsavel, dia_agendamento)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (novo_id, nome, valor_sessao, psicologo_responsavel, dia_agendamento))
+                SELECT %s, %s, %s, %s, %s FROM (SELECT 1) AS novo
+                WHERE NOT EXISTS (SELECT 1 FROM clientes WHERE nome = %s)
+            """, (novo_id, nome, valor_sessao, psicologo_responsavel, dia_agendamento, nome))
+            if cursor.rowcount == 0:
+                raise ValueError("Cliente já cadastrado.")
         conn.commit()
+    invalidar_cache("clientes")
+    invalidar_motor_analitico(psicologo=psicologo_responsavel)
 
 def adicionar_sessao(
     cliente_id, data, hora, valor, status, cobrar, pagamento, nota_fiscal,
     conteudo, objetivo, material, atividade_casa,
     emocao_entrada, emocao_saida, proxima_sessao, observacao
 ):
+    novo_id = _alocador_ids.proximo("sessoes")
+    hora = _hora_str(hora)  # 'HH:MM' -> 'HH:MM:SS': mesma forma em qualquer backend
     with get_mysql_conn() as conn:
         with conn.cursor() as cursor:
-            # Verifica se já existe sessão nesse dia/hora para o cliente
-            cursor.execute("""
-                SELECT COUNT(*) AS count FROM sessoes
-                WHERE cliente_id = %s AND data = %s AND hora = %s
-            """, (cliente_id, data, hora))
-            if cursor.fetchone()['count']:
-                raise ValueError("Sessão já registrada para este cliente neste horário.")
-            
-            # Gera novo ID
-            cursor.execute("SELECT MAX(id) AS max_id FROM sessoes")
-            novo_id = (cursor.fetchone()['max_id'] or 0) + 1
-            
-            # Insere com a nova coluna 'observacao'
+            # INSERT único: só insere se não existir sessão nesse dia/hora para o cliente
             cursor.execute("""
                 INSERT INTO sessoes (
                     id, cliente_id, data, hora, valor, status, cobrar, pagamento, nota_fiscal,
                     conteudo, objetivo, material, atividade_casa,
                     emocao_entrada, emocao_saida, proxima_sessao, observacao
                 )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                SELECT %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+                  FROM (SELECT 1) AS novo
+                 WHERE NOT EXISTS (
+                    SELECT 1 FROM sessoes
+                     WHERE cliente_id = %s AND data = %s AND hora = %s
+                 )
             """, (
                 novo_id, cliente_id, data, hora, valor, status, cobrar, pagamento, nota_fiscal,
                 conteudo, objetivo, material, atividade_casa,
-                emocao_entrada, emocao_saida, proxima_sessao, observacao
+                emocao_entrada, emocao_saida, proxima_sessao, observacao,
+                cliente_id, data, hora
             ))
+            if cursor.rowcount == 0:
+                raise ValueError("Sessão já registrada para este cliente neste horário.")
+            clientes = _atualizar_resumo_mensal(cursor, [_balde(cliente_id, data)])
+        conn.commit()
+    invalidar_cache("sessoes")
+    invalidar_motor_analitico(clientes)
+
+# dia_agendamento -> date.weekday()
+DIAS_SEMANA = {
+    "Segunda-feira": 0,
+    "Terça-feira": 1,
+    "Quarta-feira": 2,
+    "Quinta-feira": 3,
+    "Sexta-feira": 4,
+}
+
+def _hora_str(hora):
+    """time, timedelta (TIME do pymysql) ou 'HH:MM[:SS]' -> 'HH:MM:SS'."""
+    if isinstance(hora, timedelta):
+        return (datetime.min + hora).strftime("%H:%M:%S")
+    if hasattr(hora, "strftime"):
+        return hora.strftime("%H:%M:%S")
+    texto = str(hora)
+    return texto if texto.count(":") == 2 else f"{texto}:00"
+
+def gerar_sessoes_recorrentes(cliente_id, dia_agendamento, hora, dt_inicio, dt_fim, valor,
+                              status="realizada", cobrar=False, pagamento=False, nota_fiscal="NF-"):
+    """
+    Uma sessão por semana no `dia_agendamento` do cliente, de dt_inicio a dt_fim (inclusivo).
+    Devolve dicts no formato de adicionar_sessao, prontos para adicionar_sessoes_em_lote.
+    """
+    if dia_agendamento not in DIAS_SEMANA:
+        raise ValueError("Cliente sem dia de agendamento definido (segunda a sexta).")
+    inicio, fim = _como_data(dt_inicio), _como_data(dt_fim)
+    dia = inicio + timedelta(days=(DIAS_SEMANA[dia_agendamento] - inicio.weekday()) % 7)
+    sessoes = []
+    while dia <= fim:
+        sessoes.append({
+            "cliente_id": int(cliente_id), "data": dia, "hora": _hora_str(hora), "valor": float(valor),
+            "status": status, "cobrar": cobrar, "pagamento": pagamento, "nota_fiscal": nota_fiscal,
+            "conteudo": "", "objetivo": "", "material": "", "atividade_casa": "",
+            "emocao_entrada": 3, "emocao_saida": 3, "proxima_sessao": "", "observacao": "",
+        })
+        dia += timedelta(days=7)
+    return sessoes
+
+_COLUNAS_INSERT_SESSAO = [
+    "cliente_id", "data", "hora", "valor", "status", "cobrar", "pagamento", "nota_fiscal",
+    "conteudo", "objetivo", "material", "atividade_casa",
+    "emocao_entrada", "emocao_saida", "proxima_sessao", "observacao",
+]
+
+def adicionar_sessoes_em_lote(sessoes, ignorar_conflitos=True):
+    """
+    Insere várias sessões numa única transação:
+    - uma consulta confere conflitos (mesmo cliente/dia/hora) do lote inteiro;
+    - ids vêm de uma única reserva no alocador;
+    - um executemany grava tudo e o resumo mensal é recalculado uma vez por mês afetado.
+    Com ignorar_conflitos=True os horários já ocupados são pulados; senão nada é gravado.
+    Retorna (inseridas, conflitos) — listas de (cliente_id, data, hora).
+    """
+    # normaliza e remove repetições dentro do próprio lote
+    lote = {}
+    for sessao in sessoes:
+        chave = (int(sessao["cliente_id"]), _como_data(sessao["data"]), _hora_str(sessao["hora"]))
+        lote.setdefault(chave, sessao)
+    if not lote:
+        return [], []
+
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            marcadores = ", ".join(["(%s, %s, %s)"] * len(lote))
+            cursor.execute(
+                f"SELECT cliente_id, data, hora FROM sessoes WHERE (cliente_id, data, hora) IN ({marcadores})",
+                [valor for chave in lote for valor in chave],
+            )
+            ocupados = {
+                (int(r["cliente_id"]), _como_data(r["data"]), _hora_str(r["hora"])) for r in cursor.fetchall()
+            }
+            conflitos = sorted(chave for chave in lote if chave in ocupados)
+            if conflitos and not ignorar_conflitos:
+                raise ValueError(f"{len(conflitos)} sessão(ões) já registrada(s) nestes horários.")
+
+            novas = [chave for chave in lote if chave not in ocupados]
+            if novas:
+                ids = _alocador_ids.reservar("sessoes", len(novas))
+                linhas = []
+                for novo_id, (cliente_id, data, hora) in zip(ids, novas):
+                    sessao = lote[(cliente_id, data, hora)]
+                    linhas.append((novo_id, cliente_id, data, hora) + tuple(
+                        sessao.get(col) for col in _COLUNAS_INSERT_SESSAO[3:]
+                    ))
+                cursor.executemany(
+                    f"INSERT INTO sessoes (id, {', '.join(_COLUNAS_INSERT_SESSAO)})"
+                    f" VALUES ({', '.join(['%s'] * (len(_COLUNAS_INSERT_SESSAO) + 1))})",
+                    linhas,
+                )
+                clientes = _atualizar_resumo_mensal(cursor, [_balde(c, d) for c, d, _ in novas])
         conn.commit()
+    if novas:
+        invalidar_cache("sessoes")
+        invalidar_motor_analitico(clientes)
+    return sorted(novas), conflitos
 
 def excluir_cliente(cliente_id):
     with get_mysql_conn() as conn:
         with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO exclusoes (tabela, registro_id, psicologo_responsavel)
+                SELECT 'clientes', id, psicologo_responsavel FROM clientes WHERE id = %s
+            """, (cliente_id,))
+            cursor.execute("DELETE FROM resumo_mensal WHERE cliente_id = %s", (cliente_id,))
             cursor.execute("DELETE FROM sessoes WHERE cliente_id = %s", (cliente_id,))
             cursor.execute("DELETE FROM clientes WHERE id = %s", (cliente_id,))
         conn.commit()
+    invalidar_cache("clientes", "sessoes")
+    invalidar_motor_analitico([cliente_id])
 
 def excluir_sessao(sessao_id):
     with get_mysql_conn() as conn:
         with conn.cursor() as cursor:
+            cursor.execute("SELECT cliente_id, data FROM sessoes WHERE id = %s", (sessao_id,))
+            sessao = cursor.fetchone()
+            cursor.execute("""
+                INSERT INTO exclusoes (tabela, registro_id, psicologo_responsavel)
+                SELECT 'sessoes', s.id, c.psicologo_responsavel
+                  FROM sessoes s JOIN clientes c ON c.id = s.cliente_id
+                 WHERE s.id = %s
+            """, (sessao_id,))
             cursor.execute("DELETE FROM sessoes WHERE id = %s", (sessao_id,))
+            clientes = _atualizar_resumo_mensal(cursor, [_balde(sessao["cliente_id"], sessao["data"])] if sessao else [])
+        conn.commit()
+    invalidar_cache("sessoes")
+    invalidar_motor_analitico(clientes)
+
+def _update_sessao(sessao_id, campos):
+    """UPDATE só das colunas em `campos` ({coluna: valor}) e recálculo do mês em resumo_mensal."""
+    with get_mysql_conn() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE sessoes SET {', '.join(f'{coluna} = %s' for coluna in campos)} WHERE id = %s",
+                list(campos.values()) + [sessao_id],
+            )
+            cursor.execute("SELECT cliente_id, data FROM sessoes WHERE id = %s", (sessao_id,))
+            sessao = cursor.fetchone()
+            clientes = _atualizar_resumo_mensal(cursor, [_balde(sessao["cliente_id"], sessao["data"])] if sessao else [])
         conn.commit()
+    invalidar_cache("sessoes")
+    invalidar_motor_analitico(clientes)
 
 def update_sessao(sessao_id, pagamento, valor, status, cobrar, nota_fiscal,
                   conteudo, objetivo, material, atividade_casa,
                   emocao_entrada, emocao_saida, proxima_sessao, observacao):
+    _update_sessao(sessao_id, {
+        "pagamento": pagamento, "valor": valor, "status": status, "cobrar": cobrar,
+        "nota_fiscal": nota_fiscal, "conteudo": conteudo, "objetivo": objetivo,
+        "material": material, "atividade_casa": atividade_casa,
+        "emocao_entrada": emocao_entrada, "emocao_saida": emocao_saida,
+        "proxima_sessao": proxima_sessao, "observacao": observacao,
+    })
+
+def update_sessao_listagem(sessao_id, pagamento, valor, status, cobrar, nota_fiscal, observacao):
+    """
+    Atualiza só as colunas da listagem; o diário (conteúdo, objetivo, emoções...) fica como está
+    no banco. Para salvar com o diário fechado: nada de reler e regravar o texto do diário.
+    """
+    _update_sessao(sessao_id, {
+        "pagamento": pagamento, "valor": valor, "status": status, "cobrar": cobrar,
+        "nota_fiscal": nota_fiscal, "observacao": observacao,
+    })
+
+def update_sessoes_em_lote(sessao_ids, pagamento=None, status=None, cobrar=None, nota_fiscal=None):
+    """
+    Atualiza pagamento/status/cobrar/nota_fiscal de várias sessões num único UPDATE ... IN.
+    Campos None ficam como estão. Retorna o número de sessões alteradas.
+    """
+    sessao_ids = sorted({int(i) for i in sessao_ids})
+    campos = {"pagamento": pagamento, "status": status, "cobrar": cobrar, "nota_fiscal": nota_fiscal}
+    campos = {k: v for k, v in campos.items() if v is not None}
+    if not sessao_ids or not campos:
+        return 0
+    if "status" in campos and campos["status"] not in ("realizada", "falta"):
+        raise ValueError("Status inválido. Use 'realizada' ou 'falta'.")
+    if "nota_fiscal" in campos and not str(campos["nota_fiscal"]).startswith("NF-"):
+        raise ValueError("Nota Fiscal deve iniciar com 'NF-'")
+
+    marcadores = ", ".join(["%s"] * len(sessao_ids))
     with get_mysql_conn() as conn:
         with conn.cursor() as cursor:
-            cursor.execute("""
-                UPDATE sessoes 
-                SET pagamento = %s,
-                    valor = %s,
-                    status = %s,
-                    cobrar = %s,
-                    nota_fiscal = %s,
-                    conteudo = %s,
-                    objetivo = %s,
-                    material = %s,
-                    atividade_casa = %s,
-                    emocao_entrada = %s,
-                    emocao_saida = %s,
-                    proxima_sessao = %s,
-                    observacao = %s
-                WHERE id = %s
-            """, (
-                pagamento, valor, status, cobrar, nota_fiscal,
-                conteudo, objetivo, material, atividade_casa,
-                emocao_entrada, emocao_saida, proxima_sessao,
-                observacao,
-                sessao_id
-            ))
+            cursor.execute(
+                f"UPDATE sessoes SET {', '.join(f'{k} = %s' for k in campos)} WHERE id IN ({marcadores})",
+                list(campos.values()) + sessao_ids,
+            )
+            alteradas = cursor.rowcount
+            cursor.execute(f"SELECT cliente_id, data FROM sessoes WHERE id IN ({marcadores})", sessao_ids)
+            clientes = _atualizar_resumo_mensal(cursor, [_balde(r["cliente_id"], r["data"]) for r in cursor.fetchall()])
         conn.commit()
+    invalidar_cache("sessoes")
+    invalidar_motor_analitico(clientes)
+    return alteradas
 
 def atualizar_privilegio_usuario(id_usuario, novo_privilegio):
     with get_mysql_conn() as conn:
@@ -355,6 +2506,8 @@ def atualizar_privilegio_usuario(id_usuario, novo_privilegio):
                 (int(novo_privilegio), id_usuario)
             )
         conn.commit()
+    invalidar_cache("login")
+    invalidar_principal(id_usuario)
 
 def atualizar_nome_cliente(cliente_id: int, novo_nome: str):
     """Atualiza o nome do cliente garantindo que não exista duplicidade global de nome."""
@@ -368,6 +2521,8 @@ def atualizar_nome_cliente(cliente_id: int, novo_nome: str):
                 raise ValueError("Já existe um cliente com esse nome.")
             cursor.execute("UPDATE clientes SET nome = %s WHERE id = %s", (novo_nome, cliente_id))
         conn.commit()
+    invalidar_cache("clientes")
+    invalidar_motor_analitico([cliente_id])
 
 def atualizar_dia_agendamento_cliente(cliente_id: int, novo_dia: str):
     """
@@ -395,6 +2550,7 @@ def atualizar_dia_agendamento_cliente(cliente_id: int, novo_dia: str):
             if cursor.rowcount == 0:
                 raise ValueError("Cliente não encontrado.")
         conn.commit()
+    invalidar_cache("clientes")
 
 def update_sessao_data_hora(sessao_id: int, nova_data: str, nova_hora):
     """
@@ -424,8 +2580,8 @@ def update_sessao_data_hora(sessao_id: int, nova_data: str, nova_hora):
 
     with get_mysql_conn() as conn:
         with conn.cursor() as cursor:
-            # descobre o cliente_id da sessão
-            cursor.execute("SELECT cliente_id FROM sessoes WHERE id = %s", (sessao_id,))
+            # descobre o cliente_id (e a data atual, para o resumo mensal) da sessão
+            cursor.execute("SELECT cliente_id, data FROM sessoes WHERE id = %s", (sessao_id,))
             row = cursor.fetchone()
             if not row:
                 raise ValueError("Sessão não encontrada.")
@@ -449,33 +2605,26 @@ def update_sessao_data_hora(sessao_id: int, nova_data: str, nova_hora):
                    SET data = %s, hora = %s
                  WHERE id = %s
             """, (data_str, hora_str, sessao_id))
+            # mês de origem e de destino (podem ser o mesmo)
+            _atualizar_resumo_mensal(cursor, [_balde(cliente_id, row["data"]), _balde(cliente_id, data_str)])
         conn.commit()
+    invalidar_cache("sessoes")
+    invalidar_motor_analitico([cliente_id])
 
+@_leitura_em_cache("clientes")
 def listar_clientes(psicologo_responsavel):
-    with get_mysql_conn() as conn:
-       with conn.cursor() as cursor:
-        cursor.execute("SELECT * FROM clientes WHERE psicologo_responsavel = %s",(psicologo_responsavel,))
-        rows = cursor.fetchall()  # lista de dicionários
-       # Define os nomes esperados das colunas
-        colunas = ["id","nome","valor_sessao","psicologo_responsavel", "dia_agendamento"]
-
-        if not rows:
-            return pd.DataFrame(columns=colunas)
-        else:
-            return pd.DataFrame(rows, columns=colunas)
+    return _consultar_df(
+        f"SELECT {', '.join(ESQUEMA_CLIENTES)} FROM clientes WHERE psicologo_responsavel = %s",
+        (psicologo_responsavel,), ESQUEMA_CLIENTES, leitura_de=("clientes",),
+    )
 
+@_leitura_em_cache("login")
 def listar_login_privilegios():
-    with get_mysql_conn() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM login")
-            rows = cursor.fetchall()  # lista de dicionários
-            # Define os nomes esperados das colunas
-            colunas = ["id","usuario","senha","funcao","psicologo_responsavel","privilegio"]
-
-            if not rows:
-                return pd.DataFrame(columns=colunas)
-            else:
-                return pd.DataFrame(rows, columns=colunas)
+    esquema = {
+        "id": "int64", "usuario": "object", "senha": "object", "funcao": "object",
+        "psicologo_responsavel": "Int64", "privilegio": "object",
+    }
+    return _consultar_df(f"SELECT {', '.join(esquema)} FROM login", (), esquema, leitura_de=("login",))
 
 def select_user(usuario, senha):
     with get_mysql_conn() as conn:
@@ -484,102 +2633,454 @@ def select_user(usuario, senha):
             return cursor.fetchone()
     
 def validate_user(id):
-    with get_mysql_conn() as conn:
+    with get_mysql_conn_leitura("login") as conn:
         with conn.cursor() as cursor:
                 cursor.execute("SELECT * FROM login WHERE id = %s", (id,))
                 return cursor.fetchone()
 
-def listar_psicologos():
-    with get_mysql_conn() as conn:
+# --------------------------------
+# Principal autenticado (linha do login guardada na sessão)
+# --------------------------------
+# Todo rerun precisa de privilegio/psicologo_responsavel do usuário logado. A linha fica no
+# session_state: passado PRINCIPAL_TTL_S ela é relida em segundo plano (o rerun usa a cópia e o
+# seguinte adota a nova); passado PRINCIPAL_IDADE_MAX_S, ou depois de invalidar_principal
+# (privilégio, função, nome ou senha alterados), é relida na hora. A invalidação vale para as
+# sessões de todo o processo; entre processos, vale o TTL.
+COLUNAS_PRINCIPAL = ("id", "funcao", "privilegio", "psicologo_responsavel")
+PRINCIPAL_TTL_S = float(os.getenv("PRINCIPAL_TTL_S", "60"))
+PRINCIPAL_IDADE_MAX_S = float(os.getenv("PRINCIPAL_IDADE_MAX_S", "600"))
+_versoes_principal = {}
+_lock_principal = threading.Lock()
+
+def invalidar_principal(id_login):
+    """Força a releitura da linha desse login no próximo rerun de qualquer sessão que a guarde."""
+    unidade = getattr(_unidade_local, "unidade", None)
+    if unidade is not None:
+        # de novo ao fim da unidade: outra sessão pode reler a linha antes do COMMIT
+        unidade.principais_sujos.add(int(id_login))
+    with _lock_principal:
+        _versoes_principal[int(id_login)] = _versoes_principal.get(int(id_login), 0) + 1
+
+def _carregar_principal(id_login):
+    with get_mysql_conn_leitura("login") as conn:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM psicologos")
-            rows = cursor.fetchall()  # lista de dicionários
-            # Define os nomes esperados das colunas
-            colunas = ['id', "nome"]
+            cursor.execute(f"SELECT {', '.join(COLUNAS_PRINCIPAL)} FROM login WHERE id = %s", (id_login,))
+            return cursor.fetchone()
 
-            if not rows:
-                return pd.DataFrame(columns=colunas)
-            else:
-                return pd.DataFrame(rows, columns=colunas)
+def principal_autenticado(id_login, estado=None):
+    """
+    Linha do login (COLUNAS_PRINCIPAL) do usuário autenticado, ou None se ele não existe mais.
+    `estado` é onde a cópia fica guardada (padrão: st.session_state).
+    """
+    if id_login is None:
+        return None
+    estado = st.session_state if estado is None else estado
+    id_login = int(id_login)
+    versao = _versoes_principal.get(id_login, 0)
+    agora = time.monotonic()
+
+    entrada = estado.get("_principal")
+    if entrada and entrada["id"] == id_login and entrada["versao"] == versao:
+        revalidacao = entrada["revalidacao"]
+        if revalidacao is not None and revalidacao.done():
+            entrada["revalidacao"] = None
+            try:
+                entrada["linha"], entrada["carimbo"] = revalidacao.result(), entrada["inicio_revalidacao"]
+            except Exception:
+                pass  # fica com a cópia atual; a próxima revalidação tenta de novo
+        idade = agora - entrada["carimbo"]
+        if idade < PRINCIPAL_IDADE_MAX_S:
+            if idade >= PRINCIPAL_TTL_S and entrada["revalidacao"] is None:
+                entrada["inicio_revalidacao"] = agora
+                entrada["revalidacao"] = _get_executor_revalidacao().submit(_carregar_principal, id_login)
+            return dict(entrada["linha"]) if entrada["linha"] else None
+
+    linha = _carregar_principal(id_login)
+    estado["_principal"] = {"id": id_login, "versao": versao, "linha": linha, "carimbo": agora, "revalidacao": None}
+    return dict(linha) if linha else None
+
+# --------------------------------
+# Tempo até a primeira tela interativa (boot do app)
+# --------------------------------
+# O app.py marca o início na primeira execução do script de uma sessão (ou no clique em Entrar)
+# e registra aqui quando a primeira tela com widgets termina de renderizar, junto com quantas
+# execuções do script isso levou. Ficam as últimas BOOT_AMOSTRAS medidas de cada etapa.
+BOOT_AMOSTRAS = int(os.getenv("BOOT_AMOSTRAS", "200"))
+
+class _MetricasBoot:
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        self._amostras = {}
+
+    def registrar(self, etapa, segundos, execucoes):
+        with self._lock:
+            self._amostras.setdefault(etapa, deque(maxlen=self.maximo)).append((segundos, execucoes))
+
+    def estatisticas(self):
+        with self._lock:
+            copia = {etapa: list(amostras) for etapa, amostras in self._amostras.items()}
+        resultado = {}
+        for etapa, amostras in copia.items():
+            tempos = sorted(segundos * 1000 for segundos, _ in amostras)
+            resultado[etapa] = {
+                "amostras": len(tempos),
+                "p50_ms": round(tempos[len(tempos) // 2], 3),
+                "p95_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3),
+                "max_ms": round(tempos[-1], 3),
+                "execucoes_max": max(execucoes for _, execucoes in amostras),
+            }
+        return resultado
+
+_metricas_boot = _MetricasBoot(BOOT_AMOSTRAS)
+
+def registrar_tempo_interativo(etapa, segundos, execucoes):
+    """Uma medida de tempo até a primeira tela interativa (`execucoes` = execuções do script)."""
+    _metricas_boot.registrar(etapa, segundos, execucoes)
+
+def estatisticas_boot():
+    """Por etapa: amostras, p50/p95/máximo (ms) e o maior número de execuções do script até a tela."""
+    return _metricas_boot.estatisticas()
+
+@_leitura_em_cache("psicologos")
+def listar_psicologos():
+    return _consultar_df(
+        "SELECT id, nome FROM psicologos", (), {"id": "int64", "nome": "object"}, leitura_de=("psicologos",)
+    )
+
+# --------------------------------
+# Leitura tipada (tuplas -> colunas já no dtype final)
+# --------------------------------
+# dtype de cada coluna lida; "time" = datetime.time (o TIME do pymysql chega como timedelta)
+ESQUEMA_SESSOES = {
+    "id": "int64", "cliente_id": "int64", "data": "datetime64[ns]", "hora": "time",
+    "valor": "float64", "status": "category", "cobrar": "bool", "pagamento": "bool",
+    "nota_fiscal": "object", "conteudo": "object", "objetivo": "object", "material": "object",
+    "atividade_casa": "object", "emocao_entrada": "Int8", "emocao_saida": "Int8",
+    "proxima_sessao": "object", "observacao": "object",
+}
+ESQUEMA_CLIENTES = {
+    "id": "int64", "nome": "object", "valor_sessao": "float64",
+    "psicologo_responsavel": "Int64", "dia_agendamento": "object",
+}
+
+def _coluna_tipada(valores, tipo):
+    if tipo == "datetime64[ns]":
+        return pd.to_datetime(pd.Series(valores, dtype=object)).astype("datetime64[ns]")
+    if tipo == "time":
+        serie = pd.Series(valores, dtype=object)
+        if serie.map(lambda v: isinstance(v, timedelta)).any():
+            return (pd.Timestamp(0) + pd.to_timedelta(serie)).dt.time
+        return serie
+    if tipo == "bool":
+        # flags BOOLEAN do MySQL: NULL conta como falso (mesma regra das consultas)
+        return pd.Series(valores, dtype=object).fillna(False).astype(bool)
+    return pd.Series(valores, dtype=tipo)
+
+def _consultar_df(sql, params, esquema, sem_buffer=False, lote=5000, leitura_de=None):
+    """
+    SELECT com cursor de tuplas (sem um dict por linha); o DataFrame é montado coluna a coluna,
+    já nos tipos de `esquema` ({coluna: dtype}, na ordem do SELECT).
+    sem_buffer=True usa SSCursor e lê em lotes de `lote` linhas: o driver não guarda o
+    resultado inteiro antes de começarmos a montar as colunas.
+    leitura_de=(tabelas...) permite ler da réplica (ver get_mysql_conn_leitura).
+    """
+    colunas = list(esquema)
+    valores = [[] for _ in colunas]
+    classe = pymysql.cursors.SSCursor if sem_buffer else pymysql.cursors.Cursor
+    conexao = get_mysql_conn_leitura(*leitura_de) if leitura_de is not None else get_mysql_conn()
+    with conexao as conn:
+        with conn.cursor(classe) as cursor:
+            cursor.execute(sql, params)
+            while True:
+                linhas = cursor.fetchmany(lote)
+                if not linhas:
+                    break
+                for destino, coluna in zip(valores, zip(*linhas)):
+                    destino.extend(coluna)
+    return pd.DataFrame(
+        {c: _coluna_tipada(v, esquema[c]) for c, v in zip(colunas, valores)}, columns=colunas
+    )
 
+# Listagem leve x campos do diário (carregados sob demanda)
+COLUNAS_SESSAO_LISTA = [
+    "id", "cliente_id", "data", "hora", "valor", "status",
+    "cobrar", "pagamento", "nota_fiscal", "observacao",
+]
+COLUNAS_SESSAO_DIARIO = [
+    "conteudo", "objetivo", "material", "atividade_casa",
+    "emocao_entrada", "emocao_saida", "proxima_sessao",
+]
+
+# Mesma regra de mascara_pendentes(), em SQL
+_SQL_SESSAO_PENDENTE = """
+    (status = 'realizada' OR (status = 'falta' AND cobrar = 1))
+    AND (pagamento = 0 OR pagamento IS NULL)
+"""
+
+def _listar_sessoes(where_sql, params, ordem="data DESC, hora DESC", limite=None, sem_buffer=False):
+    """Listagem leve (COLUNAS_SESSAO_LISTA) das sessões que atendem `where_sql`, já tipada."""
+    limite_sql = f"LIMIT {int(limite)}" if limite is not None else ""
+    df = _consultar_df(f"""
+        SELECT {", ".join(COLUNAS_SESSAO_LISTA)}
+        FROM sessoes 
+        WHERE {where_sql}
+        ORDER BY {ordem}
+        {limite_sql}
+    """, params, {c: ESQUEMA_SESSOES[c] for c in COLUNAS_SESSAO_LISTA}, sem_buffer=sem_buffer,
+        leitura_de=("sessoes",))
+
+    # se sua coluna permitir NULL, garanta string vazia ao invés de NaN (opcional)
+    df["observacao"] = df["observacao"].fillna("")
+    return df
+
+@_leitura_em_cache("sessoes")
 def sessoes_por_cliente(cliente_id):
-    with get_mysql_conn() as conn:
+    """
+    Listagem leve de TODO o histórico do cliente: data, hora, valor, status, flags, NF e observação.
+    Os campos do diário (TEXT longos e emoções) ficam de fora — ver detalhes_sessoes().
+    Na tela do cliente prefira sessoes_por_cliente_periodo / sessoes_pendentes_cliente.
+    """
+    return _listar_sessoes("cliente_id = %s", (cliente_id,), sem_buffer=True)
+
+@_leitura_em_cache("sessoes")
+def sessoes_por_cliente_periodo(cliente_id, dt_inicio, dt_fim):
+    """Sessões do cliente em [dt_inicio, dt_fim] (inclusivo), pelo índice (cliente_id, data, hora)."""
+    inicio, fim = _como_data(dt_inicio), _como_data(dt_fim) + timedelta(days=1)
+    return _listar_sessoes("cliente_id = %s AND data >= %s AND data < %s", (cliente_id, inicio, fim))
+
+@_leitura_em_cache("sessoes")
+def pagina_sessoes_cliente(cliente_id, dt_inicio=None, dt_fim=None, apos=None, tamanho=20):
+    """
+    Uma página (mais recentes primeiro) das sessões do cliente, por keyset em (data, hora, id).
+    `apos` é o cursor devolvido pela página anterior (None = primeira página); o período
+    [dt_inicio, dt_fim] é opcional. Retorna (DataFrame, cursor da próxima página ou None).
+    Cada página lê só `tamanho` + 1 linhas do índice (cliente_id, data, hora), em qualquer profundidade.
+    """
+    filtros, params = ["cliente_id = %s"], [cliente_id]
+    if dt_inicio is not None:
+        filtros.append("data >= %s")
+        params.append(_como_data(dt_inicio))
+    if dt_fim is not None:
+        filtros.append("data < %s")
+        params.append(_como_data(dt_fim) + timedelta(days=1))
+    if apos is not None:
+        data, hora, sessao_id = apos
+        # (data, hora, id) < cursor, expandido para o otimizador usar o índice
+        filtros.append("(data < %s OR (data = %s AND (hora < %s OR (hora = %s AND id < %s))))")
+        params.extend([data, data, hora, hora, sessao_id])
+
+    df = _listar_sessoes(" AND ".join(filtros), params, ordem="data DESC, hora DESC, id DESC", limite=tamanho + 1)
+    if len(df) <= tamanho:
+        return df, None
+    df = df.iloc[:tamanho]
+    ultima = df.iloc[-1]
+    return df, (_como_data(ultima["data"]), _hora_str(ultima["hora"]), int(ultima["id"]))
+
+@_leitura_em_cache("sessoes")
+def sessoes_pendentes_cliente(cliente_id):
+    """Sessões pendentes de pagamento do cliente, em todo o histórico (mais antigas primeiro)."""
+    return _listar_sessoes(f"cliente_id = %s AND {_SQL_SESSAO_PENDENTE}", (cliente_id,), ordem="data, hora")
+
+@_leitura_em_cache("sessoes")
+def anos_com_sessoes(cliente_id):
+    """
+    Anos entre a primeira e a última sessão do cliente (mais recente primeiro).
+    MIN/MAX sobre o índice (cliente_id, data) lê só as duas pontas, não o histórico.
+    """
+    with get_mysql_conn_leitura("sessoes") as conn:
         with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT
-                    id, cliente_id, data, hora, valor, status,
-                    cobrar, pagamento, nota_fiscal, conteudo, objetivo,
-                    material, atividade_casa, emocao_entrada, emocao_saida,
-                    proxima_sessao, observacao
-                FROM sessoes 
-                WHERE cliente_id = %s 
-                ORDER BY data DESC, hora DESC
-            """, (cliente_id,))
-            rows = cursor.fetchall()
+            cursor.execute(
+                "SELECT MIN(data) AS primeira, MAX(data) AS ultima FROM sessoes WHERE cliente_id = %s",
+                (cliente_id,),
+            )
+            row = cursor.fetchone() or {}
+    if not row.get("primeira"):
+        return []
+    return list(range(_como_data(row["ultima"]).year, _como_data(row["primeira"]).year - 1, -1))
 
-            colunas = [
-                "id", "cliente_id", "data", "hora", "valor", "status",
-                "cobrar", "pagamento", "nota_fiscal", "conteudo", "objetivo",
-                "material", "atividade_casa", "emocao_entrada", "emocao_saida",
-                "proxima_sessao", "observacao"
-            ]
+@_leitura_em_cache("sessoes")
+def detalhes_sessoes(sessao_ids) -> pd.DataFrame:
+    """
+    Campos do diário das sessões informadas (uma, ao abrir o diário, ou o lote do PDF do psicólogo).
+    Passe uma tupla de ids para aproveitar o cache.
+    """
+    sessao_ids = sorted({int(i) for i in sessao_ids})
+    esquema = {c: ESQUEMA_SESSOES[c] for c in ["id"] + COLUNAS_SESSAO_DIARIO}
+    if not sessao_ids:
+        return pd.DataFrame({c: _coluna_tipada([], t) for c, t in esquema.items()})
+    marcadores = ", ".join(["%s"] * len(sessao_ids))
+    return _consultar_df(
+        f"SELECT {', '.join(esquema)} FROM sessoes WHERE id IN ({marcadores})", sessao_ids, esquema,
+        leitura_de=("sessoes",),
+    )
 
-            if not rows:
-                return pd.DataFrame(columns=colunas)
-            df = pd.DataFrame(rows, columns=colunas)
+def com_detalhes(sessoes: pd.DataFrame) -> pd.DataFrame:
+    """Acrescenta os campos do diário a uma listagem de sessoes_por_cliente (uma consulta para o lote)."""
+    detalhes = detalhes_sessoes(tuple(int(i) for i in sessoes["id"]))
+    return sessoes.merge(detalhes, on="id", how="left")
 
-            # se sua coluna permitir NULL, garanta string vazia ao invés de NaN (opcional)
-            df["observacao"] = df["observacao"].fillna("")
-            return df
+def get_proximo_id(tabela):
+    """Reserva e devolve um id novo da sequência de `tabela` (não é reutilizado por outro INSERT)."""
+    return _alocador_ids.proximo(tabela)
 
-def get_proximo_id(tabela, campo='id'):
-    with get_mysql_conn() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT MAX({campo}) AS max_id FROM {tabela}")
-            resultado = cursor.fetchone()
-            return (resultado['max_id'] or 0) + 1
+def _como_data(valor):
+    """Aceita date, datetime/Timestamp ou 'YYYY-MM-DD' e devolve date."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return pd.to_datetime(valor).date()
 
+def _intervalo_mes_ano(mes=None, ano=None):
+    """
+    Intervalo semiaberto [inicio, fim) do mês/ano informado (ou do ano inteiro).
+    Devolve (None, None) quando não há ano — mês sozinho não vira intervalo.
+    """
+    if ano is None:
+        return None, None
+    ano = int(ano)
+    if mes is None:
+        return date(ano, 1, 1), date(ano + 1, 1, 1)
+    mes = int(mes)
+    inicio = date(ano, mes, 1)
+    fim = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+    return inicio, fim
+
+def _somas_resumo(colunas, prefixo="r"):
+    return ",\n".join(f"COALESCE(SUM({prefixo}.{c}), 0) AS {c}" for c in colunas)
+
+def _tipar_resumo(rows, colunas):
+    """
+    DataFrame do resumo (a partir de linhas do cursor ou de um DataFrame) com contagens int
+    e valores float (SUM de INT volta como Decimal no MySQL).
+    """
+    if len(rows) == 0:
+        return pd.DataFrame(columns=colunas)
+    df = pd.DataFrame(rows, columns=colunas)
+    for col in colunas:
+        if col.startswith(("sessoes_", "realizadas_", "faltas_")):
+            df[col] = df[col].astype(int)
+        elif col.startswith(("total_", "valor_")):
+            df[col] = df[col].astype(float)
+    return df
+
+@_leitura_em_cache("clientes", "sessoes", exceto_se=_usar_motor_analitico)
 def resumo_financeiro(psicologo_responsavel: int, mes: Optional[int] = None, ano: Optional[int] = None) -> pd.DataFrame:
     """
     Retorna o resumo por cliente. Se mes/ano não forem informados, traz TODAS as sessões.
+    Lê de resumo_mensal no MySQL; com MOTOR_ANALITICO=duckdb, agrega no snapshot do psicólogo.
     """
-    with get_mysql_conn() as conn:
-        # Monta filtros dinâmicos
-        filtros = ["c.psicologo_responsavel = %s"]
-        params = [psicologo_responsavel]
-
+    if _usar_motor_analitico():
+        filtros, params = [], [psicologo_responsavel]
         if ano is not None:
-            filtros.append("YEAR(s.data) = %s")
-            params.append(ano)
+            filtros.append("year(s.data) = ?")
+            params.append(int(ano))
         if mes is not None:
-            filtros.append("MONTH(s.data) = %s")
-            params.append(mes)
-
-        where_sql = " AND ".join(filtros)
-
-        query = f"""
-            SELECT 
-                c.nome,
-                COUNT(CASE WHEN s.status = 'realizada' THEN 1 END) AS sessoes_feitas,
-                COUNT(CASE WHEN s.status = 'falta' THEN 1 END) AS sessoes_faltas,
-                COALESCE(SUM(CASE WHEN s.status = 'realizada' AND s.pagamento THEN s.valor ELSE 0 END), 0) AS total_recebido,
-                COALESCE(SUM(CASE 
-                    WHEN (s.status = 'falta' AND s.cobrar = 1) OR 
-                         (s.status = 'realizada' AND (s.pagamento = 0 OR s.pagamento IS NULL)) 
-                    THEN s.valor ELSE 0 END), 0) AS total_a_receber
-            FROM clientes c
-            LEFT JOIN sessoes s ON c.id = s.cliente_id
-            WHERE {where_sql}
-            GROUP BY c.nome
-            ORDER BY c.nome
-        """
+            filtros.append("month(s.data) = ?")
+            params.append(int(mes))
+        where_sql = " AND ".join(filtros) or "TRUE"
+        df = _motor_analitico.consultar(psicologo_responsavel, f"""
+            SELECT c.nome, {_medidas_duckdb(MEDIDAS_RESUMO)}
+              FROM clientes c
+              LEFT JOIN sessoes s ON s.cliente_id = c.id
+             WHERE {where_sql}
+             GROUP BY c.nome
+             ORDER BY c.nome
+        """, params[1:])
+        return _tipar_resumo(df, ['nome'] + MEDIDAS_RESUMO)
+
+    filtros = ["c.psicologo_responsavel = %s"]
+    params = [psicologo_responsavel]
+    if ano is not None:
+        filtros.append("r.ano = %s")
+        params.append(int(ano))
+    if mes is not None:
+        # mês sem ano = aquele mês em todos os anos
+        filtros.append("r.mes = %s")
+        params.append(int(mes))
+
+    query = f"""
+        SELECT c.nome,
+            {_somas_resumo(MEDIDAS_RESUMO)}
+        FROM clientes c
+        LEFT JOIN resumo_mensal r ON r.cliente_id = c.id
+        WHERE {" AND ".join(filtros)}
+        GROUP BY c.nome
+        ORDER BY c.nome
+    """
+    with get_mysql_conn_leitura("clientes", "sessoes") as conn:
         with conn.cursor() as cursor:
             cursor.execute(query, params)
             rows = cursor.fetchall()
 
-        colunas = ['nome', 'sessoes_feitas', 'sessoes_faltas', 'total_recebido', 'total_a_receber']
-        return pd.DataFrame(rows, columns=colunas) if rows else pd.DataFrame(columns=colunas)
-    
+    return _tipar_resumo(rows, ['nome'] + MEDIDAS_RESUMO)
+
+MEDIDAS_RESUMO = ['sessoes_feitas', 'sessoes_faltas', 'total_recebido', 'total_a_receber']
+
+@_leitura_em_cache("clientes", "sessoes", exceto_se=_usar_motor_analitico)
+def resumo_financeiro_por_periodo(psicologo_responsavel: int) -> pd.DataFrame:
+    """
+    Resumo do psicólogo agrupado por cliente/ano/mês (resumo_mensal; snapshot com MOTOR_ANALITICO=duckdb).
+    Global, Anual e Mensal saem daqui via fatiar_resumo(), sem nova consulta.
+    Clientes sem sessões aparecem com ano/mes nulos (entram só no Global, como no resumo_financeiro).
+    """
+    if _usar_motor_analitico():
+        df = _motor_analitico.consultar(psicologo_responsavel, f"""
+            SELECT c.nome, year(s.data) AS ano, month(s.data) AS mes,
+                   {_medidas_duckdb(MEDIDAS_RESUMO)}
+              FROM clientes c
+              LEFT JOIN sessoes s ON s.cliente_id = c.id
+             GROUP BY c.nome, year(s.data), month(s.data)
+        """)
+        return _tipar_resumo(df, ['nome', 'ano', 'mes'] + MEDIDAS_RESUMO)
+
+    query = f"""
+        SELECT c.nome, r.ano, r.mes,
+            {_somas_resumo(MEDIDAS_RESUMO)}
+        FROM clientes c
+        LEFT JOIN resumo_mensal r ON r.cliente_id = c.id
+        WHERE c.psicologo_responsavel = %s
+        GROUP BY c.nome, r.ano, r.mes
+    """
+    with get_mysql_conn_leitura("clientes", "sessoes") as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, (psicologo_responsavel,))
+            rows = cursor.fetchall()
+
+    return _tipar_resumo(rows, ['nome', 'ano', 'mes'] + MEDIDAS_RESUMO)
+
+def fatiar_resumo(por_periodo: pd.DataFrame, mes: Optional[int] = None, ano: Optional[int] = None) -> pd.DataFrame:
+    """
+    Recorta o resultado de resumo_financeiro_por_periodo() em memória e devolve o mesmo
+    formato de resumo_financeiro(psicologo, mes, ano).
+    """
+    df = por_periodo
+    if ano is not None:
+        df = df[df['ano'] == ano]
+    if mes is not None:
+        df = df[df['mes'] == mes]
+
+    colunas = ['nome'] + MEDIDAS_RESUMO
+    if df.empty:
+        return pd.DataFrame(columns=colunas)
+    resumo = df.groupby('nome', as_index=False, sort=True)[MEDIDAS_RESUMO].sum()
+    resumo[['sessoes_feitas', 'sessoes_faltas']] = resumo[['sessoes_feitas', 'sessoes_faltas']].astype(int)
+    return resumo[colunas]
+
+def _dividir_periodo(inicio: date, fim: date):
+    """
+    Divide [inicio, fim) em meses completos (índices ano*12 + mes - 1, semiaberto)
+    e as bordas parciais que precisam ser lidas direto de sessoes.
+    """
+    primeiro = inicio if inicio.day == 1 else (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    ultimo = fim.replace(day=1)
+    if primeiro >= ultimo:
+        return (0, 0), [(inicio, fim), (fim, fim)]
+    meses = (primeiro.year * 12 + primeiro.month - 1, ultimo.year * 12 + ultimo.month - 1)
+    return meses, [(inicio, primeiro), (ultimo, fim)]
+
+@_leitura_em_cache("clientes", "sessoes", exceto_se=_usar_motor_analitico)
 def resumo_pendencias(
     psicologo_responsavel,
     dt_inicio,
@@ -591,34 +3092,85 @@ def resumo_pendencias(
       - status = 'falta' AND pagamento = 0/NULL AND cobrar = 1
 
     Filtra sempre pelo período [dt_inicio, dt_fim].
+    Meses inteiros do período vêm de resumo_mensal; só os meses das pontas são
+    somados a partir de sessoes.
 
     Retorna por cliente: contagens e valor total pendente.
     """
-    with get_mysql_conn() as conn:
-        query = """
-            SELECT
-                c.id AS cliente_id,
-                c.nome,
-                COUNT(CASE WHEN s.status='realizada' AND (s.pagamento = 0 OR s.pagamento IS NULL) THEN 1 END) AS realizadas_pendentes,
-                COUNT(CASE WHEN s.status='falta' AND (s.pagamento = 0 OR s.pagamento IS NULL) AND s.cobrar = 1 THEN 1 END) AS faltas_cobraveis_pendentes,
-                COALESCE(SUM(CASE 
-                    WHEN s.status='realizada' AND (s.pagamento = 0 OR s.pagamento IS NULL) THEN s.valor
-                    WHEN s.status='falta' AND (s.pagamento = 0 OR s.pagamento IS NULL) AND s.cobrar = 1 THEN s.valor
-                    ELSE 0 END), 0) AS valor_pendente
-            FROM clientes c
-            JOIN sessoes s ON c.id = s.cliente_id
-            WHERE c.psicologo_responsavel = %s
-              AND DATE(s.data) BETWEEN %s AND %s
-            GROUP BY c.id, c.nome
-            HAVING (realizadas_pendentes + faltas_cobraveis_pendentes) > 0
-            ORDER BY valor_pendente DESC, c.nome
-        """
+    pendencias = ['realizadas_pendentes', 'faltas_cobraveis_pendentes', 'valor_pendente']
+    # [dt_inicio, dt_fim] inclusivo == [dt_inicio, dt_fim + 1 dia) sem função sobre s.data
+    inicio, fim = _como_data(dt_inicio), _como_data(dt_fim) + timedelta(days=1)
+    if _usar_motor_analitico():
+        df = _motor_analitico.consultar(psicologo_responsavel, f"""
+            SELECT c.id AS cliente_id, c.nome, {_medidas_duckdb(pendencias)}
+              FROM clientes c
+              JOIN sessoes s ON s.cliente_id = c.id
+             WHERE s.data >= ? AND s.data < ?
+             GROUP BY c.id, c.nome
+            HAVING realizadas_pendentes + faltas_cobraveis_pendentes > 0
+             ORDER BY valor_pendente DESC, c.nome
+        """, (inicio, fim))
+        return _tipar_resumo(df, ['cliente_id', 'nome'] + pendencias)
+
+    medidas = dict(_MEDIDAS_MENSAIS)
+    (mes_de, mes_ate), ((b1_ini, b1_fim), (b2_ini, b2_fim)) = _dividir_periodo(inicio, fim)
+    query = f"""
+        SELECT
+            c.id AS cliente_id,
+            c.nome,
+            {_somas_resumo(pendencias, prefixo="p")}
+        FROM (
+            SELECT r.cliente_id, {", ".join(f"r.{m}" for m in pendencias)}
+              FROM resumo_mensal r
+             WHERE r.psicologo_responsavel = %s
+               AND r.ano * 12 + r.mes - 1 >= %s AND r.ano * 12 + r.mes - 1 < %s
+            UNION ALL
+            SELECT s.cliente_id, {", ".join(f"{medidas[m]} AS {m}" for m in pendencias)}
+              FROM clientes cb
+              JOIN sessoes s ON s.cliente_id = cb.id
+             WHERE cb.psicologo_responsavel = %s
+               AND ((s.data >= %s AND s.data < %s) OR (s.data >= %s AND s.data < %s))
+             GROUP BY s.cliente_id
+        ) p
+        JOIN clientes c ON c.id = p.cliente_id
+        GROUP BY c.id, c.nome
+        -- agregados explícitos: no SQLite o nome no HAVING é a coluna de p, não o alias do SELECT
+        HAVING (SUM(p.realizadas_pendentes) + SUM(p.faltas_cobraveis_pendentes)) > 0
+        ORDER BY valor_pendente DESC, c.nome
+    """
+    params = (psicologo_responsavel, mes_de, mes_ate, psicologo_responsavel, b1_ini, b1_fim, b2_ini, b2_fim)
+    with get_mysql_conn_leitura("clientes", "sessoes") as conn:
         with conn.cursor() as cursor:
-            cursor.execute(query, (psicologo_responsavel, dt_inicio, dt_fim))
+            cursor.execute(query, params)
             rows = cursor.fetchall()
 
-        colunas = ['cliente_id','nome', 'realizadas_pendentes', 'faltas_cobraveis_pendentes', 'valor_pendente']
-        return pd.DataFrame(rows, columns=colunas) if rows else pd.DataFrame(columns=colunas)
+    return _tipar_resumo(rows, ['cliente_id', 'nome'] + pendencias)
+
+@_leitura_em_cache("clientes", "sessoes", exceto_se=_usar_motor_analitico)
+def indicadores_cliente(psicologo_responsavel: int, cliente_id: int, mes: int, ano: int) -> dict:
+    """
+    Indicadores do mês para a tela do cliente: realizadas, faltas, recebido e pendente
+    (mesmas regras de resumo_financeiro).
+    """
+    inicio, fim = _intervalo_mes_ano(mes, ano)
+    if _usar_motor_analitico():
+        df = _motor_analitico.consultar(psicologo_responsavel, f"""
+            SELECT {_medidas_duckdb(MEDIDAS_RESUMO)}
+              FROM sessoes s
+             WHERE s.cliente_id = ? AND s.data >= ? AND s.data < ?
+        """, (int(cliente_id), inicio, fim))
+        linha = df.iloc[0].to_dict()
+    else:
+        with get_mysql_conn_leitura("clientes", "sessoes") as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT {", ".join(f"{expr} AS {col}" for col, expr in _MEDIDAS_MENSAIS[:4])}
+                      FROM sessoes s
+                     WHERE s.cliente_id = %s AND s.data >= %s AND s.data < %s
+                """, (cliente_id, inicio, fim))
+                linha = cursor.fetchone()
+    df = _tipar_resumo([linha], MEDIDAS_RESUMO)
+    return {col: df[col].iloc[0].item() for col in MEDIDAS_RESUMO}
 
 # -----------------------
 # PDF (inalterado)
@@ -773,6 +3325,19 @@ def gerar_pdf_texto(sessoes, cliente_nome, mes, ano, finalidade):
     return pdf.output(dest="S").encode("latin1")
 
 
+def _coluna(df, nome, padrao):
+    return df[nome] if nome in df.columns else pd.Series(padrao, index=df.index)
+
+def mascara_pendentes(sessoes: pd.DataFrame) -> pd.Series:
+    """
+    Regra de pendência (PDF de pendências e "quitar pendências" na tela do cliente):
+    sessão realizada não paga, ou falta com cobrança e não paga.
+    """
+    status = _coluna(sessoes, "status", "").astype(str).str.strip().str.lower()
+    pagamento = pd.to_numeric(_coluna(sessoes, "pagamento", 0), errors="coerce").fillna(0).astype(int)
+    cobrar = pd.to_numeric(_coluna(sessoes, "cobrar", 0), errors="coerce").fillna(0).astype(int)
+    return ((status == "realizada") | ((status == "falta") & (cobrar == 1))) & (pagamento == 0)
+
 def gerar_pdf_pendencias(sessoes, cliente_nome):
     """
     Gera um PDF de pendências financeiras do cliente ao longo de TODO o histórico,
@@ -804,17 +3369,13 @@ def gerar_pdf_pendencias(sessoes, cliente_nome):
         df["data"] = pd.NaT
 
     # Tipos e normalizações
-    df["status"] = df.get("status", "").astype(str).str.strip()
-    df["pagamento"] = pd.to_numeric(df.get("pagamento", 0), errors="coerce").fillna(0).astype(int)
-    df["cobrar"] = pd.to_numeric(df.get("cobrar", 0), errors="coerce").fillna(0).astype(int)
-    df["valor"] = pd.to_numeric(df.get("valor", 0), errors="coerce").fillna(0.0)
+    df["status"] = _coluna(df, "status", "").astype(str).str.strip()
+    df["pagamento"] = pd.to_numeric(_coluna(df, "pagamento", 0), errors="coerce").fillna(0).astype(int)
+    df["cobrar"] = pd.to_numeric(_coluna(df, "cobrar", 0), errors="coerce").fillna(0).astype(int)
+    df["valor"] = pd.to_numeric(_coluna(df, "valor", 0), errors="coerce").fillna(0.0)
 
     # --- Regra de pendência ---
-    feitas = df["status"].str.lower() == "realizada"
-    faltas_cobrar = (df["status"].str.lower() == "falta") & (df["cobrar"] == 1)
-    pendente_mask = (feitas | faltas_cobrar) & (df["pagamento"] == 0)
-
-    pendentes = df.loc[pendente_mask].copy()
+    pendentes = df.loc[mascara_pendentes(df)].copy()
 
     # Ordena por data (asc), depois hora se existir
     if "hora" in pendentes.columns:
@@ -953,4 +3514,40 @@ def gerar_pdf_pendencias(sessoes, cliente_nome):
     return pdf.output(dest="S").encode("latin1")
 
 
-criar_tabelas()
\ No newline at end of file
+def _cli(argv=None):
+    """Comandos de manutenção: python -m db.functions <comando>"""
+    parser = argparse.ArgumentParser(prog="python -m db.functions")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("migrar", help="aplica as migrações pendentes")
+    sub.add_parser("verificar-indices", help="EXPLAIN das consultas quentes; falha se alguma não usa índice")
+    sub.add_parser("reconstruir-resumo", help="recalcula resumo_mensal inteiro a partir de sessoes")
+    sub.add_parser("verificar-resumo", help="compara resumo_mensal com sessoes; falha se houver divergência")
+    exportar = sub.add_parser("exportar-parquet", help="sincroniza o snapshot Parquet local (incremental)")
+    exportar.add_argument("--destino", help="pasta do snapshot (padrão: $PARQUET_DESTINO ou dados/parquet)")
+    exportar.add_argument("--completo", action="store_true", help="ignora a marca d'água e refaz o dump inteiro")
+    args = parser.parse_args(argv)
+
+    if args.comando == "migrar":
+        print("Migrações aplicadas:", aplicar_migracoes() or "nenhuma (schema atualizado)")
+    elif args.comando == "verificar-indices":
+        relatorio = verificar_indices()
+        print(relatorio.to_string(index=False))
+        if not relatorio["ok"].all():
+            sys.exit(1)
+    elif args.comando == "reconstruir-resumo":
+        reconstruir_resumo_mensal()
+        print("resumo_mensal reconstruído.")
+    elif args.comando == "verificar-resumo":
+        divergencias = verificar_resumo_mensal()
+        if divergencias.empty:
+            print("resumo_mensal consistente com sessoes.")
+        else:
+            print(divergencias.to_string(index=False))
+            sys.exit(1)
+    elif args.comando == "exportar-parquet":
+        for chave, valor in exportar_parquet(args.destino, completo=args.completo).items():
+            print(f"{chave}: {valor}")
+
+
+if __name__ == "__main__":
+    _cli()
\ No newline at end of file
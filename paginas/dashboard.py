@@ -3,7 +3,8 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
-from db.functions import resumo_financeiro, resumo_pendencias, listar_psicologos, gerar_pdf_pendencias, sessoes_por_cliente
+from functools import partial
+from db.functions import resumo_financeiro_por_periodo, fatiar_resumo, resumo_pendencias, listar_psicologos, gerar_pdf_pendencias, sessoes_pendentes_cliente, executar_em_paralelo
 
 def _kpis_e_grafico(df_resumido: pd.DataFrame, titulo: str):
     total_recebido = float(df_resumido['total_recebido'].sum()) if not df_resumido.empty else 0.0
@@ -40,7 +41,29 @@ def show_dashboard(psicologo_responsavel: int):
     st.title("📊 Visão Geral do Sistema")
     st.write("Resumo financeiro e de sessões por cliente.")
 
-    psicologos_df = listar_psicologos()
+    # Prefixo estável para keys (evita colisão em múltiplos usuários/abas)
+    key_prefix = f"dash_{psicologo_responsavel}_"
+
+    # Período das pendências: os widgets só são desenhados na aba, mas o valor já está no session_state
+    hoje = datetime.now().date()
+    padrao_inicio = hoje.replace(day=1)  # 1º dia do mês atual
+    pend_inicio = st.session_state.get(key_prefix + "pend_dt_inicio", padrao_inicio)
+    pend_fim = st.session_state.get(key_prefix + "pend_dt_fim", hoje)
+
+    # Leituras independentes da página, disparadas juntas
+    tarefas = {
+        "psicologos": listar_psicologos,
+        # Uma consulta agrupada por cliente/ano/mês alimenta as três abas financeiras;
+        # trocar mês/ano só recorta esse resultado em memória
+        "por_periodo": partial(resumo_financeiro_por_periodo, psicologo_responsavel),
+    }
+    if pend_fim >= pend_inicio:
+        tarefas["pendencias"] = partial(
+            resumo_pendencias, psicologo_responsavel, dt_inicio=pend_inicio, dt_fim=pend_fim
+        )
+    leituras = executar_em_paralelo(tarefas)
+
+    psicologos_df = leituras["psicologos"]
     filtro = psicologos_df[psicologos_df['id'] == psicologo_responsavel]
     if not filtro.empty:
         psicologo = filtro.iloc[0]
@@ -48,9 +71,6 @@ def show_dashboard(psicologo_responsavel: int):
     else:
         st.warning("Psicóloga não encontrada.")
 
-    # Prefixo estável para keys (evita colisão em múltiplos usuários/abas)
-    key_prefix = f"dash_{psicologo_responsavel}_"
-
     st.markdown(
         """
         <style>
@@ -68,12 +88,14 @@ def show_dashboard(psicologo_responsavel: int):
         unsafe_allow_html=True
     )
 
+    por_periodo = leituras["por_periodo"]
+
     # Tabs: Global (todas as sessões), Anual, Mensal, Pendências
     tab_global, tab_anual, tab_mensal, tab_pend = st.tabs(["🌍 Global", "📅 Anual", "🗓️ Mensal", "❗ Pendências"])
 
     with tab_global:
         st.caption("Todas as sessões (sem filtro de mês/ano).")
-        df_resumido = resumo_financeiro(psicologo_responsavel=psicologo_responsavel, mes=None, ano=None)
+        df_resumido = fatiar_resumo(por_periodo)
         _kpis_e_grafico(df_resumido, titulo="💵 Financeiro - Global")
 
     with tab_anual:
@@ -85,7 +107,7 @@ def show_dashboard(psicologo_responsavel: int):
             index=len(anos) - 1,
             key=key_prefix + "anual_ano_select",
         )
-        df_resumido = resumo_financeiro(psicologo_responsavel=psicologo_responsavel, ano=ano, mes=None)
+        df_resumido = fatiar_resumo(por_periodo, ano=ano)
         _kpis_e_grafico(df_resumido, titulo=f"💵 Financeiro - {ano}")
 
     with tab_mensal:
@@ -103,7 +125,7 @@ def show_dashboard(psicologo_responsavel: int):
             index=len(anos) - 1,
             key=key_prefix + "mensal_ano_select",
         )
-        df_resumido = resumo_financeiro(psicologo_responsavel=psicologo_responsavel, mes=mes, ano=ano)
+        df_resumido = fatiar_resumo(por_periodo, mes=mes, ano=ano)
         _kpis_e_grafico(df_resumido, titulo=f"💵 Financeiro - {mes:02}/{ano}")
 
     with tab_pend:
@@ -111,8 +133,6 @@ def show_dashboard(psicologo_responsavel: int):
 
         # 🔎 Filtro por período (data início e fim)
         col1, col2 = st.columns(2)
-        hoje = datetime.now().date()
-        padrao_inicio = hoje.replace(day=1)  # 1º dia do mês atual
         dt_inicio = col1.date_input("Data início", value=padrao_inicio, key=key_prefix + "pend_dt_inicio")
         dt_fim = col2.date_input("Data fim", value=hoje, key=key_prefix + "pend_dt_fim")
 
@@ -124,8 +144,8 @@ def show_dashboard(psicologo_responsavel: int):
         # Título do período
         titulo = f"Pendências - {dt_inicio.strftime('%d/%m/%Y')} a {dt_fim.strftime('%d/%m/%Y')}"
 
-        # 🧮 Chamada ao backend (sempre por período)
-        df_pend = resumo_pendencias(psicologo_responsavel, dt_inicio=dt_inicio, dt_fim=dt_fim)
+        # 🧮 Já consultado no topo da página, junto com as demais leituras
+        df_pend = leituras["pendencias"]
 
         # KPIs de pendências
         valor_total_pendente = float(df_pend['valor_pendente'].sum()) if not df_pend.empty else 0.0
@@ -175,7 +195,7 @@ def show_dashboard(psicologo_responsavel: int):
 
             if st.button("📄 Gerar PDF de Pendências", key=key_prefix + "pend_pdf_btn"):
                 try:
-                    sessoes = sessoes_por_cliente(selecionado['id'])
+                    sessoes = sessoes_pendentes_cliente(selecionado['id'])
                     cliente_nome = selecionado['nome']
 
                     pdf_bytes_pend = gerar_pdf_pendencias(sessoes, cliente_nome)
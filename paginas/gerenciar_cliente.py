@@ -1,8 +1,8 @@
 # /pages/gerenciar_cliente.py
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timedelta
 import pandas as pd
-from db.functions import listar_clientes, sessoes_por_cliente, adicionar_sessao, excluir_cliente, excluir_sessao, update_sessao, listar_psicologos, upload_para_gcs, listar_arquivos_do_cliente, manual_load_dotenv, update_sessao_data_hora, atualizar_nome_cliente, gerar_pdf_pendencias, gerar_pdf_texto, atualizar_dia_agendamento_cliente
+from db.functions import listar_clientes, adicionar_sessao, excluir_cliente, excluir_sessao, update_sessao, update_sessao_listagem, listar_psicologos, upload_para_gcs, listar_arquivos_do_cliente, manual_load_dotenv, update_sessao_data_hora, atualizar_nome_cliente, gerar_pdf_pendencias, gerar_pdf_texto, atualizar_dia_agendamento_cliente, unidade_de_trabalho, indicadores_cliente, gerar_sessoes_recorrentes, adicionar_sessoes_em_lote, DIAS_SEMANA, update_sessoes_em_lote, detalhes_sessoes, com_detalhes, sessoes_por_cliente_periodo, sessoes_pendentes_cliente, anos_com_sessoes, pagina_sessoes_cliente, listar_arquivos_por_prefixo, baixar_arquivos
 import time
 import os
 import json
@@ -206,34 +206,26 @@ def show_gerenciar_cliente(psicologo_responsavel):
     
 
     st.subheader("📊 Indicadores do Cliente")
-    sessoes = sessoes_por_cliente(cliente_id)
-    sessoes['data'] = pd.to_datetime(sessoes['data'])
-    if pd.api.types.is_timedelta64_dtype(sessoes['hora']):
-        sessoes['hora'] = sessoes['hora'].apply(lambda td: (pd.Timestamp('00:00:00') + td).time())
-        
     col1, col2 = st.columns(2)
     with col1:
         mes = st.selectbox("📅 Mês", list(range(1, 13)), index=datetime.now().month - 1)
     with col2:
-        anos_disponiveis = sessoes['data'].dt.year.unique().tolist()
-        ano = st.selectbox("📆 Ano", sorted(anos_disponiveis, reverse=True) if anos_disponiveis else [datetime.now().year])
+        # só a primeira e a última data do cliente, não o histórico inteiro
+        anos_disponiveis = anos_com_sessoes(cliente_id)
+        ano = st.selectbox("📆 Ano", anos_disponiveis if anos_disponiveis else [datetime.now().year])
 
-    sessoes_filtradas = sessoes[(sessoes['data'].dt.month == mes) & (sessoes['data'].dt.year == ano)]
+    # Período exibido: a listagem (paginada) e o PDF mensal consultam só este mês
+    inicio_mes = datetime(ano, mes, 1).date()
+    fim_mes = (inicio_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
 
-    # Certifique-se de que a coluna `hora` está sendo convertida corretamente
-    sessoes_filtradas['hora'] = pd.to_datetime(sessoes_filtradas['hora'].astype(str)).dt.time
-
-    sessoes_realizadas = sessoes_filtradas[sessoes_filtradas['status'] == "realizada"]
-    sessoes_faltas = sessoes_filtradas[sessoes_filtradas['status'] == "falta"]
-    
-    total_pagamento = sessoes_realizadas[sessoes_realizadas['pagamento'] != 0]['valor'].sum()
-    total_pendente = sessoes_realizadas[sessoes_realizadas['pagamento']== 0]['valor'].sum() + sessoes_faltas[sessoes_faltas['cobrar'] == 1]['valor'].sum()
+    # Agregados do mês vêm do motor analítico (mesmas regras do dashboard)
+    indicadores = indicadores_cliente(psicologo_responsavel, cliente_id, mes, ano)
 
     col1, col2, col3, col4 = st.columns(4)
-    col1.metric("✅ Realizadas", len(sessoes_realizadas))
-    col2.metric("❌ Faltas", len(sessoes_faltas))
-    col3.metric("💰 Recebido", f"R$ {total_pagamento:.2f}")
-    col4.metric("🕗 Pendente", f"R$ {total_pendente:.2f}")
+    col1.metric("✅ Realizadas", indicadores['sessoes_feitas'])
+    col2.metric("❌ Faltas", indicadores['sessoes_faltas'])
+    col3.metric("💰 Recebido", f"R$ {indicadores['total_recebido']:.2f}")
+    col4.metric("🕗 Pendente", f"R$ {indicadores['total_a_receber']:.2f}")
 
     # CSS para ajustar largura dos tabs
     st.markdown("""
@@ -324,11 +316,102 @@ def show_gerenciar_cliente(psicologo_responsavel):
                     except ValueError as e:
                         st.error(str(e))
 
+        with st.expander("🔁 Agendar sessões recorrentes"):
+            dia_cliente = str(cliente.get('dia_agendamento') or "Indefinido")
+            if dia_cliente not in DIAS_SEMANA:
+                st.info("Defina o dia de agendamento do cliente (segunda a sexta) para agendar sessões recorrentes.")
+            else:
+                with st.form("form_recorrentes"):
+                    # nomes próprios: inicio_mes/fim_mes são o mês selecionado, usado pela listagem e pelo PDF
+                    inicio_padrao = datetime.today().date().replace(day=1)
+                    fim_padrao = (inicio_padrao + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+                    col1, col2, col3 = st.columns([2, 1, 1])
+                    with col1:
+                        periodo = st.date_input("📅 Período", (inicio_padrao, fim_padrao), key="periodo_recorrente")
+                    with col2:
+                        hora_rec = st.selectbox("🕒 Hora", gerar_horarios(), key="hora_recorrente")
+                    with col3:
+                        valor_rec = st.number_input("💵 Valor", min_value=0.0, value=float(cliente['valor_sessao']),
+                                                    step=50.0, key="valor_recorrente")
+                    st.caption(f"Uma sessão por semana, toda {dia_cliente}, no período selecionado.")
+
+                    if st.form_submit_button("🔁 Gerar sessões"):
+                        if not isinstance(periodo, (tuple, list)) or len(periodo) != 2:
+                            st.error("Selecione a data inicial e a final do período.")
+                        else:
+                            novas = gerar_sessoes_recorrentes(
+                                cliente_id, dia_cliente, hora_rec, periodo[0], periodo[1], valor_rec
+                            )
+                            inseridas, conflitos = adicionar_sessoes_em_lote(novas)
+                            msg = f"{len(inseridas)} sessão(ões) agendada(s) às {hora_rec} ({dia_cliente})."
+                            if conflitos:
+                                msg += " Já existiam sessões em: " + ", ".join(d.strftime('%d/%m') for _, d, _ in conflitos) + "."
+                            # mostrada após o rerun, junto com a lista já atualizada
+                            st.session_state['msg_recorrentes'] = msg
+                            st.rerun()
+
+            if 'msg_recorrentes' in st.session_state:
+                st.success(st.session_state.pop('msg_recorrentes'))
+
+        # ====== Quitar pendências em lote (mesma regra do PDF de pendências) ======
+        pendentes = sessoes_pendentes_cliente(cliente_id)
+        with st.expander(f"💸 Quitar pendências ({len(pendentes)})"):
+            if pendentes.empty:
+                st.info("Não há pendências financeiras para este cliente.")
+            else:
+                rotulos = {
+                    int(r['id']): f"{r['data'].strftime('%d/%m/%Y')} {str(r['hora'])[:5]} — R$ {float(r['valor']):.2f} ({r['status']})"
+                    for _, r in pendentes.iterrows()
+                }
+                with st.form("form_quitar_pendencias"):
+                    selecionadas = st.multiselect(
+                        "Sessões a marcar como pagas",
+                        options=list(rotulos),
+                        default=list(rotulos),
+                        format_func=rotulos.get,
+                    )
+                    nf_lote = st.text_input("📑 Nota Fiscal (opcional, comece com NF-)", "NF-")
+                    st.caption(f"Total pendente do cliente: R$ {float(pendentes['valor'].sum()):.2f}")
+
+                    if st.form_submit_button("✅ Marcar como pagas"):
+                        if not nf_lote.startswith("NF-"):
+                            st.error("Nota Fiscal deve iniciar com 'NF-'")
+                        elif not selecionadas:
+                            st.warning("Selecione ao menos uma sessão.")
+                        else:
+                            # "NF-" sozinho = não informar nota: mantém a de cada sessão
+                            alteradas = update_sessoes_em_lote(
+                                selecionadas, pagamento=True, nota_fiscal=nf_lote if nf_lote.strip() != "NF-" else None
+                            )
+                            st.session_state['msg_quitar'] = f"{alteradas} sessão(ões) marcada(s) como paga(s)."
+                            st.rerun()
+
+            if 'msg_quitar' in st.session_state:
+                st.success(st.session_state.pop('msg_quitar'))
+
         st.markdown("### 📅 Sessões Registradas")
 
-        for _, row in sessoes_filtradas.iterrows():
+        # ====== Paginação por keyset: só a página atual vira widgets ======
+        tamanho_pagina = st.selectbox("Sessões por página", [10, 20, 50], index=1, key="tamanho_pagina_sessoes")
+        chave_pager = (cliente_id, ano, mes, tamanho_pagina)
+        pager = st.session_state.get('pager_sessoes')
+        if not pager or pager['chave'] != chave_pager:
+            # cursores[i] = cursor que abre a página i (None = primeira)
+            pager = {'chave': chave_pager, 'cursores': [None], 'indice': 0}
+            st.session_state['pager_sessoes'] = pager
+
+        sessoes_pagina, proximo_cursor = pagina_sessoes_cliente(
+            cliente_id, inicio_mes, fim_mes, apos=pager['cursores'][pager['indice']], tamanho=tamanho_pagina
+        )
+        if sessoes_pagina.empty:
+            st.info("Nenhuma sessão registrada neste período.")
+
+        for _, row in sessoes_pagina.iterrows():
             header = f"📍 {row['data'].date()} às {row['hora'].strftime('%H:%M')} - {row['status']}"
             with st.expander(header):
+                # Diário (textos longos) só é buscado quando pedido
+                diario_aberto = st.toggle("📔 Mostrar diário da sessão", key=f"diario_on_{row['id']}")
+                diario = detalhes_sessoes((int(row['id']),)).iloc[0] if diario_aberto else None
 
                 # ====== FORM ÚNICO ======
                 with st.form(key=f"form_{row['id']}"):
@@ -368,28 +451,32 @@ def show_gerenciar_cliente(psicologo_responsavel):
                     with col32:
                         nova_nf = st.text_input("📑 Nota Fiscal", value=row.get('nota_fiscal', 'NF-'), key=f"nf_{row['id']}")
 
-                    with st.popover("📔 Diário da Sessão"):
-                        st.markdown("### 📔 Diário da Sessão")
-                        novo_conteudo = st.text_area("🧠 Conteúdo", value=row.get('conteudo', ''), key=f"conteudo_{row['id']}")
-                        novo_objetivo = st.text_area("🎯 Objetivo", value=row.get('objetivo', ''), key=f"objetivo_{row['id']}")
-                        novo_material = st.text_area("📚 Material", value=row.get('material', ''), key=f"material_{row['id']}")
-                        nova_atividade = st.text_area("🏠 Atividade para Casa", value=row.get('atividade_casa', ''), key=f"atividade_{row['id']}")
-
-                        entrada_valor = int(row.get('emocao_entrada') or 3)
-                        saida_valor = int(row.get('emocao_saida') or 3)
-
-                        col_entrada, col_saida = st.columns(2)
-                        with col_entrada:
-                            entrada_str = st.radio("😊 Emoção na Entrada", opcoes_emocao,
-                                                index=max(0, entrada_valor - 1), horizontal=True, key=f"entrada_{row['id']}")
-                            nova_emocao_entrada = int(entrada_str.split()[0])
-                        with col_saida:
-                            saida_str = st.radio("😌 Emoção na Saída", opcoes_emocao,
-                                                index=max(0, saida_valor - 1), horizontal=True, key=f"saida_{row['id']}")
-                            nova_emocao_saida = int(saida_str.split()[0])
-
-                        nova_proxima = st.text_area("🗓️ Planejamento Próxima Sessão", value=row.get('proxima_sessao', ''), key=f"proxima_{row['id']}")
-                    
+                    if diario is not None:
+                        with st.popover("📔 Diário da Sessão"):
+                            st.markdown("### 📔 Diário da Sessão")
+                            novo_conteudo = st.text_area("🧠 Conteúdo", value=diario.get('conteudo', ''), key=f"conteudo_{row['id']}")
+                            novo_objetivo = st.text_area("🎯 Objetivo", value=diario.get('objetivo', ''), key=f"objetivo_{row['id']}")
+                            novo_material = st.text_area("📚 Material", value=diario.get('material', ''), key=f"material_{row['id']}")
+                            nova_atividade = st.text_area("🏠 Atividade para Casa", value=diario.get('atividade_casa', ''), key=f"atividade_{row['id']}")
+
+                            # emoções são Int8: sem registro vem pd.NA
+                            entrada_valor = 3 if pd.isna(diario['emocao_entrada']) else int(diario['emocao_entrada'])
+                            saida_valor = 3 if pd.isna(diario['emocao_saida']) else int(diario['emocao_saida'])
+
+                            col_entrada, col_saida = st.columns(2)
+                            with col_entrada:
+                                entrada_str = st.radio("😊 Emoção na Entrada", opcoes_emocao,
+                                                    index=max(0, entrada_valor - 1), horizontal=True, key=f"entrada_{row['id']}")
+                                nova_emocao_entrada = int(entrada_str.split()[0])
+                            with col_saida:
+                                saida_str = st.radio("😌 Emoção na Saída", opcoes_emocao,
+                                                    index=max(0, saida_valor - 1), horizontal=True, key=f"saida_{row['id']}")
+                                nova_emocao_saida = int(saida_str.split()[0])
+
+                            nova_proxima = st.text_area("🗓️ Planejamento Próxima Sessão", value=diario.get('proxima_sessao', ''), key=f"proxima_{row['id']}")
+                    else:
+                        st.caption("📔 Diário não carregado — ative *Mostrar diário da sessão* para ver ou editar.")
+
                     # ====== Botão ÚNICO ======
                     submitted = st.form_submit_button(f"💾 Atualizar sessão")
                     if submitted:
@@ -397,17 +484,26 @@ def show_gerenciar_cliente(psicologo_responsavel):
                             st.error("Nota Fiscal deve iniciar com 'NF-'")
                         else:
                             try:
-                                # Atualiza data/hora SOMENTE se mudou
-                                mudou_data_hora = (nova_data != row['data'].date()) or (nova_hora != row['hora'])
-                                if mudou_data_hora:
-                                    update_sessao_data_hora(row['id'], nova_data, nova_hora)
-
-                                # Atualiza demais campos
-                                update_sessao(
-                                    row['id'], novo_pagamento, float(novo_valor), novo_status, int(novo_cobrar), nova_nf,
-                                    novo_conteudo, novo_objetivo, novo_material, nova_atividade,
-                                    int(nova_emocao_entrada), int(nova_emocao_saida), nova_proxima, nova_obs
-                                )
+                                # Mesma conexão/transação: ou aplica data/hora e campos, ou nada
+                                with unidade_de_trabalho():
+                                    # Atualiza data/hora SOMENTE se mudou
+                                    mudou_data_hora = (nova_data != row['data'].date()) or (nova_hora != row['hora'])
+                                    if mudou_data_hora:
+                                        update_sessao_data_hora(row['id'], nova_data, nova_hora)
+
+                                    # Diário fechado: só as colunas da listagem (o texto do diário não é tocado)
+                                    if diario is None:
+                                        update_sessao_listagem(
+                                            row['id'], novo_pagamento, float(novo_valor), novo_status, int(novo_cobrar),
+                                            nova_nf, nova_obs
+                                        )
+                                    else:
+                                        update_sessao(
+                                            row['id'], novo_pagamento, float(novo_valor), novo_status, int(novo_cobrar), nova_nf,
+                                            novo_conteudo, novo_objetivo, novo_material, nova_atividade,
+                                            nova_emocao_entrada, nova_emocao_saida,
+                                            nova_proxima, nova_obs
+                                        )
                                 st.success("Sessão atualizada com sucesso.")
                                 st.rerun()
                             except ValueError as e:
@@ -422,6 +518,21 @@ def show_gerenciar_cliente(psicologo_responsavel):
                         st.success("Sessão excluída com sucesso.")
                         st.rerun()
 
+        col_ant, col_pag, col_prox = st.columns([1, 2, 1])
+        with col_ant:
+            if st.button("⬅️ Anteriores", key="pag_sessoes_anterior", disabled=pager['indice'] == 0,
+                         use_container_width=True):
+                pager['indice'] -= 1
+                st.rerun()
+        with col_pag:
+            st.caption(f"Página {pager['indice'] + 1}")
+        with col_prox:
+            if st.button("Próximas ➡️", key="pag_sessoes_proxima", disabled=proximo_cursor is None,
+                         use_container_width=True):
+                pager['cursores'][pager['indice'] + 1:] = [proximo_cursor]
+                pager['indice'] += 1
+                st.rerun()
+
         #csv = sessoes_filtradas.to_csv(index=False).encode('utf-8')
         #st.download_button("⬇️ Exportar CSV", csv, file_name=f"sessoes_{cliente_nome}_{mes}_{ano}.csv", mime='text/csv')
 
@@ -436,27 +547,37 @@ def show_gerenciar_cliente(psicologo_responsavel):
                 ["Cliente", "Psicólogo"],
                 key="finalidade_mensal"
             )
-            pdf_bytes_mensal = gerar_pdf_texto(sessoes_filtradas, cliente_nome, mes, ano, finalidade)
-            nome_arquivo_mensal = f"sessoes_{cliente_nome}_{mes}_{ano}.pdf".replace(" ", "_")
-            st.download_button(
-                "📄 Exportar PDF",
-                pdf_bytes_mensal,
-                file_name=nome_arquivo_mensal,
-                mime="application/pdf",
-                key="btn_export_mensal"
-            )
+            # PDF só é montado sob demanda; o do psicólogo busca o diário do mês num único lote
+            chave_mensal = (cliente_id, mes, ano, finalidade)
+            if st.button("⚙️ Gerar PDF", key="btn_gerar_mensal"):
+                sessoes_mes = sessoes_por_cliente_periodo(cliente_id, inicio_mes, fim_mes)
+                base = sessoes_mes if finalidade == "Cliente" else com_detalhes(sessoes_mes)
+                st.session_state['pdf_mensal'] = (chave_mensal, gerar_pdf_texto(base, cliente_nome, mes, ano, finalidade))
+            pdf_mensal = st.session_state.get('pdf_mensal')
+            if pdf_mensal and pdf_mensal[0] == chave_mensal:
+                nome_arquivo_mensal = f"sessoes_{cliente_nome}_{mes}_{ano}.pdf".replace(" ", "_")
+                st.download_button(
+                    "📄 Exportar PDF",
+                    pdf_mensal[1],
+                    file_name=nome_arquivo_mensal,
+                    mime="application/pdf",
+                    key="btn_export_mensal"
+                )
 
         with tab_pend:
             st.markdown("### ⚠️ Exportar relatório de pendências de sessões (global)")
-            pdf_bytes_pend = gerar_pdf_pendencias(sessoes, cliente_nome)
-            nome_arquivo_pend = f"pendencias_{cliente_nome}.pdf".replace(" ", "_")
-            st.download_button(
-                "📄 Exportar Pendências PDF",
-                pdf_bytes_pend,
-                file_name=nome_arquivo_pend,
-                mime="application/pdf",
-                key="btn_export_pend"
-            )
+            if st.button("⚙️ Gerar PDF de pendências", key="btn_gerar_pend"):
+                st.session_state['pdf_pend'] = (cliente_id, gerar_pdf_pendencias(pendentes, cliente_nome))
+            pdf_pend = st.session_state.get('pdf_pend')
+            if pdf_pend and pdf_pend[0] == cliente_id:
+                nome_arquivo_pend = f"pendencias_{cliente_nome}.pdf".replace(" ", "_")
+                st.download_button(
+                    "📄 Exportar Pendências PDF",
+                    pdf_pend[1],
+                    file_name=nome_arquivo_pend,
+                    mime="application/pdf",
+                    key="btn_export_pend"
+                )
 
     
     
@@ -475,6 +596,11 @@ def show_gerenciar_cliente(psicologo_responsavel):
             "Contrato": "🔴"            # vermelho
         }
 
+        # As quatro "pastas" são listadas de uma vez, em paralelo
+        arquivos_por_tipo = listar_arquivos_por_prefixo(
+            bucket_name, [f"{pasta_cliente}/{tipo}/" for tipo in tipos]
+        )
+
         for tipo, icone in tipos.items():
             with st.expander(f"{icone} {tipo}"):
                 st.markdown(f"**Enviar novo documento para {tipo}:**")
@@ -496,6 +622,10 @@ def show_gerenciar_cliente(psicologo_responsavel):
 
                     url = upload_para_gcs(bucket_name, blob_path, uploaded_file)
                     st.success(f"{tipo} enviado para o bucket como: {nome_final}")
+                    # o arquivo recém-enviado entra na listagem abaixo
+                    arquivos_por_tipo[f"{pasta_cliente}/{tipo}/"] = listar_arquivos_do_cliente(
+                        bucket_name, f"{pasta_cliente}/{tipo}/"
+                    )
 
                 elif uploaded_file and not nome_personalizado:
                     st.warning("⚠️ Por favor, informe um nome para o arquivo antes de enviar.")
@@ -505,14 +635,15 @@ def show_gerenciar_cliente(psicologo_responsavel):
 
                 # Caminho correto: dentro da subpasta do tipo (ex: "joao_123/Laudos/")
                 prefixo_busca = f"{pasta_cliente}/{tipo}/"
-                arquivos = listar_arquivos_do_cliente(bucket_name, prefixo_busca)
+                arquivos = arquivos_por_tipo[prefixo_busca]
 
                 # Nenhum filtro extra necessário — GCS já retorna só os arquivos dessa "pasta"
                 if arquivos:
+                    conteudos = baixar_arquivos(arquivos)
                     for blob in arquivos:
                         arquivo_nome = blob.name.split("/")[-1]
                         nome_amigavel = arquivo_nome.replace(f"{tipo}_", "").replace("_", " ")
-                        conteudo = blob.download_as_bytes()
+                        conteudo = conteudos[blob.name]
 
                         st.download_button(
                             label=f"⬇️ {nome_amigavel}",
@@ -1,7 +1,7 @@
 import streamlit as st
 import re
 from datetime import datetime
-from db.functions import get_mysql_conn  # mesmo padrão usado em adicionar_usuario
+from db.functions import get_mysql_conn, unidade_de_trabalho, invalidar_cache, invalidar_principal  # mesmo padrão usado em adicionar_usuario
 
 
 
@@ -57,17 +57,26 @@ def _update_nome_usuario(id_login: int, nome_atual: str, novo_nome: str, funcao:
                 cursor.execute("UPDATE psicologos SET nome=%s WHERE id=%s", (novo_nome, psicologo_responsavel))
 
         conn.commit()
+    invalidar_cache("login", "psicologos")
+    invalidar_principal(id_login)
 
 def _update_senha_usuario(id_login: int, senha_nova: str):
     with get_mysql_conn() as conn:
         with conn.cursor() as cursor:
             cursor.execute("UPDATE login SET senha=%s WHERE id=%s", (senha_nova, id_login))
         conn.commit()
+    invalidar_cache("login")
+    invalidar_principal(id_login)
 
 # -----------------------------
 # Página
 # -----------------------------
 def show_perfil():
+    # Uma conexão para todo o rerun (leituras do perfil + eventual atualização)
+    with unidade_de_trabalho():
+        _render_perfil()
+
+def _render_perfil():
     st.title("👤 Meu perfil")
 
     # Pegamos o usuário logado da sessão
@@ -2,7 +2,6 @@
 import streamlit as st
 from db.functions import (
     adicionar_usuario,
-    get_proximo_id,
     listar_psicologos,
     listar_login_privilegios,
     atualizar_privilegio_usuario,
@@ -112,10 +111,9 @@ def aba_promover_psicologa():
         submitted = st.form_submit_button("Promover")
 
     if submitted:
-        # placeholder só para cumprir a assinatura (o backend deve ignorar e usar o próprio id)
-        psicologo_responsavel_placeholder = get_proximo_id("psicologos")
+        # na promoção o backend usa o id da própria psicóloga (get-or-create): nada a reservar aqui
         try:
-            adicionar_usuario(usuario_sel, None, "Psicóloga", psicologo_responsavel_placeholder, True)
+            adicionar_usuario(usuario_sel, None, "Psicóloga", None, True)
             st.success(f"✅ {usuario_sel} promovido(a) para Psicóloga com sucesso.")
             st.rerun()
         except ValueError as e: